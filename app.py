@@ -1,56 +1,875 @@
-from flask import Flask, request, jsonify, session, send_from_directory
-from flask_cors import CORS
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import (Blueprint, Flask, request, jsonify, session, send_from_directory, g, Response, current_app,
+                   has_app_context)
+from flask.ctx import RequestContext
+from werkzeug.security import generate_password_hash, check_password_hash, safe_join
 from werkzeug.utils import secure_filename
 import sqlite3
 import os
 import json
+import csv
+import hashlib
+import io
+import mimetypes
+import re
+import secrets
+import struct
+import threading
 from datetime import datetime, timedelta
+import backup
+import counters
+import db_profiler
+import dedup
+import db_pool
+import geo
+import images
+import lru
+import rate_limit
+import shm_cache
+import snapshot
 
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 MAX_FILE_SIZE = 5 * 1024 * 1024
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# /api/upload_photos: files per request, and their combined size
+MAX_BATCH_FILES = 10
+MAX_BATCH_BYTES = 30 * 1024 * 1024
+UPLOAD_WORKERS = int(os.environ.get('HOOKUPZA_UPLOAD_WORKERS', 4))
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-app = Flask(__name__, static_folder='.', static_url_path='')
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024
-app.secret_key = 'hookupza_secret_2026_change_in_production'
-
-CORS(app,
-     supports_credentials=True,
-     origins=[
-         'http://127.0.0.1:5500', 'http://localhost:5500',
-         'http://127.0.0.1:5501', 'http://localhost:5501',
-         'https://hookupza.onrender.com'
-     ],
-     allow_headers=['Content-Type'],
-     methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
-
-# Auto-detect HTTPS (Render) vs HTTP (local) for secure cookies
-import os as _os
-_on_render = _os.environ.get('RENDER', '') != ''
-app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
-app.config['SESSION_COOKIE_SECURE'] = _on_render   # True on Render HTTPS, False locally
-app.config['SESSION_COOKIE_HTTPONLY'] = True
-app.config['SESSION_COOKIE_NAME'] = 'hookupza_session'
-app.config['SESSION_COOKIE_DOMAIN'] = None
-app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=7)
-app.config['SESSION_PERMANENT'] = True
-
-DB_FILE = 'hookupza.db'
+def photo_filename(user_id, filename):
+    # the random part keeps two "image.jpg" sent in the same second apart
+    return f"{user_id}_{datetime.now().strftime('%Y%m%d%H%M%S')}_{secrets.token_hex(3)}_{secure_filename(filename)}"
 
-def get_db():
-    conn = sqlite3.connect(DB_FILE)
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# Every route and hook below; create_app() registers them on an app
+bp = Blueprint('hookupza', __name__)
+
+ALLOWED_ORIGINS = [
+    'http://127.0.0.1:5500', 'http://localhost:5500',
+    'http://127.0.0.1:5501', 'http://localhost:5501',
+    'https://hookupza.onrender.com'
+]
+CORS_ALLOW_HEADERS = ['Content-Type', 'X-Profile']
+CORS_METHODS = ['GET', 'POST', 'PUT', 'DELETE']
+# How long browsers may cache a preflight (Chrome caps this at 7200s)
+PREFLIGHT_MAX_AGE = int(os.environ.get('HOOKUPZA_PREFLIGHT_MAX_AGE', 7200))
+
+class PreflightMiddleware:
+    """Answer CORS preflights at the WSGI layer, before Flask routes the request,
+    opens the session or runs any hook. Headers are built once per allowed origin."""
+
+    def __init__(self, wsgi_app, origins):
+        self.wsgi_app = wsgi_app
+        self.headers = {origin: [
+            ('Access-Control-Allow-Origin', origin),
+            ('Access-Control-Allow-Credentials', 'true'),
+            ('Access-Control-Allow-Methods', ', '.join(CORS_METHODS)),
+            ('Access-Control-Allow-Headers', ', '.join(CORS_ALLOW_HEADERS)),
+            ('Access-Control-Max-Age', str(PREFLIGHT_MAX_AGE)),
+            ('Vary', 'Origin'),
+            ('Content-Length', '0'),
+        ] for origin in origins}
+        self.rejected = [('Vary', 'Origin'), ('Content-Length', '0')]
+
+    def __call__(self, environ, start_response):
+        if environ.get('REQUEST_METHOD') == 'OPTIONS' and 'HTTP_ACCESS_CONTROL_REQUEST_METHOD' in environ:
+            start_response('204 No Content', self.headers.get(environ.get('HTTP_ORIGIN'), self.rejected))
+            return [b'']
+        return self.wsgi_app(environ, start_response)
+
+APP_CONFIG = {
+    'UPLOAD_FOLDER': UPLOAD_FOLDER,
+    'MAX_CONTENT_LENGTH': 10 * 1024 * 1024,
+    'SECRET_KEY': 'hookupza_secret_2026_change_in_production',
+    'SESSION_COOKIE_SAMESITE': 'Lax',
+    # Auto-detect HTTPS (Render) vs HTTP (local) for secure cookies
+    'SESSION_COOKIE_SECURE': os.environ.get('RENDER', '') != '',
+    'SESSION_COOKIE_HTTPONLY': True,
+    'SESSION_COOKIE_NAME': 'hookupza_session',
+    'SESSION_COOKIE_DOMAIN': None,
+    'PERMANENT_SESSION_LIFETIME': timedelta(days=7),
+    'SESSION_PERMANENT': True,
+}
+
+DB_FILE = os.environ.get('HOOKUPZA_DB', 'hookupza.db')
+
+DB_POOL_SIZE = int(os.environ.get('HOOKUPZA_DB_POOL_SIZE', 8))
+
+def connect_db():
+    conn = sqlite3.connect(DB_FILE, factory=db_profiler.ProfiledConnection, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+pool = db_pool.ConnectionPool(connect_db, DB_POOL_SIZE, key=lambda: DB_FILE)
+
+def get_db():
+    """Inside a request: one pooled connection per request, returned at teardown.
+    Outside (scripts, init_db): a fresh connection."""
+    if not has_app_context():
+        return connect_db()
+    conn = g.get('_db')
+    if conn is None:
+        conn = g._db = pool.acquire()
+    return conn
+
+# registered by create_app() for the app context: an /api/batch's sub-requests share one connection
+def release_db(exc):
+    conn = g.pop('_db', None)
+    if conn is not None:
+        pool.release(conn)
+
+# Photos and services live in ad_photos/ad_services, one row per item in the
+# order the poster gave them. The list shape still carries them as JSON strings.
+AD_SERVICES_JSON = '''(SELECT json_group_array(service) FROM
+    (SELECT service FROM ad_services WHERE ad_id=ads.id ORDER BY position))'''
+AD_PHOTOS_JSON = '''(SELECT json_group_array(file) FROM
+    (SELECT file FROM ad_photos WHERE ad_id=ads.id ORDER BY position))'''
+# First photo with what cards need to paint before it loads (photo_meta, see images.py);
+# null without photos, and only src for photos uploaded before photo_meta existed
+AD_COVER_JSON = '''(SELECT json_object('src', p.file, 'width', m.width, 'height', m.height, 'color', m.color,
+    'placeholder', m.placeholder, 'srcset', m.srcset)
+    FROM ad_photos p LEFT JOIN photo_meta m ON m.file = p.file WHERE p.ad_id=ads.id ORDER BY p.position LIMIT 1)'''
+
+def _json_list(value):
+    """Accept a list or its JSON text (older clients send either); anything else is empty."""
+    if isinstance(value, str):
+        try: value = json.loads(value) if value else []
+        except ValueError: return []
+    return [str(item) for item in value] if isinstance(value, list) else []
+
+def save_ad_children(conn, ad_id, services=None, photos=None):
+    """Replace an ad's services and/or photos (None leaves that list as it is). Caller commits."""
+    if services is not None:
+        conn.execute('DELETE FROM ad_services WHERE ad_id=?', (ad_id,))
+        # keep first occurrence only: (ad_id, service) is unique
+        services = list(dict.fromkeys(_json_list(services)))
+        conn.executemany('INSERT INTO ad_services (ad_id, position, service) VALUES (?, ?, ?)',
+                         [(ad_id, i, service) for i, service in enumerate(services)])
+    if photos is not None:
+        conn.execute('DELETE FROM ad_photos WHERE ad_id=?', (ad_id,))
+        conn.executemany('INSERT INTO ad_photos (ad_id, position, file) VALUES (?, ?, ?)',
+                         [(ad_id, i, photo) for i, photo in enumerate(_json_list(photos))])
+
+def import_ad_children(conn, source):
+    """Copy JSON services/photos columns from `source` (id, services, photos) into the child tables."""
+    conn.execute(f'''INSERT OR IGNORE INTO ad_services (ad_id, position, service)
+    SELECT s.id, j.key, j.value FROM {source} s, json_each(s.services) j
+    WHERE json_valid(s.services) AND json_type(s.services) = 'array' AND j.type = 'text' ''')
+    conn.execute(f'''INSERT OR IGNORE INTO ad_photos (ad_id, position, file)
+    SELECT s.id, j.key, j.value FROM {source} s, json_each(s.photos) j
+    WHERE json_valid(s.photos) AND json_type(s.photos) = 'array' AND j.type = 'text' ''')
+
+# Materialized API payloads, rebuilt in SQL whenever an ad or its children are written.
+# ad_json    -> list shape (public_ads, my_ads, admin all_ads): photos/services as JSON strings
+# detail_json -> get_ad shape: photos/services parsed
+_AD_PAYLOAD_FIELDS = '''
+    'id', id, 'user_id', user_id, 'title', title, 'category', category, 'location', location,
+    'description', description, 'rate', rate, 'contact', contact, 'status', status,
+    'is_premium', is_premium, 'created_at', created_at, 'expires_at', expires_at, 'duplicate_of', duplicate_of,
+    'username', (SELECT username FROM users WHERE users.id=ads.user_id),
+    'account_type', (SELECT account_type FROM users WHERE users.id=ads.user_id)'''
+
+# (`|| ''` drops the JSON subtype, so the list shape embeds them as strings rather than arrays)
+REFRESH_AD_JSON_SQL = f'''UPDATE ads SET
+    ad_json = json_object({_AD_PAYLOAD_FIELDS}, 'services', {AD_SERVICES_JSON} || '',
+                          'photos', {AD_PHOTOS_JSON} || '', 'cover', json({AD_COVER_JSON})),
+    detail_json = json_object({_AD_PAYLOAD_FIELDS}, 'services', json({AD_SERVICES_JSON}),
+                              'photos', json({AD_PHOTOS_JSON}), 'cover', json({AD_COVER_JSON}))'''
+
+def refresh_ad_json(conn, ad_ids=None, where=None, params=()):
+    """Rebuild the stored payloads for the given ad ids (or a WHERE clause). Caller commits."""
+    if ad_ids is not None:
+        ad_ids = list(ad_ids)
+        for i in range(0, len(ad_ids), 500):
+            chunk = ad_ids[i:i + 500]
+            conn.execute(REFRESH_AD_JSON_SQL + f" WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+    else:
+        conn.execute(REFRESH_AD_JSON_SQL + (f' WHERE {where}' if where else ''), params)
+
+# ---- Facets ----
+# ad_facets holds live counts of active ads per (facet, value): category, location,
+# premium ('0'/'1') and service. Triggers keep it in step with every write to ads
+# and ad_services, so the category nav is one read of a tiny table. Counts follow
+# status='active'; ads past expires_at drop out when the expire job marks them.
+FACET_NAMES = ('category', 'location', 'premium', 'service')
+FACET_CACHE_SECONDS = float(os.environ.get('HOOKUPZA_FACET_CACHE', 10))
+
+def _facet_upsert(ref, delta):
+    return f'''INSERT INTO ad_facets (facet, value, count) VALUES
+        ('category', {ref}.category, {delta}), ('location', COALESCE({ref}.location, ''), {delta}),
+        ('premium', COALESCE({ref}.is_premium, 0), {delta})
+        ON CONFLICT(facet, value) DO UPDATE SET count = count + excluded.count;'''
+
+def _facet_services(ref, delta):
+    return f'''INSERT INTO ad_facets (facet, value, count)
+        SELECT 'service', service, {delta} FROM ad_services WHERE ad_id={ref}.id
+        ON CONFLICT(facet, value) DO UPDATE SET count = count + excluded.count;'''
+
+# Children go after the ad (insert) and are removed after it (ads_delete_children),
+# so the ad-level delete trigger runs BEFORE and counts the services itself.
+FACET_TRIGGERS = [
+    f'''CREATE TRIGGER IF NOT EXISTS ads_facets_insert AFTER INSERT ON ads WHEN new.status='active' BEGIN
+        {_facet_upsert('new', 1)} END''',
+    f'''CREATE TRIGGER IF NOT EXISTS ads_facets_delete BEFORE DELETE ON ads WHEN old.status='active' BEGIN
+        {_facet_upsert('old', -1)} {_facet_services('old', -1)} END''',
+    f'''CREATE TRIGGER IF NOT EXISTS ads_facets_update_old AFTER UPDATE OF status, category, location, is_premium
+        ON ads WHEN old.status='active' BEGIN {_facet_upsert('old', -1)} {_facet_services('old', -1)} END''',
+    f'''CREATE TRIGGER IF NOT EXISTS ads_facets_update_new AFTER UPDATE OF status, category, location, is_premium
+        ON ads WHEN new.status='active' BEGIN {_facet_upsert('new', 1)} {_facet_services('new', 1)} END''',
+    '''CREATE TRIGGER IF NOT EXISTS ad_services_facets_insert AFTER INSERT ON ad_services
+        WHEN (SELECT status FROM ads WHERE id=new.ad_id)='active' BEGIN
+        INSERT INTO ad_facets (facet, value, count) VALUES ('service', new.service, 1)
+        ON CONFLICT(facet, value) DO UPDATE SET count = count + 1; END''',
+    '''CREATE TRIGGER IF NOT EXISTS ad_services_facets_delete AFTER DELETE ON ad_services
+        WHEN (SELECT status FROM ads WHERE id=old.ad_id)='active' BEGIN
+        INSERT INTO ad_facets (facet, value, count) VALUES ('service', old.service, -1)
+        ON CONFLICT(facet, value) DO UPDATE SET count = count - 1; END''',
+]
+
+def rebuild_facets(conn):
+    """Recount ad_facets from scratch (migration, bulk loads). Caller commits."""
+    conn.execute('DELETE FROM ad_facets')
+    conn.execute('''INSERT INTO ad_facets (facet, value, count)
+    SELECT 'category', category, COUNT(*) FROM ads WHERE status='active' GROUP BY category
+    UNION ALL SELECT 'location', COALESCE(location, ''), COUNT(*) FROM ads WHERE status='active'
+        GROUP BY COALESCE(location, '')
+    UNION ALL SELECT 'premium', COALESCE(is_premium, 0), COUNT(*) FROM ads WHERE status='active'
+        GROUP BY COALESCE(is_premium, 0)
+    UNION ALL SELECT 'service', s.service, COUNT(*) FROM ad_services s JOIN ads a ON a.id=s.ad_id
+        WHERE a.status='active' GROUP BY s.service''')
+
+# ---- Geo ----
+# ads.lat/lon come from geo.geocode(location) when an ad is written. Every distinct
+# coordinate pair gets one row in ad_points, and ad_geo is the R*Tree over those
+# points (gazetteer coordinates mean a whole city shares one point). A nearby search
+# finds the points in range with the R*Tree, then takes each point's best ads from
+# idx_ads_geo - at most NEARBY_LIMIT index entries per point, however many ads it has.
+NEARBY_MAX_RADIUS_KM = 500
+NEARBY_LIMIT = 100
+
+GEO_TRIGGERS = [
+    '''CREATE TRIGGER IF NOT EXISTS ads_geo_insert AFTER INSERT ON ads WHEN new.lat IS NOT NULL BEGIN
+        INSERT OR IGNORE INTO ad_points (lat, lon) VALUES (new.lat, new.lon); END''',
+    '''CREATE TRIGGER IF NOT EXISTS ads_geo_update AFTER UPDATE OF lat, lon ON ads WHEN new.lat IS NOT NULL BEGIN
+        INSERT OR IGNORE INTO ad_points (lat, lon) VALUES (new.lat, new.lon); END''',
+    '''CREATE TRIGGER IF NOT EXISTS ad_points_geo AFTER INSERT ON ad_points BEGIN
+        INSERT INTO ad_geo VALUES (new.id, new.lat, new.lat, new.lon, new.lon); END''',
+]
+
+def geocode_location(location):
+    place = geo.geocode(location)
+    return (place[0], place[1]) if place else (None, None)
+
+def geocode_ads(conn, where='lat IS NULL'):
+    """Fill ads.lat/lon from the gazetteer, one lookup per distinct location. Caller commits."""
+    locations = [row[0] for row in conn.execute(
+        f"SELECT DISTINCT location FROM ads WHERE {where} AND location <> ''")]
+    resolved = [(location, *geocode_location(location)) for location in locations]
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS geocoded (location TEXT PRIMARY KEY, lat REAL, lon REAL)')
+    conn.execute('DELETE FROM temp.geocoded')
+    conn.executemany('INSERT INTO temp.geocoded VALUES (?, ?, ?)', [r for r in resolved if r[1] is not None])
+    conn.execute(f'''UPDATE ads SET lat=g.lat, lon=g.lon FROM temp.geocoded g
+    WHERE ads.location=g.location AND ads.{where}''')
+    conn.execute('DROP TABLE temp.geocoded')
+
+def rebuild_geo(conn):
+    """Add any missing points and refill the ad_geo R*Tree (migration, bulk loads). Caller commits."""
+    conn.execute('''INSERT OR IGNORE INTO ad_points (lat, lon)
+    SELECT DISTINCT lat, lon FROM ads WHERE lat IS NOT NULL''')
+    conn.execute('DELETE FROM ad_geo')
+    conn.execute('INSERT INTO ad_geo SELECT id, lat, lat, lon, lon FROM ad_points')
+
+def nearby_ads(conn, lat, lon, radius_km, limit=NEARBY_LIMIT):
+    """[(distance_km, ad_json bytes)] for active ads within radius_km, premium first, then nearest, then newest."""
+    min_lat, max_lat, min_lon, max_lon = geo.bounding_box(lat, lon, radius_km)
+    points = conn.execute('''SELECT p.lat, p.lon FROM ad_geo g JOIN ad_points p ON p.id=g.id
+    WHERE g.min_lat <= ? AND g.max_lat >= ? AND g.min_lon <= ? AND g.max_lon >= ?''',
+                          (max_lat, min_lat, max_lon, min_lon)).fetchall()
+    candidates = []
+    for point_lat, point_lon in points:
+        distance = geo.haversine_km(lat, lon, point_lat, point_lon)
+        if distance > radius_km:
+            continue
+        # Within one point distance is equal, so its top `limit` by the listing order
+        # are the only ads from it that can make the overall top `limit`
+        for ad_id, is_premium, created_at in conn.execute('''SELECT id, is_premium, created_at FROM ads
+        WHERE lat=? AND lon=? AND status='active' AND expires_at > datetime('now')
+        ORDER BY is_premium DESC, created_at DESC LIMIT ?''', (point_lat, point_lon, limit)):
+            candidates.append((-(is_premium or 0), distance, created_at, ad_id))
+    candidates.sort(key=lambda c: c[2], reverse=True)   # newest first among equal distances (sort is stable)
+    candidates.sort(key=lambda c: (c[0], c[1]))
+    ranked = candidates[:limit]
+    if not ranked:
+        return []
+    ids = [c[3] for c in ranked]
+    payloads = dict(conn.execute(f"SELECT id, CAST(ad_json AS BLOB) FROM ads WHERE id IN ({','.join('?' * len(ids))})",
+                                 ids).fetchall())
+    return [(c[1], payloads[c[3]]) for c in ranked if c[3] in payloads]
+
+# ---- Duplicates ----
+# Every ad's title + description is indexed in ad_lsh, one row per LSH band
+# (dedup.py). When an ad is written, the ads sharing a bucket with it are the
+# candidates: reading at most DUPLICATE_BUCKET_SCAN of the newest from each bucket
+# keeps the lookup bounded even for a template posted thousands of times. The
+# candidates sharing most buckets are compared exactly, and the closest live one
+# at DUPLICATE_SIMILARITY or above is recorded as ads.duplicate_of for moderators.
+DUPLICATE_SIMILARITY = float(os.environ.get('HOOKUPZA_DUPLICATE_SIMILARITY', 0.7))
+DUPLICATE_BUCKET_SCAN = 100
+DUPLICATE_CANDIDATES = 20
+LSH_BATCH_SIZE = 5000
+
+def duplicate_candidates(conn, ad_id, shingles, buckets, limit=DUPLICATE_CANDIDATES, statuses=('active', 'pending')):
+    """[(similarity, id)] of ads (other than ad_id, in one of statuses, or any when None) at
+    DUPLICATE_SIMILARITY or above, most similar first."""
+    if not buckets:
+        return []
+    scan = ' UNION ALL '.join(['SELECT * FROM (SELECT ad_id FROM ad_lsh WHERE bucket=? ORDER BY ad_id DESC LIMIT ?)']
+                              * len(buckets))
+    params = [value for bucket in buckets for value in (bucket, DUPLICATE_BUCKET_SCAN)] + [ad_id]
+    status_filter = f"AND a.status IN ({','.join('?' * len(statuses))})" if statuses else ''
+    # statuses are checked before the cut: the best candidates in a busy bucket are often expired copies
+    rows = conn.execute(f'''SELECT a.id, a.title, a.description FROM
+    (SELECT ad_id, COUNT(*) AS shared FROM ({scan}) WHERE ad_id <> ? GROUP BY ad_id) c
+    JOIN ads a ON a.id = c.ad_id {status_filter}
+    ORDER BY c.shared DESC, a.id DESC LIMIT ?''', params + list(statuses or ()) + [limit]).fetchall()
+    matches = [(dedup.jaccard(shingles, dedup.shingles(title, description)), other)
+               for other, title, description in rows]
+    return sorted(((round(similarity, 3), other) for similarity, other in matches
+                   if similarity >= DUPLICATE_SIMILARITY), reverse=True)
+
+def flag_duplicates(conn, ad_ids):
+    """(Re)index the ads' text and set duplicate_of to their closest live duplicate, or NULL.
+    Returns {ad_id: duplicate_of}. Caller commits."""
+    ad_ids = list(ad_ids)
+    flagged = {}
+    for ad_id, title, description in conn.execute(
+            f"SELECT id, title, description FROM ads WHERE id IN ({','.join('?' * len(ad_ids))})", ad_ids).fetchall():
+        shingles = dedup.shingles(title, description)
+        buckets = dedup.buckets(shingles)
+        matches = duplicate_candidates(conn, ad_id, shingles, buckets)
+        flagged[ad_id] = matches[0][1] if matches else None
+        conn.execute('DELETE FROM ad_lsh WHERE ad_id=?', (ad_id,))
+        conn.executemany('INSERT OR IGNORE INTO ad_lsh (bucket, ad_id) VALUES (?, ?)',
+                         [(bucket, ad_id) for bucket in buckets])
+        conn.execute('UPDATE ads SET duplicate_of=? WHERE id=?', (flagged[ad_id], ad_id))
+    return flagged
+
+def rebuild_lsh(conn):
+    """Refill ad_lsh from every ad (migration, bulk loads); duplicate_of is left as it is. Caller commits."""
+    conn.execute('DELETE FROM ad_lsh')
+    cursor = conn.execute('SELECT id, title, description FROM ads')
+    while True:
+        rows = cursor.fetchmany(LSH_BATCH_SIZE)
+        if not rows:
+            break
+        conn.executemany('INSERT OR IGNORE INTO ad_lsh (bucket, ad_id) VALUES (?, ?)',
+                         [(bucket, ad_id) for ad_id, title, description in rows
+                          for bucket in dedup.buckets(dedup.shingles(title, description))])
+
+# ---- Archive ----
+# Expired and rejected ads older than ARCHIVE_AFTER_DAYS move out of the hot tables into
+# a separate database file, attached to a connection as `archive` when needed. Each batch
+# is its own transaction; with WAL a commit is atomic per file, not across both, so the
+# archive copy is written before the hot row is deleted and a batch can safely run twice.
+ARCHIVE_AFTER_DAYS = int(os.environ.get('HOOKUPZA_ARCHIVE_DAYS', 30))
+ARCHIVE_BATCH_SIZE = 500
+ARCHIVED_LIMIT = 200
+
+AD_COLUMNS = ('id, user_id, title, category, location, description, rate, contact, status, is_premium, '
+              'created_at, expires_at, ad_json, detail_json, lat, lon')
+ARCHIVE_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS archive.ads (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        title TEXT NOT NULL,
+        category TEXT NOT NULL,
+        location TEXT,
+        description TEXT,
+        rate TEXT,
+        contact TEXT,
+        status TEXT,
+        is_premium INTEGER DEFAULT 0,
+        created_at TIMESTAMP,
+        expires_at TIMESTAMP,
+        ad_json TEXT,
+        detail_json TEXT,
+        lat REAL,
+        lon REAL,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''',
+    '''CREATE TABLE IF NOT EXISTS archive.ad_services (
+        ad_id INTEGER NOT NULL, position INTEGER NOT NULL, service TEXT NOT NULL,
+        PRIMARY KEY (ad_id, position)
+    ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS archive.ad_photos (
+        ad_id INTEGER NOT NULL, position INTEGER NOT NULL, file TEXT NOT NULL,
+        PRIMARY KEY (ad_id, position)
+    ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS archive.ad_stats (
+        ad_id INTEGER PRIMARY KEY, views INTEGER NOT NULL, contacts INTEGER NOT NULL, updated_at TIMESTAMP
+    )''',
+    'CREATE INDEX IF NOT EXISTS archive.idx_archive_user ON ads(user_id, archived_at)',
+    'CREATE INDEX IF NOT EXISTS archive.idx_archive_archived ON ads(archived_at)',
+    '''CREATE TRIGGER IF NOT EXISTS archive.archive_delete_children AFTER DELETE ON ads BEGIN
+        DELETE FROM ad_services WHERE ad_id=old.id;
+        DELETE FROM ad_photos WHERE ad_id=old.id;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS archive.archive_delete_stats AFTER DELETE ON ads BEGIN
+        DELETE FROM ad_stats WHERE ad_id=old.id;
+    END''',
+]
+
+def archive_db_file():
+    return os.environ.get('HOOKUPZA_ARCHIVE_DB') or os.path.splitext(DB_FILE)[0] + '-archive.db'
+
+def attach_archive(conn):
+    """Attach the archive database as `archive` (once per connection). Not inside a transaction."""
+    if any(row[1] == 'archive' for row in conn.execute('PRAGMA database_list')):
+        return conn
+    conn.execute('ATTACH DATABASE ? AS archive', (archive_db_file(),))
+    conn.execute('PRAGMA archive.journal_mode=WAL')
+    for statement in ARCHIVE_SCHEMA:
+        conn.execute(statement)
+    conn.commit()
     return conn
 
+def archive_ads(conn, days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move expired ads (expired `days` ago) and rejected ads (posted `days` ago) into the archive,
+    batch_size per transaction. Commits; returns how many ads moved."""
+    attach_archive(conn)
+    cutoff = f'-{int(days)} days'
+    moved = 0
+    while True:
+        ids = [row[0] for row in conn.execute('''SELECT id FROM main.ads
+        WHERE (status='expired' AND expires_at <= datetime('now', ?))
+           OR (status='rejected' AND created_at <= datetime('now', ?)) LIMIT ?''',
+                                              (cutoff, cutoff, batch_size))]
+        if not ids:
+            return moved
+        marks = ','.join('?' * len(ids))
+        # a rerun after a crash between the two commits finds the copy already there
+        conn.execute(f'DELETE FROM archive.ads WHERE id IN ({marks})', ids)
+        conn.execute(f'''INSERT INTO archive.ads ({AD_COLUMNS})
+        SELECT {AD_COLUMNS} FROM main.ads WHERE id IN ({marks})''', ids)
+        conn.execute(f'''INSERT INTO archive.ad_services SELECT ad_id, position, service
+        FROM main.ad_services WHERE ad_id IN ({marks})''', ids)
+        conn.execute(f'''INSERT INTO archive.ad_photos SELECT ad_id, position, file
+        FROM main.ad_photos WHERE ad_id IN ({marks})''', ids)
+        conn.execute(f'''INSERT INTO archive.ad_stats SELECT ad_id, views, contacts, updated_at
+        FROM main.ad_stats WHERE ad_id IN ({marks})''', ids)
+        conn.execute(f'DELETE FROM main.ads WHERE id IN ({marks})', ids)
+        conn.commit()
+        moved += len(ids)
+
+def restore_ad(conn, ad_id, user_id=None):
+    """Move one archived ad (optionally only if user_id owns it) back into the hot tables.
+    Returns False if there is no such archived ad. Caller attaches the archive and commits."""
+    owner = ' AND user_id=?' if user_id is not None else ''
+    params = (ad_id, user_id) if user_id is not None else (ad_id,)
+    if not conn.execute(f'SELECT 1 FROM archive.ads WHERE id=?{owner}', params).fetchone():
+        return False
+    # OR IGNORE: a hot copy left behind by an interrupted archive batch wins
+    conn.execute(f'''INSERT OR IGNORE INTO main.ads ({AD_COLUMNS})
+    SELECT {AD_COLUMNS} FROM archive.ads WHERE id=?''', (ad_id,))
+    conn.execute('''INSERT OR IGNORE INTO main.ad_services SELECT ad_id, position, service
+    FROM archive.ad_services WHERE ad_id=?''', (ad_id,))
+    conn.execute('''INSERT OR IGNORE INTO main.ad_photos SELECT ad_id, position, file
+    FROM archive.ad_photos WHERE ad_id=?''', (ad_id,))
+    conn.execute('''INSERT OR IGNORE INTO main.ad_stats SELECT ad_id, views, contacts, updated_at
+    FROM archive.ad_stats WHERE ad_id=?''', (ad_id,))
+    conn.execute('DELETE FROM archive.ads WHERE id=?', (ad_id,))
+    flag_duplicates(conn, [ad_id])
+    return True
+
+def delete_archived(conn, where, params=()):
+    """Drop archived ads matching `where` (account deletion). Caller commits."""
+    attach_archive(conn)
+    conn.execute(f'DELETE FROM archive.ads WHERE {where}', params)
+
+def archived_ads_response(where='1', params=()):
+    """List-shape payloads of archived ads, newest archived first, each with its archived_at."""
+    with get_db() as conn:
+        attach_archive(conn)
+        rows = conn.execute(f'''SELECT CAST(json_set(ad_json, '$.archived_at', archived_at) AS BLOB)
+        FROM archive.ads WHERE {where} ORDER BY archived_at DESC, id DESC LIMIT {ARCHIVED_LIMIT}''',
+                            params).fetchall()
+        return json_list_response('ads', [row[0] for row in rows])
+
+def record_table_sizes(conn):
+    """Append a (rows, bytes) sample for the hot and archived ads to table_sizes. Bytes cover
+    the table and its indexes, measured with dbstat. Caller attaches the archive and commits."""
+    for schema in ('main', 'archive'):
+        rows = conn.execute(f'SELECT COUNT(*) FROM {schema}.ads').fetchone()[0]
+        try:
+            size = conn.execute(f'''SELECT COALESCE(SUM(pgsize), 0) FROM dbstat(?) WHERE name IN
+            (SELECT name FROM {schema}.sqlite_master WHERE tbl_name='ads')''', (schema,)).fetchone()[0]
+        except sqlite3.OperationalError:
+            size = None   # SQLite built without dbstat
+        conn.execute('''INSERT OR REPLACE INTO table_sizes (recorded_at, table_name, rows, bytes)
+        VALUES (CURRENT_TIMESTAMP, ?, ?, ?)''', (f'{schema}.ads', rows, size))
+
+# ---- Moderation ----
+# One request, one transaction, one invalidation for any number of moderation actions.
+# An operation names an action and either explicit `ids` or selectors that pick the ads
+# (e.g. all pending ads in a category, or everything by one user).
+MODERATION_STATUS = {'approve': 'active', 'reject': 'rejected', 'expire': 'expired'}
+MODERATION_SELECTORS = ('status', 'category', 'user_id')
+MODERATION_MAX_IDS = 5000
+
+def _moderation_where(op):
+    """(where, params, requested ids or None) for one operation; ValueError if it selects nothing."""
+    if 'ids' in op:
+        try:
+            ids = list(dict.fromkeys(int(i) for i in op['ids']))
+        except (TypeError, ValueError):
+            raise ValueError('ids must be a list of integers')
+        if not ids or len(ids) > MODERATION_MAX_IDS:
+            raise ValueError(f'ids must list 1 to {MODERATION_MAX_IDS} ads')
+        return f"id IN ({','.join('?' * len(ids))})", ids, ids
+    selectors = [(key, op[key]) for key in MODERATION_SELECTORS if op.get(key) not in (None, '')]
+    if not selectors:
+        raise ValueError(f"give ids or at least one of {', '.join(MODERATION_SELECTORS)}")
+    return ' AND '.join(f'{key}=?' for key, _ in selectors), [value for _, value in selectors], None
+
+def moderate(conn, operations):
+    """Apply operations in order. Returns (per-item results, ids changed, ids deleted). Caller commits."""
+    results, changed, deleted = [], set(), set()
+    for index, op in enumerate(operations):
+        action = op.get('action') if isinstance(op, dict) else None
+        if action not in MODERATION_STATUS and action != 'delete':
+            results.append({'op': index, 'error': f'Unknown action: {action}'})
+            continue
+        try:
+            where, params, requested = _moderation_where(op)
+        except (TypeError, ValueError) as e:
+            results.append({'op': index, 'action': action, 'error': str(e)})
+            continue
+        if action == 'delete':
+            ids = [row[0] for row in conn.execute(f'DELETE FROM ads WHERE {where} RETURNING id', params)]
+            deleted.update(ids)
+            changed.difference_update(ids)
+        else:
+            status = MODERATION_STATUS[action]
+            ids = [row[0] for row in conn.execute(f'UPDATE ads SET status=? WHERE {where} RETURNING id',
+                                                  [status, *params])]
+            changed.update(ids)
+        done = set(ids)
+        results.extend({'op': index, 'id': ad_id, 'action': action} for ad_id in ids)
+        if requested is not None:
+            results.extend({'op': index, 'id': ad_id, 'action': action, 'error': 'Ad not found'}
+                           for ad_id in requested if ad_id not in done)
+    return results, changed, deleted
+
+# ---- Engagement ----
+# Views and "Show contact" clicks go through counters.CounterBuffer and reach ad_stats as
+# batched upserts every few seconds; ids of ads that no longer exist are dropped there.
+# The contact number itself is in every listing payload, so 'contacts' counts clicks on
+# the button, not the only way to read it. Neither counts the ad's owner or admins.
+AD_STAT_FIELDS = ('views', 'contacts')
+
+def counts_as_engagement(owner_id):
+    """Whether the current visitor's view or click on an ad of owner_id counts: not the
+    owner's own, nor an admin's (edit-ad.html loads ads through get_ad too)."""
+    user_id = session.get('user_id')
+    return user_id is None or (user_id != owner_id and not is_admin())
+
+def flush_ad_stats(pending):
+    conn = pool.acquire()
+    try:
+        conn.executemany('''INSERT INTO ad_stats (ad_id, views, contacts, updated_at)
+        SELECT ?1, ?2, ?3, CURRENT_TIMESTAMP WHERE EXISTS (SELECT 1 FROM ads WHERE id=?1)
+        ON CONFLICT(ad_id) DO UPDATE SET views = views + excluded.views,
+            contacts = contacts + excluded.contacts, updated_at = excluded.updated_at''',
+                         [(ad_id, views, contacts) for ad_id, (views, contacts) in pending.items()])
+        conn.commit()
+    finally:
+        pool.release(conn)
+
+ad_counters = counters.CounterBuffer(flush_ad_stats, AD_STAT_FIELDS)
+
+# ---- Read caches ----
+# HOOKUPZA_CACHE=local (the default) keeps a SizedLRU per worker; =shared puts every
+# cache in one mmap'd file (shm_cache.py) that all workers on the box read and
+# invalidate together. Either way the writing worker's invalidation is immediate
+# and TTLs bound staleness, so the routes below do not care which one is in use.
+CACHE_BACKEND = os.environ.get('HOOKUPZA_CACHE', 'local')
+SHARED_CACHE_MB = float(os.environ.get('HOOKUPZA_SHARED_CACHE_MB', 64))
+SHARED_CACHE_FILE = os.environ.get('HOOKUPZA_SHARED_CACHE') or shm_cache.default_path(
+    'hookupza-' + hashlib.sha1(os.path.abspath(DB_FILE).encode()).hexdigest()[:12])
+_shared_cache = None
+
+def make_cache(name, max_bytes, ttl, negative_ttl=5, dumps=bytes, loads=bytes):
+    """A cache with the lru.SizedLRU interface; dumps/loads turn values into bytes for the shared backend."""
+    global _shared_cache
+    if CACHE_BACKEND != 'shared':
+        return lru.SizedLRU(max_bytes, ttl, negative_ttl)
+    if _shared_cache is None:
+        _shared_cache = shm_cache.SharedCache(SHARED_CACHE_FILE, SHARED_CACHE_MB)
+    return _shared_cache.namespace(name, ttl, negative_ttl, dumps, loads)
+
+def _dump_detail(value):
+    payload, user_id = value
+    return struct.pack('<q', user_id or 0) + payload
+
+def _load_detail(data):
+    return data[8:], struct.unpack_from('<q', data)[0] or None
+
+# Built get_ad payloads by id, with negative entries for ids that do not exist.
+# Other workers' edits show up within DETAIL_CACHE_SECONDS, like the facet counts.
+DETAIL_CACHE_BYTES = int(float(os.environ.get('HOOKUPZA_DETAIL_CACHE_MB', 16)) * 1024 * 1024)
+DETAIL_CACHE_SECONDS = float(os.environ.get('HOOKUPZA_DETAIL_CACHE_TTL', 30))
+GET_ADS_MAX_IDS = 100
+# First page of /api/public_ads per filter combination; short-lived because new ads must show up fast
+LISTING_CACHE_SECONDS = float(os.environ.get('HOOKUPZA_LISTING_CACHE_TTL', 5))
+# Made by init_caches() when an app is created, so importing this module opens no cache file
+detail_cache = listing_cache = facet_cache = stats_cache = None
+
+def init_caches():
+    global detail_cache, listing_cache, facet_cache, stats_cache
+    detail_cache = make_cache('detail', DETAIL_CACHE_BYTES, DETAIL_CACHE_SECONDS, 5, _dump_detail, _load_detail)
+    listing_cache = make_cache('listing', 8 * 1024 * 1024, LISTING_CACHE_SECONDS)
+    facet_cache = make_cache('facets', 1024 * 1024, FACET_CACHE_SECONDS)
+    stats_cache = make_cache('stats', 64 * 1024, FACET_CACHE_SECONDS)
+
+def invalidate_ads(ad_ids=None):
+    """Call after any commit that changes ads; drops cached ad reads (detail payloads
+    for just ad_ids when given, otherwise all of them) in this worker, or in every
+    worker with the shared backend, and schedules a new static snapshot."""
+    for cache in (facet_cache, listing_cache, stats_cache):
+        cache.invalidate()
+    detail_cache.invalidate(None if ad_ids is None else list(ad_ids))
+    if snapshot_publisher is not None:
+        snapshot_publisher.schedule()
+
+def ad_details(conn, ad_ids):
+    """{id: (detail_json bytes, user_id) or lru.MISSING}, from the cache where possible;
+    the misses are read in one query and cached."""
+    found = detail_cache.get_many(ad_ids)
+    misses = [ad_id for ad_id in ad_ids if ad_id not in found]
+    if misses:
+        rows = conn.execute(f'''SELECT id, CAST(detail_json AS BLOB), user_id FROM ads
+        WHERE id IN ({','.join('?' * len(misses))})''', misses).fetchall()
+        for ad_id, payload, user_id in rows:
+            found[ad_id] = (payload, user_id)
+            detail_cache.put(ad_id, found[ad_id], len(payload))
+        for ad_id in misses:
+            if ad_id not in found:
+                found[ad_id] = lru.MISSING
+                detail_cache.put_missing(ad_id)
+    return found
+
+def facets_payload(conn):
+    """JSON bytes of all facet counts, cached for FACET_CACHE_SECONDS (other workers' writes show up by then)."""
+    body = facet_cache.get('all')
+    if body is not None:
+        return body
+    facets = {name: {} for name in FACET_NAMES}
+    for facet, value, count in conn.execute('''SELECT facet, value, count FROM ad_facets
+    WHERE count > 0 AND value <> '' ORDER BY facet, count DESC, value'''):
+        facets[facet][value] = count
+    body = json.dumps({'facets': facets, 'total': sum(facets['premium'].values())}).encode()
+    facet_cache.put('all', body, len(body))
+    return body
+
+def json_list_response(key, payloads):
+    """Join stored JSON payloads (bytes) into {"key": [...]} without decoding them."""
+    return Response(b'{"' + key.encode() + b'":[' + b','.join(payloads) + b']}', mimetype='application/json')
+
+PUBLIC_LISTING_LIMIT = 100
+
+def public_listing(conn, where=(), params=()):
+    """{"ads": [...]} JSON bytes of the first page of live ads matching where, newest premium first."""
+    where = ["status='active'", "expires_at > datetime('now')", *where]
+    ads = conn.execute(f'''SELECT CAST(ad_json AS BLOB) FROM ads WHERE {' AND '.join(where)}
+    ORDER BY is_premium DESC, created_at DESC LIMIT {PUBLIC_LISTING_LIMIT}''', params).fetchall()
+    return b'{"ads":[' + b','.join(ad[0] for ad in ads) + b']}'
+
+# ---- Static snapshots ----
+# With HOOKUPZA_SNAPSHOT_DIR set, the homepage, a page per category and the listings
+# they load are published as static files (snapshot.py) a few seconds after ads
+# change. Visitors without a session get those, from the front server or from
+# send_snapshot() here, without any database work; logged-in users get the live pages.
+SNAPSHOT_DIR = os.path.join(ROOT, os.environ['HOOKUPZA_SNAPSHOT_DIR']) \
+    if os.environ.get('HOOKUPZA_SNAPSHOT_DIR') else None
+SNAPSHOT_URL = '/snapshot'
+CATEGORY_NAME = re.compile(r'[a-z0-9_-]{1,40}')
+
+def snapshot_files():
+    """{relative path: bytes} of one snapshot, read in one transaction so the pages agree."""
+    with open(os.path.join(ROOT, 'index.html'), 'rb') as f:
+        template = f.read()
+    conn = pool.acquire()
+    try:
+        with conn:
+            conn.execute('BEGIN')
+            facets = facets_payload(conn)
+            files = {'public_ads.json': public_listing(conn), 'facets.json': facets}
+            categories = [value for (value,) in conn.execute(
+                "SELECT value FROM ad_facets WHERE facet='category' AND count > 0") if CATEGORY_NAME.fullmatch(value)]
+            for category in categories:
+                files[f'category/{category}.json'] = public_listing(conn, ['category=?'], [category])
+    finally:
+        pool.release(conn)
+    for category in [None] + categories:
+        listing = 'public_ads.json' if category is None else f'category/{category}.json'
+        page = b'{"category":%s,"urls":{"listing":"%s/%s","facets":"%s/facets.json"},"listing":%s,"facets":%s}' % (
+            json.dumps(category).encode(), SNAPSHOT_URL.encode(), listing.encode(), SNAPSHOT_URL.encode(),
+            files[listing], facets)
+        files['index.html' if category is None else f'category/{category}.html'] = \
+            snapshot.inline_script(template, 'SNAPSHOT', page)
+    return files
+
+snapshot_publisher = snapshot.Publisher(snapshot_files, SNAPSHOT_DIR) if SNAPSHOT_DIR else None
+
+def send_snapshot(name):
+    """The published file name (its .gz when the client accepts gzip), or None when snapshots
+    are off or it has not been published."""
+    path = safe_join(SNAPSHOT_DIR, name) if SNAPSHOT_DIR else None
+    if path is None or not os.path.isfile(path):
+        if snapshot_publisher is not None:
+            snapshot_publisher.start()
+        return None
+    gzipped = 'gzip' in request.headers.get('Accept-Encoding', '') and os.path.isfile(path + '.gz')
+    response = send_from_directory(SNAPSHOT_DIR, name + '.gz' if gzipped else name,
+                                   mimetype=mimetypes.guess_type(name)[0] or 'application/octet-stream')
+    if gzipped:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    # revalidated every time (a 304 is cheap), so a visitor who logs in never sees a cached anonymous page
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# ---- Streaming exports ----
+# Rows are pulled with fetchmany and written out batch by batch, so worker
+# memory stays flat however large the table is.
+EXPORT_BATCH_SIZE = 500
+
+USER_EXPORT_COLUMNS = ['id', 'username', 'email', 'age', 'location', 'account_type', 'role',
+                       'vendor_paid', 'verified', 'created_at']
+USER_JSON = '''CAST(json_object('id', id, 'username', username, 'email', email, 'age', age,
+    'location', location, 'account_type', account_type, 'role', role, 'vendor_paid', vendor_paid,
+    'verified', verified, 'created_at', created_at) AS BLOB)'''
+USER_JSON_SQL = f'SELECT {USER_JSON} FROM users ORDER BY created_at DESC'
+AD_EXPORT_COLUMNS = ['id', 'user_id', 'username', 'title', 'category', 'location', 'status', 'is_premium',
+                     'rate', 'contact', 'created_at', 'expires_at', 'description', 'services', 'photos']
+
+def open_stream(sql, params=()):
+    """Run a query on its own connection; the stream generators close it when done."""
+    conn = connect_db()
+    try:
+        return conn, conn.execute(sql, params)
+    except Exception:
+        conn.close()
+        raise
+
+def _batches(conn, cursor):
+    try:
+        while True:
+            rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+def stream_json_list(key, sql, params=()):
+    """Stream {"key": [...]} from a query whose single column is a JSON payload."""
+    conn, cursor = open_stream(sql, params)
+    def generate():
+        yield b'{"' + key.encode() + b'":['
+        sep = b''
+        for rows in _batches(conn, cursor):
+            yield sep + b','.join(row[0] for row in rows)
+            sep = b','
+        yield b']}'
+    return Response(generate(), mimetype='application/json')
+
+def stream_ndjson(sql, params=(), filename='export.ndjson'):
+    conn, cursor = open_stream(sql, params)
+    def generate():
+        for rows in _batches(conn, cursor):
+            yield b'\n'.join(row[0] for row in rows) + b'\n'
+    return Response(generate(), mimetype='application/x-ndjson',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+def stream_csv(sql, columns, params=(), filename='export.csv'):
+    conn, cursor = open_stream(sql, params)
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for rows in _batches(conn, cursor):
+            writer.writerows(rows)
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+    return Response(generate(), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+def export_response(table, fmt):
+    """Streamed ads/users export. Needs no request context, so asgi.py serves it too."""
+    filename = f"hookupza-{table}-{datetime.now().strftime('%Y%m%d')}.{fmt}"
+    if table == 'ads':
+        json_sql = 'SELECT CAST(ad_json AS BLOB) FROM ads ORDER BY created_at DESC'
+        computed = {'username': '(SELECT username FROM users WHERE users.id=ads.user_id)',
+                    'services': AD_SERVICES_JSON, 'photos': AD_PHOTOS_JSON}
+        csv_sql = f'''SELECT {', '.join(computed.get(c, c) for c in AD_EXPORT_COLUMNS)}
+        FROM ads ORDER BY created_at DESC'''
+        columns = AD_EXPORT_COLUMNS
+    else:
+        json_sql = USER_JSON_SQL
+        csv_sql = f"SELECT {', '.join(USER_EXPORT_COLUMNS)} FROM users ORDER BY created_at DESC"
+        columns = USER_EXPORT_COLUMNS
+    if fmt == 'csv':
+        return stream_csv(csv_sql, columns, filename=filename)
+    if fmt == 'ndjson':
+        return stream_ndjson(json_sql, filename=filename)
+    response = stream_json_list(table, json_sql)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+# ---- Admin paging ----
+# The admin tables fetch ADMIN_PAGE_SIZE rows at a time as they scroll. Pages are keyset-
+# paged on (created_at, id) - the cursor is the last row's "created_at|id" - so a deep
+# page costs the same as the first, and rows inserted meanwhile never shift a page.
+ADMIN_PAGE_SIZE = 100
+ADMIN_PAGE_MAX = 500
+
+def admin_page(conn, key, payload_sql, table, where=(), params=()):
+    """{"key": [...], "next": cursor or null}, newest first; the first page also carries "total"."""
+    limit = max(1, min(request.args.get('limit', ADMIN_PAGE_SIZE, type=int), ADMIN_PAGE_MAX))
+    where, params = list(where), list(params)
+    cursor = request.args.get('cursor')
+    total = None
+    if cursor:
+        created_at, _, last_id = cursor.rpartition('|')
+        if not created_at or not last_id.isdigit():
+            raise ValueError('invalid cursor')
+        where.append('(created_at, id) < (?, ?)')
+        params += [created_at, int(last_id)]
+    else:
+        total = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {' AND '.join(where) or '1'}", params).fetchone()[0]
+    rows = conn.execute(f'''SELECT {payload_sql}, created_at, id FROM {table} WHERE {' AND '.join(where) or '1'}
+    ORDER BY created_at DESC, id DESC LIMIT ?''', params + [limit + 1]).fetchall()
+    next_cursor = f'{rows[limit - 1][1]}|{rows[limit - 1][2]}' if len(rows) > limit else None
+    body = (b'{"' + key.encode() + b'":[' + b','.join(row[0] for row in rows[:limit]) + b'],"next":'
+            + json.dumps(next_cursor).encode() + (b'' if total is None else b',"total":%d' % total) + b'}')
+    return Response(body, mimetype='application/json')
+
+# PRAGMA user_version after init_db(); bump it with every migration added there
+SCHEMA_VERSION = 1
+
 def init_db():
+    """Create the schema and run its migrations; safe to run again. bootstrap.py runs it."""
     with get_db() as conn:
         cursor = conn.cursor()
+        # WAL lets readers in other workers carry on while one worker writes
+        cursor.execute("PRAGMA journal_mode=WAL")
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -79,10 +898,8 @@ def init_db():
             category TEXT NOT NULL,
             location TEXT,
             description TEXT,
-            services TEXT,
             rate TEXT,
             contact TEXT,
-            photos TEXT,
             status TEXT DEFAULT 'pending',
             is_premium INTEGER DEFAULT 0,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -90,25 +907,235 @@ def init_db():
             FOREIGN KEY (user_id) REFERENCES users (id)
         )
         ''')
-        # ✅ Auto-seed default accounts if DB is empty (fixes Render fresh deployments)
-        cursor.execute("SELECT COUNT(*) FROM users")
-        if cursor.fetchone()[0] == 0:
-            from werkzeug.security import generate_password_hash as gph
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ad_services (
+            ad_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            service TEXT NOT NULL,
+            PRIMARY KEY (ad_id, position),
+            UNIQUE (ad_id, service)
+        ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ad_photos (
+            ad_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            file TEXT NOT NULL,
+            PRIMARY KEY (ad_id, position)
+        ) WITHOUT ROWID
+        ''')
+        # One row per uploaded file (keyed by its /uploads/ path): size and placeholder for cards
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS photo_meta (
+            file TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            width INTEGER,
+            height INTEGER,
+            color TEXT,
+            placeholder TEXT,
+            srcset TEXT,
+            variants TEXT NOT NULL DEFAULT '[]',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_ad_services_service ON ad_services(service, ad_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_ad_photos_file ON ad_photos(file)")
+        cursor.execute('''CREATE TRIGGER IF NOT EXISTS ads_delete_children AFTER DELETE ON ads BEGIN
+            DELETE FROM ad_services WHERE ad_id=old.id;
+            DELETE FROM ad_photos WHERE ad_id=old.id;
+        END''')
+        facets_exist = cursor.execute("SELECT 1 FROM sqlite_master WHERE name='ad_facets'").fetchone()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ad_facets (
+            facet TEXT NOT NULL,
+            value TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (facet, value)
+        ) WITHOUT ROWID
+        ''')
+        cursor.execute("PRAGMA table_info(ads)")
+        ad_columns = {row['name'] for row in cursor.fetchall()}
+        if 'ad_json' not in ad_columns:
+            cursor.execute("ALTER TABLE ads ADD COLUMN ad_json TEXT")
+            cursor.execute("ALTER TABLE ads ADD COLUMN detail_json TEXT")
+            print("Added ad_json/detail_json columns")
+        if 'lat' not in ad_columns:
+            cursor.execute("ALTER TABLE ads ADD COLUMN lat REAL")
+            cursor.execute("ALTER TABLE ads ADD COLUMN lon REAL")
+            geocode_ads(conn)
+            print("Added lat/lon columns")
+        if 'duplicate_of' not in ad_columns:
+            cursor.execute("ALTER TABLE ads ADD COLUMN duplicate_of INTEGER")
+            print("Added duplicate_of column")
+        if 'photos' in ad_columns:
+            # One-off move of the old JSON text columns into the child tables
+            import_ad_children(conn, 'ads')
+            cursor.execute("ALTER TABLE ads DROP COLUMN services")
+            cursor.execute("ALTER TABLE ads DROP COLUMN photos")
+            print("Moved services/photos into ad_services/ad_photos")
+        refresh_ad_json(conn, where='ad_json IS NULL')
+        for trigger in FACET_TRIGGERS:
+            cursor.execute(trigger)
+        if not facets_exist:
+            rebuild_facets(conn)
+            print("Built ad_facets counts")
+        geo_exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE name='ad_geo'").fetchone()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ad_points (
+            id INTEGER PRIMARY KEY,
+            lat REAL NOT NULL,
+            lon REAL NOT NULL,
+            UNIQUE (lat, lon)
+        )
+        ''')
+        cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS ad_geo USING rtree(id, min_lat, max_lat, min_lon, max_lon)")
+        cursor.execute('''CREATE INDEX IF NOT EXISTS idx_ads_geo
+        ON ads(lat, lon, status, is_premium, created_at, expires_at)''')
+        for trigger in GEO_TRIGGERS:
+            cursor.execute(trigger)
+        if not geo_exists:
+            rebuild_geo(conn)
+            print("Built ad_geo index")
+        lsh_exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE name='ad_lsh'").fetchone()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ad_lsh (
+            bucket INTEGER NOT NULL,
+            ad_id INTEGER NOT NULL,
+            PRIMARY KEY (bucket, ad_id)
+        ) WITHOUT ROWID
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_ad_lsh_ad ON ad_lsh(ad_id)")
+        cursor.execute('''CREATE TRIGGER IF NOT EXISTS ads_delete_lsh AFTER DELETE ON ads BEGIN
+            DELETE FROM ad_lsh WHERE ad_id=old.id;
+        END''')
+        # Admin "Duplicates" tab: only flagged ads, newest first (admin_page)
+        cursor.execute('''CREATE INDEX IF NOT EXISTS idx_ads_duplicates
+        ON ads(created_at, id) WHERE duplicate_of IS NOT NULL''')
+        if not lsh_exists:
+            rebuild_lsh(conn)
+            print("Built ad_lsh index")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_ads_created ON ads(created_at)")
+        # Listing order for the public pages: filters on top of this stop after LIMIT rows
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_ads_live ON ads(status, is_premium, created_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_created ON users(created_at)")
+        # Admin tabs page through one status newest first (admin_page)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_ads_status_created ON ads(status, created_at)")
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ad_stats (
+            ad_id INTEGER PRIMARY KEY,
+            views INTEGER NOT NULL DEFAULT 0,
+            contacts INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP
+        )
+        ''')
+        cursor.execute('''CREATE TRIGGER IF NOT EXISTS ads_delete_stats AFTER DELETE ON ads BEGIN
+            DELETE FROM ad_stats WHERE ad_id=old.id;
+        END''')
+        # Hot/archive size samples, one pair per archive run (see record_table_sizes)
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS table_sizes (
+            recorded_at TIMESTAMP NOT NULL,
+            table_name TEXT NOT NULL,
+            rows INTEGER NOT NULL,
+            bytes INTEGER,
+            PRIMARY KEY (recorded_at, table_name)
+        ) WITHOUT ROWID
+        ''')
+        cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        conn.commit()
+        print("Database ready!")
+    conn.close()
+
+def seed_accounts():
+    """Default accounts on a database without users (fixes Render fresh deployments)."""
+    with get_db() as conn:
+        if conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0:
             accounts = [
-                ('admin',   gph('admin123'),   'vendor', 'admin'),
-                ('vendor1', gph('vendor123'),  'vendor', 'user'),
-                ('test1',   gph('test123'),    'free',   'user'),
+                ('admin',   generate_password_hash('admin123'),   'vendor', 'admin'),
+                ('vendor1', generate_password_hash('vendor123'),  'vendor', 'user'),
+                ('test1',   generate_password_hash('test123'),    'free',   'user'),
             ]
             for username, pw_hash, acc_type, role in accounts:
-                cursor.execute('''INSERT INTO users (username, password_hash, age, account_type, role, verified)
+                conn.execute('''INSERT INTO users (username, password_hash, age, account_type, role, verified)
                 VALUES (?, ?, '25-34', ?, ?, 1)''', (username, pw_hash, acc_type, role))
             conn.commit()
             print("✅ Seeded default accounts: admin/admin123, vendor1/vendor123, test1/test123")
+    conn.close()
 
-        conn.commit()
-        print("Database ready!")
+def warm_up():
+    """Open pooled connections, start the snapshot publisher and pull the hot listing pages into
+    SQLite's page cache. Called from the gunicorn post_fork hook so the first real request is not the cold one."""
+    pool.fill()
+    if snapshot_publisher is not None:
+        snapshot_publisher.start()
+    conn = pool.acquire()
+    try:
+        conn.execute('''SELECT CAST(ad_json AS BLOB) FROM ads WHERE status='active' AND expires_at > datetime('now')
+        ORDER BY is_premium DESC, created_at DESC LIMIT 100''').fetchall()
+        for (category,) in conn.execute("SELECT DISTINCT category FROM ads WHERE status='active'").fetchall():
+            conn.execute('''SELECT CAST(ad_json AS BLOB) FROM ads WHERE status='active' AND category=?
+            AND expires_at > datetime('now') ORDER BY is_premium DESC, created_at DESC LIMIT 100''',
+                         (category,)).fetchall()
+    finally:
+        pool.release(conn)
+
+# ---- Application ----
+# Importing this module only defines things: no database, upload folder, cache file or
+# thread is touched, and flask_cors and Pillow are not loaded. create_app() builds a
+# configured app (tests and tools can make their own); `app`, for gunicorn app:app,
+# asgi.py and the scripts, is made by it on first access. Setting up the database is
+# bootstrap.py's job. create_app() does it too when the schema is behind
+# SCHEMA_VERSION (a fresh deploy, a new migration), unless HOOKUPZA_AUTO_BOOTSTRAP=0.
+AUTO_BOOTSTRAP = os.environ.get('HOOKUPZA_AUTO_BOOTSTRAP', '1') == '1'
+_app_lock = threading.Lock()
+
+def schema_version():
+    conn = connect_db()
+    try:
+        return conn.execute('PRAGMA user_version').fetchone()[0]
+    finally:
+        conn.close()
 
-init_db()
+def bootstrap():
+    """Schema, migrations and, on a database without users, the default accounts."""
+    init_db()
+    seed_accounts()
+
+def create_app(config=None):
+    """A Flask app serving every route, with APP_CONFIG updated by config."""
+    from flask_cors import CORS
+    flask_app = Flask(__name__, static_folder='.', static_url_path='')
+    flask_app.config.update(APP_CONFIG)
+    flask_app.config.update(config or {})
+    CORS(flask_app,
+         supports_credentials=True,
+         origins=ALLOWED_ORIGINS,
+         allow_headers=CORS_ALLOW_HEADERS,
+         expose_headers=['Server-Timing', 'Retry-After'],
+         methods=CORS_METHODS,
+         max_age=PREFLIGHT_MAX_AGE)
+    flask_app.wsgi_app = PreflightMiddleware(flask_app.wsgi_app, ALLOWED_ORIGINS)
+    flask_app.register_blueprint(bp)
+    flask_app.teardown_appcontext(release_db)
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    init_caches()
+    version = schema_version()
+    if version < SCHEMA_VERSION:
+        if not AUTO_BOOTSTRAP:
+            raise RuntimeError(f'{DB_FILE} has schema version {version}, {SCHEMA_VERSION} is needed: '
+                               'run python3 bootstrap.py')
+        bootstrap()
+    return flask_app
+
+def __getattr__(name):
+    """`app` is created the first time it is asked for (a module __getattr__, PEP 562)."""
+    global app
+    if name != 'app':
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    with _app_lock:
+        if 'app' not in globals():
+            app = create_app()
+    return app
 
 def debug_session(f):
     def wrapper(*args, **kwargs):
@@ -117,25 +1144,84 @@ def debug_session(f):
     wrapper.__name__ = f.__name__
     return wrapper
 
-def is_admin():
+def current_user():
+    """The logged-in user's row (None when logged out), read once per request; the
+    sub-requests of an /api/batch share it."""
     if 'user_id' not in session:
-        return False
-    with get_db() as conn:
-        user = conn.execute('SELECT role FROM users WHERE id=?', (session['user_id'],)).fetchone()
-        return dict(user).get('role') == 'admin' if user else False
+        return None
+    if g.get('_user_id') != session['user_id']:
+        g._user = get_db().execute('SELECT * FROM users WHERE id=?', (session['user_id'],)).fetchone()
+        g._user_id = session['user_id']
+    return g._user
+
+def is_admin():
+    user = current_user()
+    return dict(user).get('role') == 'admin' if user else False
+
+def view_name():
+    """The matched route's function name, as rate_limit.RATE_LIMITS and BATCH_ENDPOINTS know it
+    (request.endpoint carries the blueprint's prefix)."""
+    return request.endpoint.rpartition('.')[2] if request.endpoint else None
+
+# Throttle expensive routes before the body is parsed or a password is hashed
+@bp.before_app_request
+def enforce_rate_limit():
+    if request.method == 'OPTIONS': return None
+    wait = rate_limit.check(view_name(), rate_limit.client_ip(request), session.get('user_id'))
+    if wait:
+        retry_after = max(1, int(wait + 0.999))
+        print(f"Rate limited: {view_name()} ip={rate_limit.client_ip(request)} retry_after={retry_after}s")
+        response = jsonify({'error': f'Too many requests. Try again in {retry_after} seconds.'})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(retry_after)
+        return response
 
-@app.route('/')
+# Per-request SQL breakdown: send "X-Profile: 1" (admins, or anyone in debug mode)
+@bp.before_app_request
+def start_sql_profile():
+    g.sql_profile = False
+    if request.headers.get('X-Profile') == '1' and (current_app.debug or is_admin()):
+        g.sql_profile = True
+        db_profiler.start_request_profile()
+
+@bp.after_app_request
+def finish_sql_profile(response):
+    if not g.get('sql_profile'):
+        return response
+    profile = db_profiler.end_request_profile()
+    response.headers['Server-Timing'] = f"db;dur={profile['total_ms']};desc=\"{len(profile['statements'])} statements\""
+    if response.is_json and not response.is_streamed:
+        body = response.get_json(silent=True)
+        if isinstance(body, dict):
+            body['_profile'] = profile
+            response.set_data(json.dumps(body))
+    return response
+
+@bp.route('/')
 def serve_index():
+    if snapshot_publisher is not None and 'user_id' not in session:
+        category = request.args.get('category')
+        if not category:
+            response = send_snapshot('index.html')
+        elif CATEGORY_NAME.fullmatch(category):
+            response = send_snapshot(f'category/{category}.html')
+        else:
+            response = None
+        if response is not None:
+            return response
     return send_from_directory('.', 'index.html')
 
-@app.route('/uploads/<filename>')
+@bp.route(f'{SNAPSHOT_URL}/<path:name>')
+def serve_snapshot(name):
+    return send_snapshot(name) or (jsonify({'error': 'Not published'}), 404)
+
+@bp.route('/uploads/<filename>')
 def uploaded_file(filename):
     return send_from_directory(UPLOAD_FOLDER, filename)
 
-@app.route('/api/signup', methods=['POST', 'OPTIONS'])
+@bp.route('/api/signup', methods=['POST'])
 @debug_session
 def signup():
-    if request.method == 'OPTIONS': return '', 204
     try:
         data = request.json
         username = data.get('username', '').strip()
@@ -172,10 +1258,9 @@ def signup():
         print(f"Signup error: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/login', methods=['POST', 'OPTIONS'])
+@bp.route('/api/login', methods=['POST'])
 @debug_session
 def login():
-    if request.method == 'OPTIONS': return '', 204
     try:
         data = request.json
         username = data.get('username', '').strip()
@@ -203,41 +1288,44 @@ def login():
         print(f"Login error: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/check_auth', methods=['GET', 'OPTIONS'])
+@bp.route('/api/check_auth', methods=['GET'])
 @debug_session
 def check_auth():
-    if request.method == 'OPTIONS': return '', 204
     if 'user_id' not in session:
         return jsonify({'logged_in': False, 'error': 'Not logged in'}), 401
-    with get_db() as conn:
-        user = conn.execute('SELECT * FROM users WHERE id=?', (session['user_id'],)).fetchone()
-        if not user:
-            session.clear()
-            return jsonify({'logged_in': False}), 401
-        u = dict(user)
-        return jsonify({'logged_in': True, 'authenticated': True, 'username': u['username'],
-                        'role': u.get('role','user'), 'account_type': u.get('account_type','free'),
-                        'user_id': u['id'],
-                        'user_data': {'user_id': u['id'], 'username': u['username'],
-                                      'account_type': u.get('account_type','free'),
-                                      'age': u.get('age'), 'location': u.get('location'),
-                                      'email': u.get('email'), 'verified': bool(u.get('verified',0)),
-                                      'vendor_paid': bool(u.get('vendor_paid',0)),
-                                      'created_at': u.get('created_at'), 'role': u.get('role','user')}})
-
-@app.route('/api/logout', methods=['POST', 'OPTIONS'])
+    user = current_user()
+    if not user:
+        session.clear()
+        return jsonify({'logged_in': False}), 401
+    u = dict(user)
+    return jsonify({'logged_in': True, 'authenticated': True, 'username': u['username'],
+                    'role': u.get('role','user'), 'account_type': u.get('account_type','free'),
+                    'user_id': u['id'],
+                    'user_data': {'user_id': u['id'], 'username': u['username'],
+                                  'account_type': u.get('account_type','free'),
+                                  'age': u.get('age'), 'location': u.get('location'),
+                                  'email': u.get('email'), 'verified': bool(u.get('verified',0)),
+                                  'vendor_paid': bool(u.get('vendor_paid',0)),
+                                  'created_at': u.get('created_at'), 'role': u.get('role','user')}})
+
+@bp.route('/api/logout', methods=['POST'])
 @debug_session
 def logout():
-    if request.method == 'OPTIONS': return '', 204
     username = session.get('username', 'Unknown')
     session.clear()
     print(f"Logout: {username}")
     return jsonify({'message': 'Logged out successfully'})
 
-@app.route('/api/post_ad', methods=['POST', 'OPTIONS'])
+def listing_terms():
+    """(days, is_premium, status) for an ad the current user lists or relists.
+    Admin OR vendor = live immediately, 30 days; free user = pending, 3 days."""
+    if session.get('role', 'user') == 'admin' or session.get('account_type', 'free') == 'vendor':
+        return 30, 1, 'active'
+    return 3, 0, 'pending'
+
+@bp.route('/api/post_ad', methods=['POST'])
 @debug_session
 def post_ad():
-    if request.method == 'OPTIONS': return '', 204
     if 'user_id' not in session:
         return jsonify({'error': 'Login required'}), 401
     try:
@@ -248,81 +1336,177 @@ def post_ad():
         contact = data.get('contact','').strip()
         if not title or not category or not description or not contact:
             return jsonify({'error': 'Missing required fields'}), 400
-        account_type = session.get('account_type', 'free')
-        role = session.get('role', 'user')
-        # Admin OR vendor = live immediately, 30 days
-        # Free user = pending, 3 days
-        if role == 'admin' or account_type == 'vendor':
-            days, is_premium, status = 30, 1, 'active'
-        else:
-            days, is_premium, status = 3, 0, 'pending'
+        days, is_premium, status = listing_terms()
         with get_db() as conn:
             cursor = conn.execute('''
-            INSERT INTO ads (user_id, title, category, location, description, services, rate, contact, photos, status, is_premium, expires_at)
+            INSERT INTO ads (user_id, title, category, location, lat, lon, description, rate, contact, status, is_premium, expires_at)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now', '+' || ? || ' days'))
-            ''', (session['user_id'], title, category, data.get('location',''), description,
-                  json.dumps(data.get('services',[])), data.get('rate',''), contact,
-                  json.dumps(data.get('photos',[])), status, is_premium, str(days)))
+            ''', (session['user_id'], title, category, data.get('location',''), *geocode_location(data.get('location','')),
+                  description, data.get('rate',''), contact, status, is_premium, str(days)))
             ad_id = cursor.lastrowid
+            save_ad_children(conn, ad_id, data.get('services', []), data.get('photos', []))
+            duplicate_of = flag_duplicates(conn, [ad_id])[ad_id]
+            refresh_ad_json(conn, [ad_id])
             conn.commit()
-        print(f"Ad posted: ID={ad_id} status={status} premium={is_premium}")
-        return jsonify({'message': 'Ad posted successfully', 'ad_id': ad_id, 'status': status, 'expires_in_days': days}), 201
+            invalidate_ads([ad_id])
+        print(f"Ad posted: ID={ad_id} status={status} premium={is_premium} duplicate_of={duplicate_of}")
+        return jsonify({'message': 'Ad posted successfully', 'ad_id': ad_id, 'status': status, 'expires_in_days': days,
+                        'duplicate_of': duplicate_of}), 201
     except Exception as e:
         print(f"Post ad error: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/public_ads', methods=['GET', 'OPTIONS'])
+@bp.route('/api/public_ads', methods=['GET'])
 def get_public_ads():
-    if request.method == 'OPTIONS': return '', 204
+    """Active ads, newest premium first. Optional filters combine:
+    category, location, service, premium (1/0)."""
+    try:
+        where, params = [], []
+        for column in ('category', 'location'):
+            value = request.args.get(column, 'all')
+            if value != 'all':
+                where.append(f'{column}=?')
+                params.append(value)
+        if request.args.get('premium') in ('0', '1'):
+            where.append('is_premium=?')
+            params.append(int(request.args['premium']))
+        if request.args.get('service'):
+            where.append('id IN (SELECT ad_id FROM ad_services WHERE service=?)')
+            params.append(request.args['service'])
+        key = json.dumps([where, params])
+        body = listing_cache.get(key)
+        if body is None:
+            with get_db() as conn:
+                body = public_listing(conn, where, params)
+            listing_cache.put(key, body, len(body))
+        return Response(body, mimetype='application/json')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/ads/nearby', methods=['GET'])
+def get_nearby_ads():
+    """Active ads within radius km of lat/lon (or of a named place: near=Cape Town).
+    Premium first, then nearest, then newest; each ad carries distance_km."""
+    try:
+        if request.args.get('near'):
+            place = geo.geocode(request.args['near'])
+            if not place: return jsonify({'error': 'Unknown place'}), 404
+            lat, lon = place[0], place[1]
+        else:
+            lat, lon = float(request.args['lat']), float(request.args['lon'])
+        radius = min(float(request.args.get('radius', 25)), NEARBY_MAX_RADIUS_KM)
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180 and radius > 0): raise ValueError
+    except (KeyError, ValueError):
+        return jsonify({'error': 'lat and lon (or near) and a positive radius are required'}), 400
     try:
-        category = request.args.get('category', 'all')
         with get_db() as conn:
-            if category == 'all':
-                ads = conn.execute('''SELECT a.*, u.username FROM ads a JOIN users u ON a.user_id=u.id
-                WHERE a.status='active' AND a.expires_at > datetime('now')
-                ORDER BY a.is_premium DESC, a.created_at DESC LIMIT 100''').fetchall()
-            else:
-                ads = conn.execute('''SELECT a.*, u.username FROM ads a JOIN users u ON a.user_id=u.id
-                WHERE a.status='active' AND a.category=? AND a.expires_at > datetime('now')
-                ORDER BY a.is_premium DESC, a.created_at DESC LIMIT 100''', (category,)).fetchall()
-            return jsonify({'ads': [dict(ad) for ad in ads]})
+            ads = nearby_ads(conn, lat, lon, radius)
+        return json_list_response('ads', [b'{"distance_km":%.2f,' % distance + payload[1:] for distance, payload in ads])
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/my_ads', methods=['GET', 'OPTIONS'])
+@bp.route('/api/ads/facets', methods=['GET'])
+def get_ad_facets():
+    try:
+        with get_db() as conn:
+            response = Response(facets_payload(conn), mimetype='application/json')
+        response.headers['Cache-Control'] = f'public, max-age={int(FACET_CACHE_SECONDS)}'
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/my_ads', methods=['GET'])
 @debug_session
 def my_ads():
-    if request.method == 'OPTIONS': return '', 204
     if 'user_id' not in session:
         return jsonify({'error': 'Login required'}), 401
     try:
         with get_db() as conn:
-            ads = conn.execute('''SELECT id, title, category, location, description, status, is_premium, created_at, expires_at, photos, contact, rate
-            FROM ads WHERE user_id=? ORDER BY created_at DESC''', (session['user_id'],)).fetchall()
-            return jsonify({'ads': [dict(ad) for ad in ads]})
+            ads = conn.execute('''SELECT CAST(json_set(a.ad_json, '$.views', COALESCE(s.views, 0),
+                '$.contacts', COALESCE(s.contacts, 0)) AS BLOB)
+            FROM ads a LEFT JOIN ad_stats s ON s.ad_id=a.id
+            WHERE a.user_id=? ORDER BY a.created_at DESC''', (session['user_id'],)).fetchall()
+            return json_list_response('ads', [ad[0] for ad in ads])
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/my_ads/archived', methods=['GET'])
+@debug_session
+def my_archived_ads():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Login required'}), 401
+    try:
+        return archived_ads_response('user_id=?', (session['user_id'],))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/restore_ad/<int:ad_id>', methods=['POST'])
+@debug_session
+def restore_my_ad(ad_id):
+    """Bring an archived ad back, relisted on the same terms as a new post."""
+    if 'user_id' not in session: return jsonify({'error': 'Login required'}), 401
+    try:
+        days, is_premium, status = listing_terms()
+        with get_db() as conn:
+            attach_archive(conn)
+            if not restore_ad(conn, ad_id, session['user_id']):
+                return jsonify({'error': 'Archived ad not found or unauthorized'}), 404
+            conn.execute('''UPDATE ads SET status=?, is_premium=?, created_at=CURRENT_TIMESTAMP,
+            expires_at=datetime('now', '+' || ? || ' days') WHERE id=?''', (status, is_premium, str(days), ad_id))
+            refresh_ad_json(conn, [ad_id])
+            conn.commit()
+            invalidate_ads([ad_id])
+        return jsonify({'message': 'Ad restored', 'ad_id': ad_id, 'status': status, 'expires_in_days': days})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/get_ad/<int:ad_id>', methods=['GET'])
+@bp.route('/api/get_ad/<int:ad_id>', methods=['GET'])
 def get_ad_detail(ad_id):
     try:
         with get_db() as conn:
-            ad = conn.execute('''SELECT a.*, u.username, u.account_type FROM ads a
-            JOIN users u ON a.user_id=u.id WHERE a.id=?''', (ad_id,)).fetchone()
-            if not ad: return jsonify({'error': 'Ad not found'}), 404
-            ad_dict = dict(ad)
-            for field in ['services', 'photos']:
-                if ad_dict.get(field):
-                    try: ad_dict[field] = json.loads(ad_dict[field])
-                    except: pass
-            return jsonify({'ad': ad_dict})
+            ad = ad_details(conn, [ad_id])[ad_id]
+            if ad is lru.MISSING: return jsonify({'error': 'Ad not found'}), 404
+            if counts_as_engagement(ad[1]):
+                ad_counters.add(ad_id, 'views')
+            return Response(b'{"ad":' + ad[0] + b'}', mimetype='application/json')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/get_ads', methods=['GET'])
+def get_ads_batch():
+    """Detail payloads for ?ids=1,2,3 (at most GET_ADS_MAX_IDS) in the order asked,
+    plus the ids that do not exist. Does not count views."""
+    try:
+        ad_ids = list(dict.fromkeys(int(part) for part in request.args.get('ids', '').split(',') if part.strip()))
+    except ValueError:
+        return jsonify({'error': 'ids must be comma-separated integers'}), 400
+    if not ad_ids or len(ad_ids) > GET_ADS_MAX_IDS:
+        return jsonify({'error': f'ids must list 1 to {GET_ADS_MAX_IDS} ads'}), 400
+    try:
+        with get_db() as conn:
+            found = ad_details(conn, ad_ids)
+        payloads = [found[ad_id][0] for ad_id in ad_ids if found[ad_id] is not lru.MISSING]
+        missing = [ad_id for ad_id in ad_ids if found[ad_id] is lru.MISSING]
+        return Response(b'{"ads":[' + b','.join(payloads) + b'],"missing":' + json.dumps(missing).encode() + b'}',
+                        mimetype='application/json')
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/edit_ad/<int:ad_id>', methods=['PUT', 'OPTIONS'])
+@bp.route('/api/ads/<int:ad_id>/<any(view, contact):event>', methods=['POST'])
+def record_ad_event(ad_id, event):
+    """Count a view (detail opened from a listing) or a "Show contact" click, unless the
+    visitor owns the ad or is an admin. Buffered, so 204; 404 for an ad that does not exist,
+    which keeps made-up ids out of the buffer."""
+    with get_db() as conn:
+        ad = ad_details(conn, [ad_id])[ad_id]
+    if ad is lru.MISSING: return jsonify({'error': 'Ad not found'}), 404
+    if counts_as_engagement(ad[1]):
+        ad_counters.add(ad_id, event + 's')
+    return '', 204
+
+@bp.route('/api/edit_ad/<int:ad_id>', methods=['PUT'])
 @debug_session
 def edit_ad(ad_id):
-    if request.method == 'OPTIONS': return '', 204
     if 'user_id' not in session: return jsonify({'error': 'Login required'}), 401
     try:
         with get_db() as conn:
@@ -332,25 +1516,25 @@ def edit_ad(ad_id):
             if ad_dict['user_id'] != session['user_id'] and not is_admin():
                 return jsonify({'error': 'Unauthorized'}), 403
             data = request.json
-            services = data.get('services', ad_dict['services'])
-            photos = data.get('photos', ad_dict['photos'])
-            if isinstance(services, list): services = json.dumps(services)
-            if isinstance(photos, list): photos = json.dumps(photos)
-            conn.execute('''UPDATE ads SET title=?,description=?,category=?,location=?,
-            services=?,rate=?,contact=?,photos=? WHERE id=?''',
+            location = data.get('location',ad_dict['location'])
+            conn.execute('''UPDATE ads SET title=?,description=?,category=?,location=?,lat=?,lon=?,
+            rate=?,contact=? WHERE id=?''',
             (data.get('title',ad_dict['title']), data.get('description',ad_dict['description']),
-             data.get('category',ad_dict['category']), data.get('location',ad_dict['location']),
-             services, data.get('rate',ad_dict['rate']), data.get('contact',ad_dict['contact']),
-             photos, ad_id))
+             data.get('category',ad_dict['category']), location, *geocode_location(location),
+             data.get('rate',ad_dict['rate']), data.get('contact',ad_dict['contact']), ad_id))
+            save_ad_children(conn, ad_id, data.get('services'), data.get('photos'))
+            if 'title' in data or 'description' in data:
+                flag_duplicates(conn, [ad_id])
+            refresh_ad_json(conn, [ad_id])
             conn.commit()
+            invalidate_ads([ad_id])
         return jsonify({'message': 'Ad updated successfully'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/delete_ad/<int:ad_id>', methods=['DELETE', 'OPTIONS'])
+@bp.route('/api/delete_ad/<int:ad_id>', methods=['DELETE'])
 @debug_session
 def delete_ad(ad_id):
-    if request.method == 'OPTIONS': return '', 204
     if 'user_id' not in session: return jsonify({'error': 'Login required'}), 401
     try:
         with get_db() as conn:
@@ -358,50 +1542,230 @@ def delete_ad(ad_id):
             if not ad: return jsonify({'error': 'Ad not found or unauthorized'}), 404
             conn.execute('DELETE FROM ads WHERE id=?', (ad_id,))
             conn.commit()
+            invalidate_ads([ad_id])
         return jsonify({'message': 'Ad deleted successfully'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/delete_account', methods=['DELETE', 'OPTIONS'])
+@bp.route('/api/delete_account', methods=['DELETE'])
 @debug_session
 def delete_account():
-    if request.method == 'OPTIONS': return '', 204
     if 'user_id' not in session: return jsonify({'error': 'Login required'}), 401
     try:
         user_id = session['user_id']
         with get_db() as conn:
-            conn.execute('DELETE FROM ads WHERE user_id=?', (user_id,))
+            delete_archived(conn, 'user_id=?', (user_id,))
+            ad_ids = [row[0] for row in conn.execute('DELETE FROM ads WHERE user_id=? RETURNING id', (user_id,))]
             conn.execute('DELETE FROM users WHERE id=?', (user_id,))
             conn.commit()
+            invalidate_ads(ad_ids)
         session.clear()
         return jsonify({'message': 'Account deleted successfully'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/upload_photo', methods=['POST', 'OPTIONS'])
+# ---- Batched reads ----
+# A page's first loads (auth check, its lists, stats) in one round trip. Each
+# sub-request is routed and run as if it had come on its own, in a nested
+# request context that shares this request's session, app context - so one
+# pooled connection and one current_user() lookup - and rate limits. Only GET
+# routes in BATCH_ENDPOINTS can be batched.
+BATCH_MAX_REQUESTS = 8
+BATCH_ENDPOINTS = {
+    'check_auth', 'get_public_ads', 'get_ad_facets', 'get_nearby_ads', 'get_ad_detail', 'get_ads_batch',
+    'my_ads', 'my_archived_ads', 'check_admin_role', 'admin_stats', 'admin_all_ads', 'admin_ad_stats',
+    'admin_archived_ads', 'admin_table_sizes', 'get_all_users',
+}
+
+def run_subrequest(path):
+    """(status, JSON body bytes) of GET path, run inside the current request."""
+    path, _, query = path.partition('?')
+    environ = dict(request.environ, REQUEST_METHOD='GET', PATH_INFO=path, QUERY_STRING=query,
+                   CONTENT_LENGTH='0', CONTENT_TYPE='')
+    environ['wsgi.input'] = io.BytesIO()
+    with RequestContext(current_app._get_current_object(), environ, session=session._get_current_object()):
+        if request.routing_exception is not None or view_name() not in BATCH_ENDPOINTS:
+            return 404, json.dumps({'error': 'Not a batchable endpoint'}).encode()
+        wait = rate_limit.check(view_name(), rate_limit.client_ip(request), session.get('user_id'))
+        if wait:
+            return 429, json.dumps({'error': f'Too many requests. Try again in {max(1, int(wait + 0.999))} seconds.'}).encode()
+        try:
+            response = current_app.make_response(current_app.dispatch_request())
+        except Exception as e:
+            return 500, json.dumps({'error': str(e)}).encode()
+        body = response.get_data()
+        return response.status_code, body if response.is_json else json.dumps(body.decode('utf-8', 'replace')).encode()
+
+@bp.route('/api/batch', methods=['POST'])
+def batch():
+    """{"requests": ["/api/check_auth", "/api/my_ads", ...]} -> {"responses": [{"status", "body"}, ...]},
+    in the same order. The batch itself succeeds even when some sub-requests do not."""
+    paths = (request.get_json(silent=True) or {}).get('requests')
+    if not isinstance(paths, list) or not paths or not all(isinstance(p, str) and p.startswith('/api/') for p in paths):
+        return jsonify({'error': 'requests must be a list of /api/ paths'}), 400
+    if len(paths) > BATCH_MAX_REQUESTS:
+        return jsonify({'error': f'At most {BATCH_MAX_REQUESTS} requests per batch'}), 400
+    parts = [b'{"status":%d,"body":%s}' % run_subrequest(path) for path in paths]
+    return Response(b'{"responses":[' + b','.join(parts) + b']}', mimetype='application/json')
+
+# ---- Photo uploads ----
+# Saving a photo and describing it (images.py: placeholder, variants) is the slow part, so
+# /api/upload_photos runs them on a small per-worker thread pool; Pillow and file writes
+# release the GIL. Every file is checked against the limits before any is written, and
+# whatever a failed file - or a batch that fails as a whole - wrote is removed again.
+_upload_pool = {'pid': None, 'executor': None}
+_upload_pool_lock = threading.Lock()
+
+def upload_executor():
+    """This worker's upload pool, made on first use so a forked worker never shares the master's."""
+    with _upload_pool_lock:
+        if _upload_pool['pid'] != os.getpid():
+            from concurrent.futures import ThreadPoolExecutor
+            _upload_pool['executor'] = ThreadPoolExecutor(UPLOAD_WORKERS, thread_name_prefix='hookupza-upload')
+            _upload_pool['pid'] = os.getpid()
+        return _upload_pool['executor']
+
+def upload_size(file):
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(0)
+    return size
+
+def check_upload(file):
+    """Why an uploaded file cannot be accepted, or None."""
+    if file.filename == '' or not allowed_file(file.filename):
+        return 'Invalid file'
+    if upload_size(file) > MAX_FILE_SIZE:
+        return 'File too large (max 5MB)'
+    return None
+
+def remove_upload(filename, variants=None):
+    """Delete an upload and its variants (every possible variant when not given)."""
+    if variants is None:
+        variants = [os.path.basename(images.variant_path(filename, width)) for width in images.VARIANT_WIDTHS]
+    for name in [filename, *variants]:
+        path = os.path.join(UPLOAD_FOLDER, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+def describe_upload(filename):
+    """(url, meta) for a file already written to UPLOAD_FOLDER, its variants made. Raises
+    ValueError for a file that is not a readable image; either way nothing is left behind
+    on failure."""
+    url = f'/uploads/{filename}'
+    try:
+        return url, images.describe(os.path.join(UPLOAD_FOLDER, filename), url)
+    except BaseException:
+        remove_upload(filename)
+        raise
+
+def store_upload(user_id, file):
+    """Write one checked upload and describe it: (filename, url, meta). Raises like
+    describe_upload."""
+    filename = photo_filename(user_id, file.filename)
+    try:
+        file.save(os.path.join(UPLOAD_FOLDER, filename))
+    except BaseException:
+        remove_upload(filename)
+        raise
+    return (filename, *describe_upload(filename))
+
+def save_photo_meta(conn, user_id, url, meta):
+    """Caller commits."""
+    conn.execute('''INSERT OR REPLACE INTO photo_meta (file, user_id, width, height, color, placeholder,
+    srcset, variants) VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                 (url, user_id, meta['width'], meta['height'], meta['color'], meta['placeholder'],
+                  meta['srcset'], json.dumps(meta['variants'])))
+
+def photo_result(filename, url, meta):
+    return {'filename': filename, 'url': url, 'width': meta['width'], 'height': meta['height'],
+            'placeholder': meta['placeholder']}
+
+@bp.app_errorhandler(413)
+def request_too_large(e):
+    # the body was over MAX_CONTENT_LENGTH (or a route's own limit) before the route ran
+    return jsonify({'error': 'Upload too large'}), 413
+
+@bp.route('/api/upload_photo', methods=['POST'])
 @debug_session
 def upload_photo():
-    if request.method == 'OPTIONS': return '', 204
     if 'user_id' not in session: return jsonify({'error': 'Login required'}), 401
     if 'photo' not in request.files: return jsonify({'error': 'No photo provided'}), 400
     file = request.files['photo']
-    if file.filename == '' or not allowed_file(file.filename):
-        return jsonify({'error': 'Invalid file'}), 400
-    file.seek(0, os.SEEK_END)
-    if file.tell() > MAX_FILE_SIZE: return jsonify({'error': 'File too large (max 5MB)'}), 400
-    file.seek(0)
+    error = check_upload(file)
+    if error: return jsonify({'error': error}), 400
     try:
-        unique_filename = f"{session['user_id']}_{datetime.now().strftime('%Y%m%d%H%M%S')}_{secure_filename(file.filename)}"
-        file.save(os.path.join(UPLOAD_FOLDER, unique_filename))
-        print(f"Photo uploaded: {unique_filename}")
-        return jsonify({'message': 'Photo uploaded successfully', 'filename': unique_filename, 'url': f'/uploads/{unique_filename}'}), 201
+        try:
+            filename, url, meta = store_upload(session['user_id'], file)
+        except ValueError:
+            return jsonify({'error': 'Invalid file'}), 400
+        try:
+            with get_db() as conn:
+                save_photo_meta(conn, session['user_id'], url, meta)
+                conn.commit()
+        except Exception:
+            remove_upload(filename, meta['variants'])
+            raise
+        print(f"Photo uploaded: {filename}")
+        return jsonify({'message': 'Photo uploaded successfully', **photo_result(filename, url, meta)}), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/delete_photo', methods=['DELETE', 'OPTIONS'])
+@bp.route('/api/upload_photos', methods=['POST'])
+@debug_session
+def upload_photos():
+    """Up to MAX_BATCH_FILES photos (form field "photos", repeated) in one request, processed in
+    parallel. "results" has one entry per file in the order sent: what /api/upload_photo returns,
+    or {"error"}. Status 201 when all were saved, 207 when some were, 400 when none. Send
+    atomic=1 to keep none of them unless all of them can be saved."""
+    if 'user_id' not in session: return jsonify({'error': 'Login required'}), 401
+    # room for the whole batch plus multipart boundaries and headers
+    request.max_content_length = MAX_BATCH_BYTES + 1024 * 1024
+    files = request.files.getlist('photos')
+    if not files: return jsonify({'error': 'No photos provided'}), 400
+    if len(files) > MAX_BATCH_FILES:
+        return jsonify({'error': f'At most {MAX_BATCH_FILES} photos per upload'}), 400
+    if sum(upload_size(file) for file in files) > MAX_BATCH_BYTES:
+        return jsonify({'error': f'Photos too large together (max {MAX_BATCH_BYTES // 1048576}MB)'}), 413
+    user_id, atomic = session['user_id'], request.form.get('atomic') == '1'
+    results = [{'name': file.filename} for file in files]
+    jobs = []
+    for i, file in enumerate(files):
+        error = check_upload(file)
+        if error:
+            results[i]['error'] = error
+        else:
+            jobs.append((i, upload_executor().submit(store_upload, user_id, file)))
+    stored = []
+    for i, job in jobs:
+        try:
+            stored.append((i, *job.result()))
+        except ValueError:
+            results[i]['error'] = 'Invalid file'
+        except Exception as e:
+            results[i]['error'] = str(e)
+    failed = sum('error' in result for result in results)
+    try:
+        if atomic and failed:
+            raise ValueError('Not saved: another photo in this upload failed')
+        with get_db() as conn:
+            for i, filename, url, meta in stored:
+                save_photo_meta(conn, user_id, url, meta)
+            conn.commit()
+    except Exception as e:
+        for i, filename, url, meta in stored:
+            remove_upload(filename, meta['variants'])
+            results[i]['error'] = str(e)
+        stored = []
+    for i, filename, url, meta in stored:
+        results[i].update(photo_result(filename, url, meta))
+    print(f"Photos uploaded: {len(stored)} of {len(files)}")
+    status = 201 if len(stored) == len(files) else 207 if stored else 400
+    return jsonify({'results': results, 'uploaded': len(stored), 'failed': len(files) - len(stored)}), status
+
+@bp.route('/api/delete_photo', methods=['DELETE'])
 @debug_session
 def delete_photo():
-    if request.method == 'OPTIONS': return '', 204
     if 'user_id' not in session: return jsonify({'error': 'Login required'}), 401
     try:
         filename = request.json.get('filename')
@@ -409,32 +1773,48 @@ def delete_photo():
         filepath = os.path.join(UPLOAD_FOLDER, filename)
         if os.path.exists(filepath):
             os.remove(filepath)
+            # Drop the photo from any of the user's ads that still show it
+            with get_db() as conn:
+                meta = conn.execute('DELETE FROM photo_meta WHERE file=? AND user_id=? RETURNING variants',
+                                    (f'/uploads/{filename}', session['user_id'])).fetchone()
+                for variant in json.loads(meta[0]) if meta else []:
+                    if os.path.exists(os.path.join(UPLOAD_FOLDER, variant)):
+                        os.remove(os.path.join(UPLOAD_FOLDER, variant))
+                ad_ids = [row[0] for row in conn.execute('''SELECT p.ad_id FROM ad_photos p
+                JOIN ads a ON a.id=p.ad_id WHERE p.file=? AND a.user_id=?''',
+                                                          (f'/uploads/{filename}', session['user_id']))]
+                if ad_ids:
+                    conn.execute(f"DELETE FROM ad_photos WHERE file=? AND ad_id IN ({','.join('?' * len(ad_ids))})",
+                                 [f'/uploads/{filename}', *ad_ids])
+                    refresh_ad_json(conn, ad_ids)
+                    conn.commit()
+                    invalidate_ads(ad_ids)
             return jsonify({'message': 'Photo deleted successfully'})
         return jsonify({'error': 'Photo not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/check_role', methods=['GET', 'OPTIONS'])
+@bp.route('/api/admin/check_role', methods=['GET'])
 @debug_session
 def check_admin_role():
-    if request.method == 'OPTIONS': return '', 204
     if 'user_id' not in session: return jsonify({'is_admin': False}), 200
     try:
-        with get_db() as conn:
-            user = conn.execute('SELECT role FROM users WHERE id=?', (session['user_id'],)).fetchone()
-            if user and dict(user).get('role') == 'admin':
-                return jsonify({'is_admin': True, 'username': session.get('username')})
-            return jsonify({'is_admin': False})
+        if is_admin():
+            return jsonify({'is_admin': True, 'username': session.get('username')})
+        return jsonify({'is_admin': False})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/stats', methods=['GET'])
+@bp.route('/api/admin/stats', methods=['GET'])
 @debug_session
 def admin_stats():
     if not is_admin(): return jsonify({'error': 'Admin access required'}), 403
     try:
+        body = stats_cache.get('admin')
+        if body is not None:
+            return Response(body, mimetype='application/json')
         with get_db() as conn:
-            return jsonify({
+            body = json.dumps({
                 'total_users': conn.execute('SELECT COUNT(*) FROM users').fetchone()[0],
                 'total_ads': conn.execute('SELECT COUNT(*) FROM ads').fetchone()[0],
                 'pending_ads': conn.execute("SELECT COUNT(*) FROM ads WHERE status='pending'").fetchone()[0],
@@ -442,107 +1822,287 @@ def admin_stats():
                 'expired_ads': conn.execute("SELECT COUNT(*) FROM ads WHERE status='expired'").fetchone()[0],
                 'premium_users': conn.execute("SELECT COUNT(*) FROM users WHERE account_type='vendor'").fetchone()[0],
                 'free_users': conn.execute("SELECT COUNT(*) FROM users WHERE account_type='free'").fetchone()[0],
-            })
+                'pending_by_category': dict(conn.execute('''SELECT category, COUNT(*) FROM ads
+                WHERE status='pending' GROUP BY category ORDER BY category''').fetchall()),
+            }).encode()
+        stats_cache.put('admin', body, len(body))
+        return Response(body, mimetype='application/json')
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/all_ads', methods=['GET', 'OPTIONS'])
+@bp.route('/api/admin/all_ads', methods=['GET'])
 @debug_session
 def admin_all_ads():
-    if request.method == 'OPTIONS': return '', 204
+    """Every ad, streamed; with ?limit= or ?cursor= one page of them (admin_page),
+    optionally of one ?status= (or status=duplicates: the ads flagged as a likely duplicate)."""
     if not is_admin(): return jsonify({'error': 'Admin access required'}), 403
     try:
+        if 'limit' not in request.args and 'cursor' not in request.args:
+            return stream_json_list('ads', 'SELECT CAST(ad_json AS BLOB) FROM ads ORDER BY created_at DESC')
+        status = request.args.get('status', 'all')
+        where, params = (['status=?'], [status]) if status != 'all' else ([], [])
+        if status == 'duplicates':
+            where, params = ['duplicate_of IS NOT NULL'], []
         with get_db() as conn:
-            ads = conn.execute('''SELECT a.*, u.username, u.account_type FROM ads a
-            JOIN users u ON a.user_id=u.id ORDER BY a.created_at DESC''').fetchall()
-            return jsonify({'ads': [dict(ad) for ad in ads]})
+            return admin_page(conn, 'ads', 'CAST(ad_json AS BLOB)', 'ads', where, params)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/approve_ad/<int:ad_id>', methods=['POST', 'OPTIONS'])
+@bp.route('/api/admin/duplicates/<int:ad_id>', methods=['GET'])
+@debug_session
+def admin_ad_duplicates(ad_id):
+    """Ads of any status that look like near-duplicates of ad_id, most similar first,
+    each with its "similarity" (0-1). ?limit= (default 50, at most 200)."""
+    if not is_admin(): return jsonify({'error': 'Admin access required'}), 403
+    try:
+        limit = max(1, min(request.args.get('limit', 50, type=int), 200))
+        with get_db() as conn:
+            ad = conn.execute('SELECT title, description FROM ads WHERE id=?', (ad_id,)).fetchone()
+            if not ad: return jsonify({'error': 'Ad not found'}), 404
+            shingles = dedup.shingles(ad['title'], ad['description'])
+            matches = duplicate_candidates(conn, ad_id, shingles, dedup.buckets(shingles), limit, statuses=None)
+            ids = [other for _, other in matches]
+            payloads = dict(conn.execute(f"SELECT id, CAST(ad_json AS BLOB) FROM ads WHERE id IN ({','.join('?' * len(ids))})",
+                                         ids).fetchall()) if ids else {}
+        return json_list_response('ads', [b'{"similarity":%.3f,' % similarity + payloads[other][1:]
+                                          for similarity, other in matches if other in payloads])
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/admin/approve_ad/<int:ad_id>', methods=['POST'])
 @debug_session
 def approve_ad(ad_id):
-    if request.method == 'OPTIONS': return '', 204
     if not is_admin(): return jsonify({'error': 'Admin access required'}), 403
     try:
         with get_db() as conn:
             conn.execute("UPDATE ads SET status='active' WHERE id=?", (ad_id,))
+            refresh_ad_json(conn, [ad_id])
             conn.commit()
+            invalidate_ads([ad_id])
         return jsonify({'message': 'Ad approved'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/reject_ad/<int:ad_id>', methods=['POST', 'OPTIONS'])
+@bp.route('/api/admin/reject_ad/<int:ad_id>', methods=['POST'])
 @debug_session
 def reject_ad(ad_id):
-    if request.method == 'OPTIONS': return '', 204
     if not is_admin(): return jsonify({'error': 'Admin access required'}), 403
     try:
         with get_db() as conn:
             conn.execute("UPDATE ads SET status='rejected' WHERE id=?", (ad_id,))
+            refresh_ad_json(conn, [ad_id])
             conn.commit()
+            invalidate_ads([ad_id])
         return jsonify({'message': 'Ad rejected'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/delete_ad/<int:ad_id>', methods=['DELETE', 'OPTIONS'])
+@bp.route('/api/admin/moderate', methods=['POST'])
+@debug_session
+def admin_moderate():
+    """Bulk moderation: {"operations": [{"action": "approve"|"reject"|"expire"|"delete",
+    "ids": [...]} or selectors {"status", "category", "user_id"}]}. One transaction, so a
+    database error applies nothing; an unknown action or a missing ad only gets an error in
+    its result and the rest still apply. Returns one result per ad plus the new list payload
+    of every ad still there."""
+    if not is_admin(): return jsonify({'error': 'Admin access required'}), 403
+    operations = (request.get_json(silent=True) or {}).get('operations')
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'operations list required'}), 400
+    try:
+        with get_db() as conn:
+            results, changed, deleted = moderate(conn, operations)
+            refresh_ad_json(conn, changed)
+            conn.commit()
+            if changed or deleted:
+                invalidate_ads(changed | deleted)
+            ids = sorted(changed)
+            payloads = []
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                payloads += [row[0] for row in conn.execute(
+                    f"SELECT CAST(ad_json AS BLOB) FROM ads WHERE id IN ({','.join('?' * len(chunk))})", chunk)]
+        body = json.dumps({'results': results, 'deleted': sorted(deleted),
+                           'count': len(changed) + len(deleted)}).encode()
+        return Response(body[:-1] + b',"ads":[' + b','.join(payloads) + b']}', mimetype='application/json')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/admin/delete_ad/<int:ad_id>', methods=['DELETE'])
 @debug_session
 def admin_delete_ad(ad_id):
-    if request.method == 'OPTIONS': return '', 204
     if not is_admin(): return jsonify({'error': 'Admin access required'}), 403
     try:
         with get_db() as conn:
             conn.execute('DELETE FROM ads WHERE id=?', (ad_id,))
             conn.commit()
+            invalidate_ads([ad_id])
         return jsonify({'message': 'Ad deleted'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/auto_approve', methods=['POST', 'OPTIONS'])
+@bp.route('/api/admin/auto_approve', methods=['POST'])
 @debug_session
 def auto_approve_old_ads():
-    if request.method == 'OPTIONS': return '', 204
     if not is_admin(): return jsonify({'error': 'Admin access required'}), 403
     try:
         with get_db() as conn:
-            cursor = conn.execute("""UPDATE ads SET status='active'
-            WHERE status='pending' AND created_at <= datetime('now', '-24 hours')""")
+            ids = [row[0] for row in conn.execute("""UPDATE ads SET status='active'
+            WHERE status='pending' AND created_at <= datetime('now', '-24 hours') RETURNING id""").fetchall()]
+            refresh_ad_json(conn, ids)
             conn.commit()
-        return jsonify({'message': f'{cursor.rowcount} ads auto-approved', 'count': cursor.rowcount})
+            invalidate_ads(ids)
+        return jsonify({'message': f'{len(ids)} ads auto-approved', 'count': len(ids)})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/expire_old_ads', methods=['POST', 'OPTIONS'])
+@bp.route('/api/admin/expire_old_ads', methods=['POST'])
 @debug_session
 def expire_old_ads():
-    if request.method == 'OPTIONS': return '', 204
     if not is_admin(): return jsonify({'error': 'Admin access required'}), 403
     try:
         with get_db() as conn:
-            cursor = conn.execute("""UPDATE ads SET status='expired'
-            WHERE status='active' AND expires_at <= datetime('now')""")
+            ids = [row[0] for row in conn.execute("""UPDATE ads SET status='expired'
+            WHERE status='active' AND expires_at <= datetime('now') RETURNING id""").fetchall()]
+            refresh_ad_json(conn, ids)
+            conn.commit()
+            invalidate_ads(ids)
+        return jsonify({'message': f'{len(ids)} ads expired', 'count': len(ids)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/admin/ad_stats', methods=['GET'])
+@debug_session
+def admin_ad_stats():
+    """{"stats": {"<ad id>": [views, contacts]}} for every ad with any engagement."""
+    if not is_admin(): return jsonify({'error': 'Admin access required'}), 403
+    try:
+        with get_db() as conn:
+            body = conn.execute('''SELECT CAST(COALESCE(json_group_object(ad_id, json_array(views, contacts)), '{}')
+            AS BLOB) FROM ad_stats''').fetchone()[0]
+            return Response(b'{"stats":' + body + b'}', mimetype='application/json')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/admin/archive_ads', methods=['POST'])
+@debug_session
+def admin_archive_ads():
+    if not is_admin(): return jsonify({'error': 'Admin access required'}), 403
+    try:
+        days = int((request.get_json(silent=True) or {}).get('days', ARCHIVE_AFTER_DAYS))
+        with get_db() as conn:
+            count = archive_ads(conn, days)
+            record_table_sizes(conn)
+            conn.commit()
+            invalidate_ads()
+        return jsonify({'message': f'{count} ads archived', 'count': count, 'days': days})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/admin/archived_ads', methods=['GET'])
+@debug_session
+def admin_archived_ads():
+    if not is_admin(): return jsonify({'error': 'Admin access required'}), 403
+    try:
+        return archived_ads_response()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/admin/restore_ad/<int:ad_id>', methods=['POST'])
+@debug_session
+def admin_restore_ad(ad_id):
+    """Bring an archived ad back unchanged; reactivate or delete it from the dashboard."""
+    if not is_admin(): return jsonify({'error': 'Admin access required'}), 403
+    try:
+        with get_db() as conn:
+            attach_archive(conn)
+            if not restore_ad(conn, ad_id):
+                return jsonify({'error': 'Archived ad not found'}), 404
+            refresh_ad_json(conn, [ad_id])
             conn.commit()
-        return jsonify({'message': f'{cursor.rowcount} ads expired', 'count': cursor.rowcount})
+            invalidate_ads([ad_id])
+        return jsonify({'message': 'Ad restored', 'ad_id': ad_id})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/admin/table_sizes', methods=['GET'])
+@debug_session
+def admin_table_sizes():
+    """Hot vs archived ads over time, newest sample first."""
+    if not is_admin(): return jsonify({'error': 'Admin access required'}), 403
+    try:
+        limit = request.args.get('limit', 100, type=int)
+        with get_db() as conn:
+            rows = conn.execute('''SELECT recorded_at, table_name, rows, bytes FROM table_sizes
+            ORDER BY recorded_at DESC, table_name LIMIT ?''', (limit,)).fetchall()
+            return jsonify({'sizes': [dict(row) for row in rows]})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/users', methods=['GET', 'OPTIONS'])
+@bp.route('/api/admin/users', methods=['GET'])
 @debug_session
 def get_all_users():
-    if request.method == 'OPTIONS': return '', 204
+    """Every user, streamed; with ?limit= or ?cursor= one page of them (admin_page)."""
     if not is_admin(): return jsonify({'error': 'Admin access required'}), 403
     try:
+        if 'limit' not in request.args and 'cursor' not in request.args:
+            return stream_json_list('users', USER_JSON_SQL)
         with get_db() as conn:
-            users = conn.execute('''SELECT id, username, email, age, location, account_type, role,
-            vendor_paid, verified, created_at FROM users ORDER BY created_at DESC''').fetchall()
-            return jsonify({'users': [dict(u) for u in users]})
+            return admin_page(conn, 'users', USER_JSON, 'users')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/create_admin', methods=['POST', 'OPTIONS'])
+@bp.route('/api/admin/export/<table>.<fmt>', methods=['GET'])
+@debug_session
+def admin_export(table, fmt):
+    if not is_admin(): return jsonify({'error': 'Admin access required'}), 403
+    if table not in ('ads', 'users') or fmt not in ('json', 'ndjson', 'csv'):
+        return jsonify({'error': 'Unknown export'}), 404
+    try:
+        return export_response(table, fmt)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/admin/query_stats', methods=['GET', 'DELETE'])
+@debug_session
+def admin_query_stats():
+    if not is_admin(): return jsonify({'error': 'Admin access required'}), 403
+    if request.method == 'DELETE':
+        db_profiler.reset_stats()
+        return jsonify({'message': 'Query stats reset'})
+    limit = request.args.get('limit', db_profiler.TOP_N, type=int)
+    return jsonify({'slow_query_ms': db_profiler.SLOW_QUERY_MS,
+                    'pid': os.getpid(),
+                    'cache_backend': CACHE_BACKEND,
+                    'detail_cache': detail_cache.stats(),
+                    'listing_cache': listing_cache.stats(),
+                    'statements': db_profiler.top_statements(limit)})
+
+@bp.route('/api/admin/backups', methods=['GET'])
+@debug_session
+def admin_backups():
+    """Recent backup.py runs (newest first) and the snapshots on disk."""
+    if not is_admin(): return jsonify({'error': 'Admin access required'}), 403
+    try:
+        limit = request.args.get('limit', 20, type=int)
+        runs = []
+        metrics_path = os.path.join(backup.BACKUP_DIR, backup.METRICS_FILE)
+        if os.path.exists(metrics_path):
+            with open(metrics_path) as f:
+                runs = [json.loads(line) for line in f.readlines()[-limit:] if line.strip()]
+        snapshots = [{'snapshot': os.path.basename(path), 'bytes': os.path.getsize(path)}
+                     for db_path in (DB_FILE, archive_db_file()) for path in backup.snapshots(db_path)]
+        return jsonify({'runs': runs[::-1], 'snapshots': snapshots})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/admin/create_admin', methods=['POST'])
 @debug_session
 def create_admin():
-    if request.method == 'OPTIONS': return '', 204
     if not is_admin(): return jsonify({'error': 'Admin access required'}), 403
     try:
         data = request.json
@@ -560,10 +2120,9 @@ def create_admin():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/update_role', methods=['POST', 'OPTIONS'])
+@bp.route('/api/admin/update_role', methods=['POST'])
 @debug_session
 def update_user_role():
-    if request.method == 'OPTIONS': return '', 204
     if not is_admin(): return jsonify({'error': 'Admin access required'}), 403
     try:
         data = request.json
@@ -575,17 +2134,18 @@ def update_user_role():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/delete_user', methods=['DELETE', 'OPTIONS'])
+@bp.route('/api/admin/delete_user', methods=['DELETE'])
 @debug_session
 def admin_delete_user():
-    if request.method == 'OPTIONS': return '', 204
     if not is_admin(): return jsonify({'error': 'Admin access required'}), 403
     try:
         user_id = request.json.get('user_id')
         with get_db() as conn:
-            conn.execute('DELETE FROM ads WHERE user_id=?', (user_id,))
+            delete_archived(conn, 'user_id=?', (user_id,))
+            ad_ids = [row[0] for row in conn.execute('DELETE FROM ads WHERE user_id=? RETURNING id', (user_id,))]
             conn.execute('DELETE FROM users WHERE id=?', (user_id,))
             conn.commit()
+            invalidate_ads(ad_ids)
         return jsonify({'message': 'User deleted successfully'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -595,5 +2155,7 @@ if __name__ == '__main__':
     print("HookUpZA Backend Starting...")
     print("Server: http://127.0.0.1:5000")
     print("=" * 50)
+    print("Production: gunicorn app:app  (settings in gunicorn.conf.py)")
+    print("=" * 50)
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=True)
+    create_app().run(host='0.0.0.0', port=port, debug=os.environ.get('FLASK_DEBUG', '1') == '1')
@@ -0,0 +1,480 @@
+"""
+HookUpZA - ASGI entry point
+
+    uvicorn asgi:application --workers 2 --timeout-keep-alive 75
+
+The Flask app keeps serving every ordinary route (through asgiref's
+WsgiToAsgi thread bridge). Requests that would otherwise pin a sync worker
+for their whole lifetime are handled here on the event loop instead:
+
+    POST /api/upload_photo                 body read as it arrives, parsed
+                                           incrementally, written to disk
+                                           off the loop, then described and
+                                           recorded as the Flask route does
+    POST /api/upload_photos                the same for a batch; files are
+                                           described in parallel
+    GET  /api/admin/export/<t>.<fmt>       export chunks pulled from the
+                                           SQLite cursor in a worker thread
+    GET  /api/live                         Server-Sent Events: newly active
+                                           ads, from one shared poller per
+                                           process however many clients
+
+SQLite and file writes run on a small thread pool (HOOKUPZA_ASGI_THREADS), so
+an idle or slow connection costs a coroutine, not a thread.
+"""
+import asyncio
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.http import parse_cookie, parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+import app as hookupza
+
+flask_app = hookupza.app
+executor = ThreadPoolExecutor(int(os.environ.get('HOOKUPZA_ASGI_THREADS', 8)), thread_name_prefix='hookupza-io')
+wsgi = WsgiToAsgi(flask_app)
+
+LIVE_POLL_SECONDS = float(os.environ.get('HOOKUPZA_LIVE_POLL', 2))
+LIVE_HEARTBEAT_SECONDS = 15
+LIVE_QUEUE_SIZE = 100
+LIVE_WINDOW = 200
+EXPORT_PATH = re.compile(r'^/api/admin/export/(ads|users)\.(json|ndjson|csv)$')
+
+
+async def in_thread(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
+
+def fetchall(sql, params=()):
+    conn = hookupza.pool.acquire()
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        hookupza.pool.release(conn)
+
+
+def request_headers(scope):
+    return {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope['headers']}
+
+
+def cors_headers(headers):
+    origin = headers.get('origin')
+    if origin not in hookupza.ALLOWED_ORIGINS:
+        return []
+    return [(b'access-control-allow-origin', origin.encode()), (b'access-control-allow-credentials', b'true'),
+            (b'access-control-expose-headers', b'Server-Timing, Retry-After'), (b'vary', b'Origin')]
+
+
+def load_session(headers):
+    """Decode Flask's signed session cookie without a request context."""
+    cookie = parse_cookie(headers.get('cookie', '')).get(flask_app.config['SESSION_COOKIE_NAME'])
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    if not cookie or serializer is None:
+        return {}
+    try:
+        return serializer.loads(cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except Exception:
+        return {}
+
+
+def client_ip(scope, headers):
+    return hookupza.rate_limit.forwarded_ip(headers.get('x-forwarded-for'),
+                                            scope['client'][0] if scope.get('client') else None)
+
+
+async def send_json(send, status, payload, headers, extra=()):
+    body = json.dumps(payload).encode()
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode()),
+                            *cors_headers(headers), *extra]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_rate_limited(send, headers, wait):
+    """The 429 app.enforce_rate_limit sends."""
+    retry_after = max(1, int(wait + 0.999))
+    await send_json(send, 429, {'error': f'Too many requests. Try again in {retry_after} seconds.'},
+                    headers, [(b'retry-after', str(retry_after).encode())])
+
+
+async def drain(receive):
+    """Read and discard the rest of a request body we have already rejected."""
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect' or not message.get('more_body'):
+            return
+
+
+# ---------------------------------------------------------------- uploads
+
+TOO_LARGE = 'File too large (max 5MB)'
+FIELD_MAX_BYTES = 1024
+
+
+def save_upload(user_id, filename):
+    """Describe an upload already written (placeholder, size, variants) and record its
+    photo_meta row: (url, meta). Raises ValueError for a file that is not a readable image;
+    nothing is left behind on failure."""
+    url, meta = hookupza.describe_upload(filename)
+    try:
+        conn = hookupza.pool.acquire()
+        try:
+            hookupza.save_photo_meta(conn, user_id, url, meta)
+            conn.commit()
+        finally:
+            hookupza.pool.release(conn)
+    except BaseException:
+        hookupza.remove_upload(filename, meta['variants'])
+        raise
+    return url, meta
+
+
+def part_path(part):
+    return os.path.join(hookupza.UPLOAD_FOLDER, part['filename']) + '.part'
+
+
+async def discard_parts(parts):
+    for part in parts:
+        if part.get('filename') and 'error' not in part:
+            await in_thread(os.remove, part_path(part))
+
+
+async def receive_files(receive, boundary, user_id, field, max_files, max_total=None):
+    """Read a multipart body as it arrives, writing the files sent as `field` to
+    UPLOAD_FOLDER (<filename>.part) off the loop. Returns (parts, form, extra, error):
+    one {'name', 'filename', 'size'} per file in the order sent, with 'error' (and its
+    .part removed) when it was refused; the small form fields; how many files past
+    max_files were ignored; and 'disconnected' or (status, message) when the request
+    itself failed, in which case every .part is removed and the body has been drained."""
+    decoder = MultipartDecoder(boundary)
+    parts, form, extra = [], {}, 0
+    out = target = None
+    total, error = 0, None
+    more_body = True
+    try:
+        while more_body and error is None:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                error = 'disconnected'
+                break
+            more_body = message.get('more_body', False)
+            decoder.receive_data(message.get('body', b''))
+            if not more_body:
+                decoder.receive_data(None)
+            event = decoder.next_event()
+            while not isinstance(event, (NeedData, Epilogue)) and error is None:
+                if isinstance(event, File) and event.name == field:
+                    target = None
+                    if len(parts) == max_files:
+                        extra += 1
+                    elif not event.filename or not hookupza.allowed_file(event.filename):
+                        parts.append({'name': event.filename, 'error': 'Invalid file'})
+                    else:
+                        target = {'name': event.filename, 'size': 0,
+                                  'filename': hookupza.photo_filename(user_id, event.filename)}
+                        parts.append(target)
+                        out = await in_thread(open, part_path(target), 'wb')
+                elif isinstance(event, Field):
+                    target = form[event.name] = bytearray()
+                elif isinstance(event, File):
+                    target = None
+                elif isinstance(event, Data) and isinstance(target, bytearray):
+                    target += event.data[:FIELD_MAX_BYTES - len(target)]
+                elif isinstance(event, Data) and target is not None:
+                    target['size'] += len(event.data)
+                    total += len(event.data)
+                    if max_total is not None and total > max_total:
+                        error = (413, f'Photos too large together (max {max_total // 1048576}MB)')
+                    elif target['size'] > hookupza.MAX_FILE_SIZE:
+                        target['error'] = TOO_LARGE
+                    elif event.data:
+                        await in_thread(out.write, event.data)
+                    if error is None and (not event.more_data or 'error' in target):
+                        await in_thread(out.close)
+                        out = None
+                        if 'error' in target:
+                            await in_thread(os.remove, part_path(target))
+                        target = None
+                event = decoder.next_event()
+    except ValueError:
+        error = (400, 'Invalid upload')
+    finally:
+        if out is not None:
+            await in_thread(out.close)
+    if error is not None:
+        await discard_parts(parts)
+        if error != 'disconnected' and more_body:
+            await drain(receive)
+    return parts, {name: value.decode('utf-8', 'replace') for name, value in form.items()}, extra, error
+
+
+async def upload_start(scope, receive, send, headers, endpoint, max_length, too_large, missing):
+    """Checks every upload route makes before reading the body: (user id, multipart boundary)
+    when the request may go on, else None with the response already sent."""
+    user_id = load_session(headers).get('user_id')
+    if user_id is None:
+        await drain(receive)
+        return await send_json(send, 401, {'error': 'Login required'}, headers)
+    wait = await in_thread(hookupza.rate_limit.check, endpoint, client_ip(scope, headers), user_id)
+    if wait:
+        await drain(receive)
+        return await send_rate_limited(send, headers, wait)
+    content_type, options = parse_options_header(headers.get('content-type', ''))
+    if content_type != 'multipart/form-data' or 'boundary' not in options:
+        await drain(receive)
+        return await send_json(send, 400, {'error': missing}, headers)
+    if int(headers.get('content-length') or 0) > max_length:
+        await drain(receive)
+        return await send_json(send, 413, {'error': too_large}, headers)
+    return user_id, options['boundary'].encode()
+
+
+async def upload_photo(scope, receive, send, headers):
+    # multipart framing adds a little on top of the file itself
+    started = await upload_start(scope, receive, send, headers, 'upload_photo', hookupza.MAX_FILE_SIZE + 64 * 1024,
+                                 TOO_LARGE, 'No photo provided')
+    if started is None:
+        return
+    user_id, boundary = started
+    parts, _, _, error = await receive_files(receive, boundary, user_id, 'photo', 1)
+    if error == 'disconnected':
+        return
+    if error is not None:
+        return await send_json(send, error[0], {'error': error[1]}, headers)
+    if not parts:
+        return await send_json(send, 400, {'error': 'No photo provided'}, headers)
+    part = parts[0]
+    if 'error' in part:
+        return await send_json(send, 413 if part['error'] == TOO_LARGE else 400, {'error': part['error']}, headers)
+    filename = part['filename']
+    await in_thread(os.replace, part_path(part), os.path.join(hookupza.UPLOAD_FOLDER, filename))
+    try:
+        url, meta = await in_thread(save_upload, user_id, filename)
+    except ValueError:
+        return await send_json(send, 400, {'error': 'Invalid file'}, headers)
+    except Exception as e:
+        return await send_json(send, 500, {'error': str(e)}, headers)
+    print(f"Photo uploaded: {filename}")
+    await send_json(send, 201, {'message': 'Photo uploaded successfully',
+                                **hookupza.photo_result(filename, url, meta)}, headers)
+
+
+def describe_part(part):
+    """(url, meta) of a received batch file, renamed into place and described."""
+    filename = part['filename']
+    os.replace(part_path(part), os.path.join(hookupza.UPLOAD_FOLDER, filename))
+    return hookupza.describe_upload(filename)
+
+
+def save_batch(user_id, stored):
+    conn = hookupza.pool.acquire()
+    try:
+        for part, url, meta in stored:
+            hookupza.save_photo_meta(conn, user_id, url, meta)
+        conn.commit()
+    finally:
+        hookupza.pool.release(conn)
+
+
+async def upload_photos(scope, receive, send, headers):
+    """app.upload_photos with the body streamed: same limits, results and status codes."""
+    # room for the whole batch plus multipart boundaries and headers, as the Flask route allows
+    started = await upload_start(scope, receive, send, headers, 'upload_photos', hookupza.MAX_BATCH_BYTES + 1024 * 1024,
+                                 'Upload too large', 'No photos provided')
+    if started is None:
+        return
+    user_id, boundary = started
+    parts, form, extra, error = await receive_files(receive, boundary, user_id, 'photos',
+                                                    hookupza.MAX_BATCH_FILES, hookupza.MAX_BATCH_BYTES)
+    if error == 'disconnected':
+        return
+    if error is None and extra:
+        await discard_parts(parts)
+        error = (400, f'At most {hookupza.MAX_BATCH_FILES} photos per upload')
+    if error is None and not parts:
+        error = (400, 'No photos provided')
+    if error is not None:
+        return await send_json(send, error[0], {'error': error[1]}, headers)
+
+    results = [{'name': part['name']} for part in parts]
+    jobs = [(i, part) for i, part in enumerate(parts) if 'error' not in part]
+    for i, part in enumerate(parts):
+        if 'error' in part:
+            results[i]['error'] = part['error']
+    outcomes = await asyncio.gather(*(in_thread(describe_part, part) for _, part in jobs), return_exceptions=True)
+    stored = []
+    for (i, part), outcome in zip(jobs, outcomes):
+        if isinstance(outcome, ValueError):
+            results[i]['error'] = 'Invalid file'
+        elif isinstance(outcome, BaseException):
+            results[i]['error'] = str(outcome)
+        else:
+            stored.append((i, part, *outcome))
+    failed = sum('error' in result for result in results)
+    try:
+        if form.get('atomic') == '1' and failed:
+            raise ValueError('Not saved: another photo in this upload failed')
+        await in_thread(save_batch, user_id, [(part, url, meta) for _, part, url, meta in stored])
+    except Exception as e:
+        for i, part, url, meta in stored:
+            await in_thread(hookupza.remove_upload, part['filename'], meta['variants'])
+            results[i]['error'] = str(e)
+        stored = []
+    for i, part, url, meta in stored:
+        results[i].update(hookupza.photo_result(part['filename'], url, meta))
+    print(f"Photos uploaded: {len(stored)} of {len(parts)}")
+    status = 201 if len(stored) == len(parts) else 207 if stored else 400
+    await send_json(send, status, {'results': results, 'uploaded': len(stored),
+                                   'failed': len(parts) - len(stored)}, headers)
+
+
+# ---------------------------------------------------------------- exports
+
+def is_admin(user_id):
+    row = fetchall('SELECT role FROM users WHERE id=?', (user_id,))
+    return bool(row) and row[0]['role'] == 'admin'
+
+
+async def export(scope, receive, send, headers, table, fmt):
+    user_id = load_session(headers).get('user_id')
+    if user_id is None or not await in_thread(is_admin, user_id):
+        return await send_json(send, 403, {'error': 'Admin access required'}, headers)
+    response = await in_thread(hookupza.export_response, table, fmt)
+    chunks = iter(response.response)
+    await send({'type': 'http.response.start', 'status': 200,
+                'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in response.headers.items()]
+                + cors_headers(headers)})
+    try:
+        while True:
+            chunk = await in_thread(next, chunks, None)
+            if chunk is None:
+                break
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        # closes the export's SQLite connection if the client went away mid-stream
+        await in_thread(response.close)
+
+
+# ---------------------------------------------------------------- live feed
+
+class LiveFeed:
+    """One poller per process fans newly active ads out to every SSE subscriber.
+
+    The poller only runs while someone is listening. A subscriber whose queue
+    fills up (a client that stopped reading) is dropped rather than buffered."""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.task = None
+        self.seen = None
+
+    def subscribe(self):
+        queue = asyncio.Queue(LIVE_QUEUE_SIZE)
+        self.subscribers.add(queue)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.poll())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    @staticmethod
+    def latest():
+        return fetchall(f'''SELECT id, CAST(ad_json AS BLOB) AS payload FROM ads
+        WHERE status='active' AND expires_at > datetime('now') ORDER BY created_at DESC LIMIT {LIVE_WINDOW}''')
+
+    async def poll(self):
+        while self.subscribers:
+            try:
+                rows = await in_thread(self.latest)
+            except Exception as e:
+                print(f"Live feed poll failed: {e}")
+                rows = None
+            if rows is not None:
+                ids = {row['id'] for row in rows}
+                if self.seen is not None:
+                    fresh = [row for row in rows if row['id'] not in self.seen]
+                    if fresh:
+                        self.publish(fresh)
+                self.seen = ids
+            await asyncio.sleep(LIVE_POLL_SECONDS)
+        self.seen = None
+
+    def publish(self, rows):
+        message = (f'id: {max(row["id"] for row in rows)}\nevent: ads\ndata: '.encode()
+                   + b'{"ads":[' + b','.join(row['payload'] for row in reversed(rows)) + b']}\n\n')
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self.subscribers.discard(queue)
+
+
+live_feed = LiveFeed()
+
+
+async def live(scope, receive, send, headers):
+    await send({'type': 'http.response.start', 'status': 200,
+                'headers': [(b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache'),
+                            (b'x-accel-buffering', b'no'), *cors_headers(headers)]})
+    await send({'type': 'http.response.body', 'body': b'retry: 5000\n\n', 'more_body': True})
+    queue = live_feed.subscribe()
+
+    async def disconnected():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    watcher = asyncio.create_task(disconnected())
+    try:
+        # a subscriber the feed dropped for falling behind ends its stream; EventSource reconnects
+        while not watcher.done() and queue in live_feed.subscribers:
+            getter = asyncio.create_task(queue.get())
+            done, _ = await asyncio.wait({getter, watcher}, timeout=LIVE_HEARTBEAT_SECONDS,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+                if not done:
+                    await send({'type': 'http.response.body', 'body': b': ping\n\n', 'more_body': True})
+                continue
+            await send({'type': 'http.response.body', 'body': getter.result(), 'more_body': True})
+    finally:
+        live_feed.unsubscribe(queue)
+        watcher.cancel()
+
+
+# ---------------------------------------------------------------- router
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await in_thread(hookupza.warm_up)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await in_thread(hookupza.ad_counters.flush)
+            hookupza.pool.close_all()
+            executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] == 'http':
+        method, path = scope['method'], scope['path']
+        if method == 'POST' and path == '/api/upload_photo':
+            return await upload_photo(scope, receive, send, request_headers(scope))
+        if method == 'POST' and path == '/api/upload_photos':
+            return await upload_photos(scope, receive, send, request_headers(scope))
+        if method == 'GET' and path == '/api/live':
+            return await live(scope, receive, send, request_headers(scope))
+        match = EXPORT_PATH.match(path) if method == 'GET' else None
+        if match:
+            return await export(scope, receive, send, request_headers(scope), *match.groups())
+    return await wsgi(scope, receive, send)
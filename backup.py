@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+HookUpZA - Online backups and restore
+
+Snapshots are taken with SQLite's backup API while the app keeps running:
+PAGES_PER_STEP pages are copied per step with a short sleep in between, so
+no writer waits behind the backup for more than one step. A step that finds
+the source changed underneath it starts over; after MAX_RESTARTS of those
+(a steady write load) the rest is copied in a single step, which under WAL
+only holds a read snapshot and still does not block writers.
+
+Each copy is checked with PRAGMA quick_check, gzipped to
+<dir>/<name>-YYYYmmdd-HHMMSS.db.gz (written to .part, then renamed), and
+the newest KEEP snapshots per database are kept. Every run appends its
+timings and throughput to <dir>/backups.jsonl.
+
+Restore decompresses a snapshot, requires PRAGMA integrity_check to say ok,
+snapshots the current database first, then copies the restored pages into
+the live file through the backup API - so running workers see the restored
+data instead of holding a file that was renamed away.
+
+Usage:
+    python3 backup.py run                      # hookupza.db and its archive
+    python3 backup.py run --every 3600         # stay up, one backup per hour
+    python3 backup.py list
+    python3 backup.py restore backups/hookupza-20261019-020000.db.gz
+    python3 backup.py restore backups/hookupza-archive-20261019-020000.db.gz --db hookupza-archive.db
+
+Environment: HOOKUPZA_DB, HOOKUPZA_ARCHIVE_DB, HOOKUPZA_BACKUP_DIR, HOOKUPZA_BACKUP_KEEP
+"""
+import argparse
+import glob
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+
+DB_FILE = os.environ.get('HOOKUPZA_DB', 'hookupza.db')
+ARCHIVE_DB_FILE = os.environ.get('HOOKUPZA_ARCHIVE_DB') or os.path.splitext(DB_FILE)[0] + '-archive.db'
+BACKUP_DIR = os.environ.get('HOOKUPZA_BACKUP_DIR', 'backups')
+KEEP = int(os.environ.get('HOOKUPZA_BACKUP_KEEP', 7))
+METRICS_FILE = 'backups.jsonl'
+
+PAGES_PER_STEP = 256
+STEP_SLEEP = 0.005
+MAX_RESTARTS = 3
+COPY_CHUNK = 1024 * 1024
+
+
+def snapshot_name(db_path, now=None):
+    now = now or datetime.now(timezone.utc)
+    return f"{os.path.splitext(os.path.basename(db_path))[0]}-{now.strftime('%Y%m%d-%H%M%S')}.db.gz"
+
+
+def snapshots(db_path, backup_dir=BACKUP_DIR):
+    """Snapshots of db_path in backup_dir, oldest first (timestamps sort as text)."""
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    pattern = os.path.join(glob.escape(backup_dir), f'{glob.escape(stem)}-*.db.gz')
+    # 'hookupza-*' also matches 'hookupza-archive-*'; the timestamp is all digits
+    return sorted(path for path in glob.glob(pattern)
+                  if os.path.basename(path)[len(stem) + 1:-6].replace('-', '').isdigit())
+
+
+class _Restarted(Exception):
+    pass
+
+
+def copy_pages(source, target, pages=PAGES_PER_STEP, sleep=STEP_SLEEP):
+    """Backup-API copy of one open connection into another. Returns (steps, restarts, total pages)."""
+    progress = {'steps': 0, 'restarts': 0, 'remaining': None, 'total': 0}
+
+    def step(status, remaining, total):
+        if progress['remaining'] is not None and remaining > progress['remaining']:
+            progress['restarts'] += 1
+            if progress['restarts'] >= MAX_RESTARTS:
+                raise _Restarted()
+        progress['steps'] += 1
+        progress['remaining'], progress['total'] = remaining, total
+        if remaining:
+            time.sleep(sleep)   # let writers in between steps
+
+    try:
+        source.backup(target, pages=pages, progress=step)
+    except _Restarted:
+        source.backup(target, pages=-1)
+        progress['steps'] += 1
+    return progress['steps'], progress['restarts'], progress['total']
+
+
+def _gzip(src, dest, level):
+    with open(src, 'rb') as fin, gzip.open(dest, 'wb', compresslevel=level) as fout:
+        shutil.copyfileobj(fin, fout, COPY_CHUNK)
+
+
+def _gunzip(src, dest):
+    with gzip.open(src, 'rb') as fin, open(dest, 'wb') as fout:
+        shutil.copyfileobj(fin, fout, COPY_CHUNK)
+
+
+def _check(path, pragma='quick_check'):
+    conn = sqlite3.connect(path)
+    try:
+        result = [row[0] for row in conn.execute(f'PRAGMA {pragma}')]
+    finally:
+        conn.close()
+    return result == ['ok'], result
+
+
+def record_metrics(backup_dir, metrics):
+    with open(os.path.join(backup_dir, METRICS_FILE), 'a') as f:
+        f.write(json.dumps(metrics, sort_keys=True) + '\n')
+
+
+def backup_database(db_path, backup_dir=BACKUP_DIR, keep=KEEP, level=6, pages=PAGES_PER_STEP):
+    """Snapshot db_path into backup_dir, rotate, and return (and log) the run's metrics."""
+    os.makedirs(backup_dir, exist_ok=True)
+    name = snapshot_name(db_path)
+    dest = os.path.join(backup_dir, name)
+    raw = dest[:-3] + '.part'
+    started = time.perf_counter()
+    try:
+        source = sqlite3.connect(db_path, timeout=30)
+        target = sqlite3.connect(raw)
+        try:
+            steps, restarts, total_pages = copy_pages(source, target, pages)
+            page_size = source.execute('PRAGMA page_size').fetchone()[0]
+        finally:
+            target.close()
+            source.close()
+        copied = time.perf_counter()
+        ok, problems = _check(raw)
+        if not ok:
+            raise sqlite3.DatabaseError(f'backup copy of {db_path} failed quick_check: {problems[:5]}')
+        checked = time.perf_counter()
+        _gzip(raw, dest + '.part', level)
+        os.replace(dest + '.part', dest)
+        finished = time.perf_counter()
+        size = os.path.getsize(raw)
+    finally:
+        for path in (raw, dest + '.part'):
+            if os.path.exists(path):
+                os.remove(path)
+    removed = [os.path.basename(path) for path in snapshots(db_path, backup_dir)[:-keep] if keep > 0]
+    for path in removed:
+        os.remove(os.path.join(backup_dir, path))
+    total = finished - started
+    metrics = {
+        'at': datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'), 'database': db_path,
+        'snapshot': name, 'pages': total_pages, 'page_size': page_size, 'bytes': size,
+        'compressed_bytes': os.path.getsize(dest), 'steps': steps, 'restarts': restarts,
+        'copy_s': round(copied - started, 3), 'check_s': round(checked - copied, 3),
+        'compress_s': round(finished - checked, 3), 'total_s': round(total, 3),
+        'copy_mb_per_s': round(size / 1048576 / max(copied - started, 1e-6), 1),
+        'rotated': removed,
+    }
+    record_metrics(backup_dir, metrics)
+    return metrics
+
+
+def restore_database(snapshot, db_path=DB_FILE, backup_dir=BACKUP_DIR):
+    """Verify `snapshot` and load it into db_path. Returns the safety snapshot's name (or None)."""
+    restored = db_path + '.restore'
+    try:
+        _gunzip(snapshot, restored)
+        ok, problems = _check(restored, 'integrity_check')
+        if not ok:
+            raise sqlite3.DatabaseError(f'{snapshot} failed integrity_check: {problems[:5]}')
+        previous = backup_database(db_path, backup_dir, keep=0)['snapshot'] if os.path.exists(db_path) else None
+        source, target = sqlite3.connect(restored), sqlite3.connect(db_path, timeout=30)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+    finally:
+        for path in (restored, restored + '-wal', restored + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+    return previous
+
+
+def _print_metrics(m):
+    print(f"{m['snapshot']}: {m['bytes'] / 1048576:.1f} MB -> {m['compressed_bytes'] / 1048576:.1f} MB gz, "
+          f"copy {m['copy_s']}s ({m['copy_mb_per_s']} MB/s, {m['steps']} steps, {m['restarts']} restarts), "
+          f"check {m['check_s']}s, compress {m['compress_s']}s")
+
+
+def run(databases, backup_dir, keep, level):
+    failed = False
+    for db_path in databases:
+        if not os.path.exists(db_path):
+            continue
+        try:
+            _print_metrics(backup_database(db_path, backup_dir, keep, level))
+        except Exception as e:
+            failed = True
+            print(f"Backup of {db_path} failed: {e}", file=sys.stderr)
+    return failed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Online backup and restore of the HookUpZA databases')
+    parser.add_argument('--dir', default=BACKUP_DIR)
+    sub = parser.add_subparsers(dest='command', required=True)
+    run_parser = sub.add_parser('run', help='snapshot the main and archive databases')
+    run_parser.add_argument('--db', action='append', help=f'database to back up (default {DB_FILE} and {ARCHIVE_DB_FILE})')
+    run_parser.add_argument('--keep', type=int, default=KEEP)
+    run_parser.add_argument('--level', type=int, default=6, help='gzip level 1-9')
+    run_parser.add_argument('--every', type=float, default=0, help='repeat every N seconds')
+    sub.add_parser('list', help='list snapshots and recent runs')
+    restore_parser = sub.add_parser('restore', help='verify a snapshot and load it into a database')
+    restore_parser.add_argument('snapshot')
+    restore_parser.add_argument('--db', default=DB_FILE)
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        databases = args.db or [DB_FILE, ARCHIVE_DB_FILE]
+        while True:
+            failed = run(databases, args.dir, args.keep, args.level)
+            if not args.every:
+                sys.exit(1 if failed else 0)
+            time.sleep(args.every)
+    elif args.command == 'list':
+        for db_path in (DB_FILE, ARCHIVE_DB_FILE):
+            for path in snapshots(db_path, args.dir):
+                print(f'{os.path.basename(path):<45} {os.path.getsize(path) / 1048576:>9.1f} MB')
+    else:
+        try:
+            previous = restore_database(args.snapshot, args.db, args.dir)
+        except (OSError, sqlite3.DatabaseError) as e:
+            sys.exit(f'Restore failed, {args.db} left untouched: {e}')
+        print(f'Restored {args.snapshot} into {args.db}'
+              + (f' (previous contents saved as {previous})' if previous else ''))
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+HookUpZA - Duplicate check cost at post time
+
+Generates a large synthetic database (its 4096 pooled descriptions mean every
+description is shared by hundreds of ads, i.e. the hot LSH buckets a spam
+template makes), then posts new ads and times what the duplicate check adds
+to each: app.flag_duplicates() (bucket lookup, exact check of the
+candidates, writing the ad's own buckets), for
+
+    copy    a live ad's text with about one word in 16 swapped
+    fresh   text in words no other ad uses
+
+next to the O(n) alternative of comparing the new ad with every live ad, and
+the whole POST /api/post_ad for scale. Also reports how many copies were
+flagged and how long rebuilding ad_lsh for every ad takes.
+
+Usage:
+    python3 bench/bench_duplicates.py --ads 1000000 --posts 200
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import dedup
+import generate_data
+
+FRESH_WORDS = ['plumber', 'geyser', 'leaks', 'tiling', 'gutters', 'paving', 'boreholes', 'roofing',
+               'quotes', 'insured', 'emergency', 'drains', 'solar', 'inverter', 'install', 'repairs']
+
+
+def summary(samples):
+    samples = sorted(samples)
+    return {'median_ms': round(statistics.median(samples), 3),
+            'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3)}
+
+
+def new_ad_text(rng, conn, kind, max_id):
+    if kind == 'fresh':
+        return 'Handyman ' + rng.choice(FRESH_WORDS), ' '.join(rng.choice(FRESH_WORDS) for _ in range(rng.randint(12, 40)))
+    title, description = conn.execute('''SELECT title, description FROM ads
+    WHERE id >= ? AND status IN ('active', 'pending') LIMIT 1''', (rng.randint(1, max_id),)).fetchone()
+    words = description.split()
+    for _ in range(max(1, len(words) // 16)):
+        words[rng.randrange(len(words))] = rng.choice(generate_data.DESCRIPTION_WORDS)
+    return title, ' '.join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Duplicate check cost at post time')
+    parser.add_argument('--users', type=int, default=200000)
+    parser.add_argument('--ads', type=int, default=1000000)
+    parser.add_argument('--posts', type=int, default=200, help='new ads of each kind')
+    parser.add_argument('--scan-samples', type=int, default=3, help='ads checked the O(n) way')
+    parser.add_argument('--skip-rebuild', action='store_true', help='do not time a full ad_lsh rebuild')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', default=None)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='hookupza-bench-')
+    db_path = os.path.join(workdir, 'bench.db')
+    os.chdir(workdir)
+    os.environ['HOOKUPZA_RATELIMIT'] = 'off'
+    rng = random.Random(args.seed)
+    results = {}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            generated = generate_data.generate(db_path, args.users, args.ads, lsh=True)
+            import app
+        app.DB_FILE = db_path
+        app.db_profiler.SLOW_QUERY_MS = float('inf')
+        conn = app.connect_db()
+        max_id = conn.execute('SELECT MAX(id) FROM ads').fetchone()[0]
+        results['generate_s'] = generated['total_s']
+        results['lsh_rows'] = conn.execute('SELECT COUNT(*) FROM ad_lsh').fetchone()[0]
+        print(f"{args.ads} ads generated in {generated['total_s']} s, {results['lsh_rows']} ad_lsh rows")
+
+        if not args.skip_rebuild:
+            start = time.perf_counter()
+            app.rebuild_lsh(conn)
+            conn.commit()
+            results['rebuild_s'] = round(time.perf_counter() - start, 2)
+            print(f"rebuild_lsh: {results['rebuild_s']} s ({results['rebuild_s'] / args.ads * 1e6:.1f} us per ad)")
+
+        for kind in ('copy', 'fresh'):
+            samples, flagged = [], 0
+            for _ in range(args.posts):
+                title, description = new_ad_text(rng, conn, kind, max_id)
+                ad_id = conn.execute('''INSERT INTO ads (user_id, title, category, location, description, contact, status)
+                VALUES (1, ?, 'mw4m', 'Durban', ?, '0710000000', 'active')''', (title, description)).lastrowid
+                start = time.perf_counter()
+                duplicate_of = app.flag_duplicates(conn, [ad_id])[ad_id]
+                samples.append((time.perf_counter() - start) * 1000)
+                conn.commit()
+                flagged += duplicate_of is not None
+            results[kind] = dict(summary(samples), flagged=flagged, posts=args.posts)
+            print(f"flag_duplicates ({kind:<5}) median {results[kind]['median_ms']:>7} ms  "
+                  f"p95 {results[kind]['p95_ms']:>7} ms  flagged {flagged}/{args.posts}")
+
+        # the alternative: compare the new ad with every live ad
+        samples = []
+        for _ in range(args.scan_samples):
+            shingles = dedup.shingles(*new_ad_text(rng, conn, 'copy', max_id))
+            start = time.perf_counter()
+            for _, title, description in conn.execute(
+                    "SELECT id, title, description FROM ads WHERE status IN ('active', 'pending')"):
+                dedup.jaccard(shingles, dedup.shingles(title, description))
+            samples.append((time.perf_counter() - start) * 1000)
+        results['full_scan'] = summary(samples)
+        print(f"compare with every live ad  median {results['full_scan']['median_ms']:>9} ms")
+
+        client = app.app.test_client()
+        with contextlib.redirect_stdout(io.StringIO()):
+            client.post('/api/login', json={'username': 'vendor1', 'password': 'vendor123'})
+            samples = []
+            for _ in range(args.posts):
+                title, description = new_ad_text(rng, conn, 'copy', max_id)
+                start = time.perf_counter()
+                client.post('/api/post_ad', json={'title': title, 'category': 'mw4m', 'location': 'Durban',
+                                                  'description': description, 'contact': '0710000000'})
+                samples.append((time.perf_counter() - start) * 1000)
+        results['post_ad'] = summary(samples)
+        print(f"POST /api/post_ad (copy)    median {results['post_ad']['median_ms']:>9} ms  p95 {results['post_ad']['p95_ms']} ms")
+        conn.close()
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'params': vars(args), 'results': results}, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+HookUpZA - Import and app start-up time
+
+Runs `python -X importtime -c "import app"` in fresh interpreters and reports
+the median time to import app.py, the modules it pulls in that cost the most,
+and whether the import touched the database file or the upload folder (it
+must not). Then times app.create_app() against a bootstrapped database, the
+rest of what a worker does before its first request.
+
+Results are written as JSON (default bench/results/import-<git-sha>.json);
+--baseline prints the change against an earlier file, and --budget-ms makes
+the run fail when the import gets slower than that.
+
+Usage:
+    python3 bench/bench_import.py --runs 10
+    python3 bench/bench_import.py --baseline bench/results/import-abc1234.json --budget-ms 400
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from loadtest import git_commit
+
+CREATE_APP = '''import time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+print((imported - start) * 1000, (time.perf_counter() - imported) * 1000)'''
+
+
+def parse_importtime(stderr, module='app'):
+    """(cumulative ms of module, {direct dependency: cumulative ms}) from -X importtime output."""
+    children, deps = {}, None
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        if depth == 0:
+            if name == module:
+                deps = children
+                return int(cumulative) / 1000, {k: v / 1000 for k, v in deps.items()}
+            children = {}
+        elif depth == 1:
+            children[name] = int(cumulative)
+    raise ValueError(f'{module} not found in -X importtime output')
+
+
+def run(code, env, cwd, importtime=False):
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', code]
+    result = subprocess.run(command, env=env, cwd=cwd, capture_output=True, text=True, check=True)
+    return result.stdout, result.stderr
+
+
+def main():
+    parser = argparse.ArgumentParser(description='app.py import and create_app() time')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=10, help='dependencies to list')
+    parser.add_argument('--baseline', default=None, help='earlier result file to compare with')
+    parser.add_argument('--budget-ms', type=float, default=None, help='fail when the median import is slower')
+    parser.add_argument('--out', default=None)
+    args = parser.parse_args()
+
+    commit = git_commit()
+    out_path = args.out or os.path.join(ROOT, 'bench', 'results', f'import-{commit}.json')
+    workdir = tempfile.mkdtemp(prefix='hookupza-bench-')
+    db_path = os.path.join(workdir, 'bench.db')
+    env = dict(os.environ, PYTHONPATH=ROOT, HOOKUPZA_DB=db_path, HOOKUPZA_RATELIMIT='off')
+    try:
+        # compile app.py and its modules once, so the runs below measure imports, not compiles
+        run('import app', env, workdir)
+        imports, deps = [], {}
+        for _ in range(args.runs):
+            total, children = parse_importtime(run('import app', env, workdir, importtime=True)[1])
+            imports.append(total)
+            for name, ms in children.items():
+                deps.setdefault(name, []).append(ms)
+        touched = [name for name in (db_path, os.path.join(workdir, 'uploads')) if os.path.exists(name)]
+
+        run('import app; app.bootstrap()', env, workdir)
+        create = [tuple(map(float, run(CREATE_APP, env, workdir)[0].split()[-2:])) for _ in range(args.runs)]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    top = sorted(((statistics.median(ms), name) for name, ms in deps.items()), reverse=True)[:args.top]
+    results = {
+        'import_ms': round(statistics.median(imports), 1),
+        'import_min_ms': round(min(imports), 1),
+        'create_app_ms': round(statistics.median(c[1] for c in create), 1),
+        'boot_ms': round(statistics.median(c[0] + c[1] for c in create), 1),
+        'import_touched': [os.path.basename(name) for name in touched],
+        'top_dependencies_ms': {name: round(ms, 1) for ms, name in top},
+    }
+    print(f"import app      median {results['import_ms']:>7} ms  (min {results['import_min_ms']} ms)")
+    print(f"create_app()    median {results['create_app_ms']:>7} ms  (bootstrapped database)")
+    print(f"import + create median {results['boot_ms']:>7} ms")
+    print(f"import touched: {', '.join(results['import_touched']) or 'nothing'}")
+    print('slowest dependencies (cumulative):')
+    for name, ms in results['top_dependencies_ms'].items():
+        print(f"  {name:<24}{ms:>8} ms")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            old = json.load(f)
+        print(f"\n{old['commit']} -> {commit}")
+        for key in ('import_ms', 'create_app_ms', 'boot_ms'):
+            before, after = old['results'].get(key), results[key]
+            change = f'{(after - before) / before * 100:+.1f}%' if before else 'n/a'
+            print(f"  {key:<16}{before!s:>9} -> {after:>9}  {change}")
+
+    output = {'commit': commit, 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'python': platform.python_version(), 'params': vars(args), 'results': results}
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    with open(out_path, 'w') as f:
+        json.dump(output, f, indent=2, sort_keys=True)
+    print(f"\nResults written to {out_path}")
+    if touched:
+        sys.exit(f"importing app.py created {', '.join(results['import_touched'])}")
+    if args.budget_ms is not None and results['import_ms'] > args.budget_ms:
+        sys.exit(f"import took {results['import_ms']} ms, over the {args.budget_ms} ms budget")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+HookUpZA - "Near me" lookup benchmark
+
+Generates a large synthetic database and times /api/ads/nearby (R*Tree box
+prefilter + exact distance ranking) for a few centres and radii, next to the
+only option there was before: a LIKE scan on the free-text location.
+
+Usage:
+    python3 bench/bench_nearby.py --ads 1000000 --iterations 50
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import generate_data
+
+# (label, query string, LIKE pattern for the old-style lookup)
+QUERIES = [
+    ('Cape Town 25km', 'near=Cape Town&radius=25', '%Cape Town%'),
+    ('Johannesburg 50km', 'near=Johannesburg&radius=50', '%Johannesburg%'),
+    ('Durban 10km', 'near=Durban&radius=10', '%Durban%'),
+    ('Kimberley 200km', 'near=Kimberley&radius=200', '%Kimberley%'),
+    ('Karoo 100km (empty)', 'lat=-31.5&lon=21.5&radius=100', '%Karoo%'),
+]
+
+
+def median_ms(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Nearby ad lookup benchmark')
+    parser.add_argument('--users', type=int, default=200000)
+    parser.add_argument('--ads', type=int, default=1000000)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--out', default=None)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='hookupza-bench-')
+    db_path = os.path.join(workdir, 'bench.db')
+    os.chdir(workdir)
+    results = {}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_data.generate(db_path, args.users, args.ads)
+            import app
+        app.DB_FILE = db_path
+        app.db_profiler.SLOW_QUERY_MS = float('inf')
+        client = app.app.test_client()
+        conn = app.connect_db()
+        print(f"{'query':<22} {'nearby':>10} {'LIKE scan':>10} {'results':>8}")
+        for label, query, pattern in QUERIES:
+            count = len(client.get('/api/ads/nearby?' + query).get_json()['ads'])
+            nearby = median_ms(lambda: client.get('/api/ads/nearby?' + query).get_data(), args.iterations)
+            like = median_ms(lambda: conn.execute('''SELECT CAST(ad_json AS BLOB) FROM ads
+            WHERE status='active' AND expires_at > datetime('now') AND location LIKE ?
+            ORDER BY is_premium DESC, created_at DESC LIMIT 100''', (pattern,)).fetchall(), max(1, args.iterations // 5))
+            results[label] = {'nearby_ms': nearby, 'like_scan_ms': like, 'results': count}
+            print(f'{label:<22} {nearby:>8} ms {like:>8} ms {count:>8}')
+        conn.close()
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'params': vars(args), 'results': results}, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
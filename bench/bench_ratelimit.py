@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+HookUpZA - Rate limiter overhead benchmark
+
+Measures the cost of one rate_limit.check() with the memory and SQLite
+stores (hot key and spread across many IPs), and the end-to-end overhead
+the limiter adds to a cheap request through the Flask test client.
+
+Usage:
+    python3 bench/bench_ratelimit.py --iterations 20000
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import rate_limit
+
+
+def per_call_us(fn, iterations):
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(i)
+    return round((time.perf_counter() - start) * 1e6 / iterations, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rate limiter overhead benchmark')
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+    n = args.iterations
+
+    workdir = tempfile.mkdtemp(prefix='hookupza-bench-')
+    os.chdir(workdir)
+    try:
+        # generous limits so the benchmark measures bookkeeping, not rejections
+        rate_limit.RATE_LIMITS['bench'] = [('ip', 10 ** 9, 1), ('user', 10 ** 9, 1)]
+        for name, store in [('memory', rate_limit.MemoryStore()),
+                            ('sqlite', rate_limit.SQLiteStore(os.path.join(workdir, 'rl.db')))]:
+            rate_limit.store = store
+            hot = per_call_us(lambda i: rate_limit.check('bench', '10.0.0.1', 7), n)
+            spread = per_call_us(lambda i: rate_limit.check('bench', f'10.0.{i % 250}.{i % 97}', i % 5000), n)
+            print(f'{name:<7} check(): hot key {hot:>8} us   spread keys {spread:>8} us')
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            os.environ['HOOKUPZA_DB'] = os.path.join(workdir, 'bench.db')
+            import app
+        client = app.app.test_client()
+        # /api/login with an empty body is rejected before any hashing, so the
+        # remaining cost is routing + hooks + the limiter itself
+        app.rate_limit.RATE_LIMITS['login'] = [('ip', 10 ** 9, 1)]
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            results = {}
+            for name in ['off', 'memory', 'sqlite']:
+                app.rate_limit.store = (None if name == 'off' else rate_limit.MemoryStore() if name == 'memory'
+                                        else rate_limit.SQLiteStore(os.path.join(workdir, 'rl2.db')))
+                results[name] = per_call_us(lambda i: client.post('/api/login', json={}), n // 10)
+        for name, us in results.items():
+            extra = '' if name == 'off' else f'   (+{round(us - results["off"], 1)} us)'
+            print(f'request with limiter {name:<7} {us:>9} us{extra}')
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+HookUpZA - Serialization CPU benchmark
+
+Compares CPU time per request for building ad list/detail responses the old
+way (sqlite3.Row -> dict -> jsonify, json.loads of photos/services) against
+the stored ad_json/detail_json payloads joined as bytes.
+
+Usage:
+    python3 bench/bench_serialization.py --ads 20000 --iterations 200
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import generate_data
+
+
+def ad_columns(app):
+    # services/photos rebuilt as the JSON text the old ads columns held
+    return f'''ads.id, ads.user_id, ads.title, ads.category, ads.location, ads.description,
+    {app.AD_SERVICES_JSON} AS services, ads.rate, ads.contact, {app.AD_PHOTOS_JSON} AS photos,
+    ads.status, ads.is_premium, ads.created_at, ads.expires_at'''
+
+
+def old_public_ads(app, conn):
+    ads = conn.execute(f'''SELECT {ad_columns(app)}, u.username FROM ads JOIN users u ON ads.user_id=u.id
+    WHERE ads.status='active' AND ads.expires_at > datetime('now')
+    ORDER BY ads.is_premium DESC, ads.created_at DESC LIMIT 100''').fetchall()
+    return app.jsonify({'ads': [dict(ad) for ad in ads]}).get_data()
+
+
+def new_public_ads(app, conn):
+    ads = conn.execute('''SELECT CAST(ad_json AS BLOB) FROM ads
+    WHERE status='active' AND expires_at > datetime('now')
+    ORDER BY is_premium DESC, created_at DESC LIMIT 100''').fetchall()
+    return app.json_list_response('ads', [ad[0] for ad in ads]).get_data()
+
+
+def old_all_ads(app, conn):
+    ads = conn.execute(f'''SELECT {ad_columns(app)}, u.username, u.account_type FROM ads
+    JOIN users u ON ads.user_id=u.id ORDER BY ads.created_at DESC''').fetchall()
+    return app.jsonify({'ads': [dict(ad) for ad in ads]}).get_data()
+
+
+def new_all_ads(app, conn):
+    ads = conn.execute('SELECT CAST(ad_json AS BLOB) FROM ads ORDER BY created_at DESC').fetchall()
+    return app.json_list_response('ads', [ad[0] for ad in ads]).get_data()
+
+
+def old_detail(app, conn, ad_id):
+    ad = conn.execute(f'''SELECT {ad_columns(app)}, u.username, u.account_type FROM ads
+    JOIN users u ON ads.user_id=u.id WHERE ads.id=?''', (ad_id,)).fetchone()
+    ad_dict = dict(ad)
+    for field in ['services', 'photos']:
+        if ad_dict.get(field):
+            try: ad_dict[field] = json.loads(ad_dict[field])
+            except ValueError: pass
+    return app.jsonify({'ad': ad_dict}).get_data()
+
+
+def new_detail(app, conn, ad_id):
+    ad = conn.execute('SELECT CAST(detail_json AS BLOB) FROM ads WHERE id=?', (ad_id,)).fetchone()
+    return app.Response(b'{"ad":' + ad[0] + b'}', mimetype='application/json').get_data()
+
+
+def measure(fn, iterations):
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for i in range(iterations):
+        fn(i)
+    return {'cpu_ms_per_request': round((time.process_time() - cpu_start) * 1000 / iterations, 3),
+            'wall_ms_per_request': round((time.perf_counter() - wall_start) * 1000 / iterations, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ad serialization CPU benchmark')
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--ads', type=int, default=20000)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--out', default=None)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='hookupza-bench-')
+    db_path = os.path.join(workdir, 'bench.db')
+    os.chdir(workdir)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_data.generate(db_path, args.users, args.ads)
+            import app
+        app.DB_FILE = db_path
+        app.db_profiler.SLOW_QUERY_MS = float('inf')
+        conn = app.get_db()
+        all_iterations = max(1, args.iterations // 20)
+        results = {}
+        with app.app.app_context():
+            for name, old, new, iterations in [
+                ('public_ads', lambda i: old_public_ads(app, conn), lambda i: new_public_ads(app, conn), args.iterations),
+                ('admin_all_ads', lambda i: old_all_ads(app, conn), lambda i: new_all_ads(app, conn), all_iterations),
+                ('get_ad', lambda i: old_detail(app, conn, i % args.ads + 1),
+                 lambda i: new_detail(app, conn, i % args.ads + 1), args.iterations * 10),
+            ]:
+                before, after = measure(old, iterations), measure(new, iterations)
+                results[name] = {'before': before, 'after': after, 'iterations': iterations,
+                                 'cpu_speedup': round(before['cpu_ms_per_request'] / max(after['cpu_ms_per_request'], 1e-6), 2)}
+                print(f"{name:<15} before {before['cpu_ms_per_request']:>9} ms CPU   "
+                      f"after {after['cpu_ms_per_request']:>9} ms CPU   x{results[name]['cpu_speedup']}")
+        conn.close()
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'params': vars(args), 'results': results}, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
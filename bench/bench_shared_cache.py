@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+HookUpZA - Shared cache vs per-process cache benchmark
+
+Forks --workers processes that each serve --entries cached ad payloads
+(~--value-bytes each), the way gunicorn workers would:
+
+    dict     a plain dict per process (the lower bound for hit latency)
+    local    lru.SizedLRU per process (what HOOKUPZA_CACHE=local uses)
+    shared   one shm_cache.SharedCache file filled once and mapped by all
+
+and reports the median and p99 hit latency plus the memory the cache added
+to the workers combined: RSS (shared pages counted in every process) and PSS
+(shared pages split between the processes mapping them, i.e. real use),
+from /proc/<pid>/smaps_rollup.
+
+Usage:
+    python3 bench/bench_shared_cache.py --workers 4 --entries 20000
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import lru
+import shm_cache
+
+
+def memory_kb():
+    """(rss, pss) of this process in kB."""
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ('Rss:', 'Pss:'):
+                fields[parts[0]] = int(parts[1])
+    return fields['Rss:'], fields['Pss:']
+
+
+def payload(i, size):
+    return json.dumps({'id': i, 'title': f'Ad {i}', 'description': 'x' * size}).encode()[:size]
+
+
+def worker(mode, args, path, ready, done, results):
+    random.seed(os.getpid())
+    before = memory_kb()
+    if mode == 'shared':
+        cache = shm_cache.SharedCache(path, args.shared_mb).namespace('detail', ttl=3600)
+        get = cache.get
+    elif mode == 'local':
+        cache = lru.SizedLRU(1 << 40, ttl=3600)
+        for i in range(args.entries):
+            value = payload(i, args.value_bytes)
+            cache.put(i, value, len(value))
+        get = cache.get
+    else:
+        cache = {i: payload(i, args.value_bytes) for i in range(args.entries)}
+        get = cache.get
+    keys = [random.randrange(args.entries) for _ in range(args.lookups)]
+    timings, hits = [], 0
+    for start in range(0, len(keys), 100):
+        batch = keys[start:start + 100]
+        t0 = time.perf_counter()
+        for key in batch:
+            if get(key) is not None:
+                hits += 1
+        timings.append((time.perf_counter() - t0) / len(batch))
+    after = memory_kb()
+    results.put({'hit_us': statistics.median(timings) * 1e6,
+                 'p99_us': sorted(timings)[int(len(timings) * 0.99)] * 1e6,
+                 'hit_rate': hits / len(keys),
+                 'rss_kb': after[0] - before[0], 'pss_kb': after[1] - before[1]})
+    ready.wait()
+    done.wait()
+
+
+def run(mode, args, path):
+    if mode == 'shared':
+        # one warm-up fill, as the first worker to miss would do
+        cache = shm_cache.SharedCache(path, args.shared_mb)
+        ns = cache.namespace('detail', ttl=3600)
+        for i in range(args.entries):
+            ns.put(i, payload(i, args.value_bytes))
+        cache.close()
+    ctx = multiprocessing.get_context('fork')
+    ready, done, results = ctx.Barrier(args.workers + 1), ctx.Barrier(args.workers + 1), ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(mode, args, path, ready, done, results)) for _ in range(args.workers)]
+    for p in procs:
+        p.start()
+    # collect while every worker is still alive, so shared pages are split between all of them
+    rows = [results.get() for _ in procs]
+    ready.wait()
+    done.wait()
+    for p in procs:
+        p.join()
+    return {'mode': mode, 'workers': args.workers,
+            'hit_us': round(statistics.median(r['hit_us'] for r in rows), 3),
+            'p99_us': round(max(r['p99_us'] for r in rows), 3),
+            'hit_rate': round(min(r['hit_rate'] for r in rows), 3),
+            'rss_mb': round(sum(r['rss_kb'] for r in rows) / 1024, 1),
+            'pss_mb': round(sum(r['pss_kb'] for r in rows) / 1024, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Shared cache vs per-process cache benchmark')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--entries', type=int, default=20000)
+    parser.add_argument('--value-bytes', type=int, default=800)
+    parser.add_argument('--lookups', type=int, default=100000)
+    parser.add_argument('--shared-mb', type=float, default=64)
+    parser.add_argument('--modes', default='dict,local,shared')
+    parser.add_argument('--out', help='write results as JSON')
+    args = parser.parse_args()
+
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    path = os.path.join(base, f'hookupza-bench-{os.getpid()}.cache')
+    results = []
+    try:
+        for mode in args.modes.split(','):
+            row = run(mode, args, path)
+            results.append(row)
+            print(f"{mode:<7} hit {row['hit_us']:>7} us  p99 {row['p99_us']:>7} us  hit rate {row['hit_rate']:>5}  "
+                  f"RSS +{row['rss_mb']:>7} MB  PSS +{row['pss_mb']:>7} MB  ({row['workers']} workers)")
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'entries': args.entries, 'value_bytes': args.value_bytes, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
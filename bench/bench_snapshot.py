@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+HookUpZA - Anonymous homepage: live vs static snapshot
+
+Generates a synthetic database, publishes a snapshot (snapshot.py) and times
+what one anonymous homepage view costs the app:
+
+    live       GET /, then /api/batch (public_ads + check_auth) and
+               /api/ads/facets, as index.html does; "warm" with the listing and
+               facet caches filled, "after write" with them just invalidated
+    snapshot   GET / answered from the published index.html.gz, everything inlined
+
+through the Flask test client, with the pooled connections taken per view
+(0 means no database work). Also reports publish time and the bytes sent,
+and fails unless an ad whose text is HOSTILE_TEXT comes through the inlined
+homepage script intact and without a raw '<'.
+A front server reading the snapshot directory itself takes Flask out too.
+
+Usage:
+    python3 bench/bench_snapshot.py --ads 200000 --views 500
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import generate_data
+
+# '<!--<script>' inside a script element would keep the snapshot's own </script> from closing it
+HOSTILE_TEXT = '<!--<script></script> vendor special'
+
+
+def summary(samples):
+    samples = sorted(samples)
+    return {'median_ms': round(statistics.median(samples), 3),
+            'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3)}
+
+
+def add_hostile_ad(app):
+    conn = app.connect_db()
+    ad_id = conn.execute("""INSERT INTO ads (user_id, title, category, location, description, contact, status,
+    is_premium, expires_at) VALUES (1, ?, 'mw4m', 'Durban', ?, '0710000000', 'active', 1,
+    datetime('now', '+30 days'))""", (HOSTILE_TEXT, HOSTILE_TEXT)).lastrowid
+    app.refresh_ad_json(conn, [ad_id])
+    conn.commit()
+    conn.close()
+    return ad_id
+
+
+def check_inlined(path, ad_id):
+    """Why the published page at path does not carry the ad intact in window.SNAPSHOT, or None."""
+    with open(path, 'rb') as f:
+        html = f.read()
+    start = html.index(b'<script>window.SNAPSHOT = ') + len(b'<script>window.SNAPSHOT = ')
+    value = html[start:html.index(b';</script>', start)]
+    if b'<' in value:
+        return "raw '<' in the inlined script"
+    ads = {ad['id']: ad for ad in json.loads(value)['listing']['ads']}
+    if ad_id not in ads or ads[ad_id]['title'] != HOSTILE_TEXT:
+        return 'ad text did not survive inlining'
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Anonymous homepage: live vs static snapshot')
+    parser.add_argument('--users', type=int, default=40000)
+    parser.add_argument('--ads', type=int, default=200000)
+    parser.add_argument('--views', type=int, default=500)
+    parser.add_argument('--publishes', type=int, default=20)
+    parser.add_argument('--out', default=None)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='hookupza-bench-')
+    db_path = os.path.join(workdir, 'bench.db')
+    os.environ['HOOKUPZA_DB'] = db_path
+    os.environ['HOOKUPZA_RATELIMIT'] = 'off'
+    os.environ['HOOKUPZA_SNAPSHOT_DIR'] = os.path.join(workdir, 'snapshot')
+    results = {}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_data.generate(db_path, args.users, args.ads)
+            import app
+        client = app.app.test_client()    # create_app() builds the caches publishing reads
+        app.db_profiler.SLOW_QUERY_MS = float('inf')
+        hostile_id = add_hostile_ad(app)
+
+        samples = []
+        for _ in range(args.publishes):
+            start = time.perf_counter()
+            manifest = app.snapshot_publisher.publish_now()
+            samples.append((time.perf_counter() - start) * 1000)
+        files = manifest['files']
+        problem = check_inlined(os.path.join(os.environ['HOOKUPZA_SNAPSHOT_DIR'], 'index.html'), hostile_id)
+        if problem:
+            sys.exit(f'snapshot check failed: {problem}')
+        results['publish'] = dict(summary(samples), files=len(files),
+                                  bytes=sum(f['bytes'] for f in files.values()),
+                                  gzip_bytes=sum(f['gzip_bytes'] for f in files.values()))
+        print(f"publish: median {results['publish']['median_ms']} ms, {len(files)} files, "
+              f"{results['publish']['bytes'] // 1024} KB ({results['publish']['gzip_bytes'] // 1024} KB gzipped)")
+
+        acquired = [0]
+        acquire = app.pool.acquire
+        def counting_acquire():
+            acquired[0] += 1
+            return acquire()
+        app.pool.acquire = counting_acquire
+        publisher = app.snapshot_publisher
+        gzip_header = {'Accept-Encoding': 'gzip'}
+
+        def live_view():
+            sent = 0
+            for response in (client.get('/', headers=gzip_header),
+                             client.post('/api/batch', json={'requests': ['/api/public_ads', '/api/check_auth']}),
+                             client.get('/api/ads/facets')):
+                sent += len(response.get_data())
+                response.close()
+            return sent
+
+        def snapshot_view():
+            response = client.get('/', headers=gzip_header)
+            sent = len(response.get_data())
+            response.close()
+            return sent
+
+        for name, view, invalidate in (('live_warm', live_view, False), ('live_after_write', live_view, True),
+                                       ('snapshot', snapshot_view, False)):
+            app.snapshot_publisher = publisher if name == 'snapshot' else None
+            samples, acquired[0], sent = [], 0, 0
+            for _ in range(args.views):
+                if invalidate:
+                    app.listing_cache.invalidate()
+                    app.facet_cache.invalidate()
+                with contextlib.redirect_stdout(io.StringIO()):    # check_auth logs the session
+                    start = time.perf_counter()
+                    sent = view()
+                    samples.append((time.perf_counter() - start) * 1000)
+            results[name] = dict(summary(samples), db_connections_per_view=acquired[0] / args.views, bytes_sent=sent)
+            print(f"{name:<17} median {results[name]['median_ms']:>8} ms  p95 {results[name]['p95_ms']:>8} ms  "
+                  f"db connections/view {results[name]['db_connections_per_view']:.1f}  bytes {sent}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'params': vars(args), 'results': results}, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
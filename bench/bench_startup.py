@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+HookUpZA - Startup benchmark
+
+Starts gunicorn with the gunicorn.conf.py profile, preload on and off, and
+reports time from launch to the first successful /api/public_ads, the
+latency of that first request, and the median of the requests after it.
+
+Usage:
+    python3 bench/bench_startup.py --users 20000 --ads 100000 --runs 3
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import generate_data
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _get(url):
+    start = time.perf_counter()
+    urllib.request.urlopen(url, timeout=10).read()
+    return (time.perf_counter() - start) * 1000
+
+
+def start_once(db_path, workdir, preload, workers, steady):
+    port = _free_port()
+    url = f'http://127.0.0.1:{port}/api/public_ads'
+    env = dict(os.environ, HOOKUPZA_DB=db_path, HOOKUPZA_RATELIMIT='off',
+               GUNICORN_PRELOAD='1' if preload else '0')
+    launched = time.perf_counter()
+    server = subprocess.Popen(['gunicorn', 'app:app', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+                               '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+                               '--pythonpath', ROOT, '--log-level', 'warning'],
+                              cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = launched + 60
+        while True:
+            try:
+                first_ms = _get(url)
+                break
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                if time.perf_counter() > deadline:
+                    return None
+                time.sleep(0.02)
+        ready_ms = (time.perf_counter() - launched) * 1000
+        steady_ms = statistics.median(_get(url) for _ in range(steady))
+        return {'time_to_first_request_ms': round(ready_ms, 1), 'first_request_ms': round(first_ms, 2),
+                'steady_request_ms': round(steady_ms, 2)}
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='gunicorn startup benchmark')
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--ads', type=int, default=100000)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--steady', type=int, default=50)
+    parser.add_argument('--out', default=None)
+    args = parser.parse_args()
+
+    if shutil.which('gunicorn') is None:
+        sys.exit('gunicorn not installed')
+    workdir = tempfile.mkdtemp(prefix='hookupza-bench-')
+    db_path = os.path.join(workdir, 'bench.db')
+    results = {}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_data.generate(db_path, args.users, args.ads)
+        for preload in (True, False):
+            name = 'preload' if preload else 'no_preload'
+            runs = [r for r in (start_once(db_path, workdir, preload, args.workers, args.steady)
+                                for _ in range(args.runs)) if r]
+            if not runs:
+                print(f'{name:<11} gunicorn did not start')
+                continue
+            results[name] = {key: round(statistics.median(r[key] for r in runs), 2) for key in runs[0]}
+            r = results[name]
+            print(f"{name:<11} ready in {r['time_to_first_request_ms']:>8} ms   first request "
+                  f"{r['first_request_ms']:>7} ms   steady {r['steady_request_ms']:>7} ms")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'params': vars(args), 'results': results}, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+HookUpZA - Compare two load test result files
+
+Usage:
+    python3 bench/compare.py bench/results/abc1234.json bench/results/def5678.json
+"""
+import json
+import sys
+
+
+def pct_change(old, new):
+    if not old:
+        return '   n/a'
+    return f'{(new - old) / old * 100:+6.1f}%'
+
+
+def main(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old['commit']} -> {new['commit']}")
+    for mode, new_report in new['results'].items():
+        old_report = old['results'].get(mode)
+        if not old_report:
+            continue
+        print(f"\n{mode}: {old_report['throughput_rps']} -> {new_report['throughput_rps']} req/s "
+              f"({pct_change(old_report['throughput_rps'], new_report['throughput_rps'])})")
+        print(f"  {'route':<22}{'p50 old':>10}{'p50 new':>10}{'':>9}{'p95 old':>10}{'p95 new':>10}")
+        for name, r in new_report['routes'].items():
+            o = old_report['routes'].get(name)
+            if not o:
+                continue
+            print(f"  {name:<22}{o['p50_ms']:>10}{r['p50_ms']:>10}{pct_change(o['p50_ms'], r['p50_ms']):>9}"
+                  f"{o['p95_ms']:>10}{r['p95_ms']:>10}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(1)
+    main(sys.argv[1], sys.argv[2])
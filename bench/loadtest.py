@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+HookUpZA - Reproducible API load test
+
+Generates a synthetic database (generate_data.py), replays a fixed traffic mix against the real
+routes and reports throughput plus p50/p95/p99 latency per route.
+
+Modes:
+    inprocess  Flask test client in this process (no network, one thread)
+    gunicorn   real gunicorn server on a free local port, driven by
+               --concurrency client threads over HTTP
+    both       run both, same seed and request sequence
+
+Results are written as JSON (default bench/results/<git-sha>.json) so two
+commits can be compared with bench/compare.py.
+
+Usage:
+    python3 bench/loadtest.py --users 2000 --ads 10000 --requests 5000 --mode both
+"""
+import argparse
+import contextlib
+import http.cookiejar
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# The replay comes from one IP and logs in repeatedly; measure the app, not the limiter
+os.environ.setdefault('HOOKUPZA_RATELIMIT', 'off')
+
+import generate_data
+
+# (route name, weight) - roughly what the site sees: the homepage polls
+# public_ads every 60s, detail views are next, admins poll the dashboard.
+TRAFFIC_MIX = [
+    ('public_ads', 35),
+    ('public_ads_category', 10),
+    ('get_ad', 25),
+    ('check_auth', 12),
+    ('login', 3),
+    ('post_ad', 3),
+    ('admin_stats', 6),
+    ('admin_all_ads', 6),
+]
+
+
+def build_sequence(rng, count, ads, users):
+    names = [name for name, _ in TRAFFIC_MIX]
+    weights = [weight for _, weight in TRAFFIC_MIX]
+    sequence = []
+    for name in rng.choices(names, weights=weights, k=count):
+        if name == 'get_ad':
+            sequence.append((name, rng.randint(1, max(ads, 1))))
+        elif name == 'public_ads_category':
+            sequence.append((name, rng.choice(generate_data.CATEGORIES)[0]))
+        elif name == 'login':
+            sequence.append((name, rng.randint(0, max(min(users, 100), 1) - 1)))
+        else:
+            sequence.append((name, None))
+    return sequence
+
+
+class InProcessClient:
+    def __init__(self, flask_app):
+        self.client = flask_app.test_client()
+
+    def request(self, method, path, body=None):
+        response = self.client.open(path, method=method, json=body)
+        response.get_data()
+        return response.status_code
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'} if data else {})
+        try:
+            with self.opener.open(req, timeout=30) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+
+class VirtualUsers:
+    """One anonymous, one logged-in and one admin client, plus fresh clients for logins."""
+
+    def __init__(self, make_client):
+        self.make_client = make_client
+        self.anon = make_client()
+        self.user = make_client()
+        self.user.request('POST', '/api/login', {'username': generate_data.synthetic_username(0),
+                                                 'password': generate_data.SYNTHETIC_PASSWORD})
+        self.admin = make_client()
+        self.admin.request('POST', '/api/login', {'username': 'admin', 'password': 'admin123'})
+
+    def run(self, name, arg):
+        if name == 'public_ads':
+            return self.anon.request('GET', '/api/public_ads')
+        if name == 'public_ads_category':
+            return self.anon.request('GET', f'/api/public_ads?category={arg}')
+        if name == 'get_ad':
+            return self.anon.request('GET', f'/api/get_ad/{arg}')
+        if name == 'check_auth':
+            return self.user.request('GET', '/api/check_auth')
+        if name == 'login':
+            return self.make_client().request('POST', '/api/login', {
+                'username': generate_data.synthetic_username(arg), 'password': generate_data.SYNTHETIC_PASSWORD})
+        if name == 'post_ad':
+            return self.user.request('POST', '/api/post_ad', {
+                'title': 'Load test ad', 'category': 'hookups', 'description': 'Posted by the load test',
+                'contact': '0710000000', 'location': 'Cape Town', 'services': ['Phone Calls'], 'photos': []})
+        if name == 'admin_stats':
+            return self.admin.request('GET', '/api/admin/stats')
+        if name == 'admin_all_ads':
+            return self.admin.request('GET', '/api/admin/all_ads')
+        raise ValueError(name)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, wall_time):
+    routes = {}
+    for name, elapsed, status in samples:
+        entry = routes.setdefault(name, {'latencies': [], 'errors': 0})
+        entry['latencies'].append(elapsed * 1000)
+        if status >= 400:
+            entry['errors'] += 1
+    report = {}
+    for name, entry in sorted(routes.items()):
+        values = sorted(entry['latencies'])
+        report[name] = {
+            'count': len(values),
+            'errors': entry['errors'],
+            'mean_ms': round(sum(values) / len(values), 3),
+            'p50_ms': round(percentile(values, 50), 3),
+            'p95_ms': round(percentile(values, 95), 3),
+            'p99_ms': round(percentile(values, 99), 3),
+            'rps': round(len(values) / wall_time, 2) if wall_time else 0.0,
+        }
+    return {'total_requests': len(samples), 'wall_s': round(wall_time, 3),
+            'throughput_rps': round(len(samples) / wall_time, 2) if wall_time else 0.0,
+            'routes': report}
+
+
+def replay(users, sequence):
+    samples = []
+    for name, arg in sequence:
+        start = time.perf_counter()
+        status = users.run(name, arg)
+        samples.append((name, time.perf_counter() - start, status))
+    return samples
+
+
+def run_inprocess(db_path, sequence, warmup):
+    import app
+    app.DB_FILE = db_path
+    with contextlib.redirect_stdout(io.StringIO()):
+        users = VirtualUsers(lambda: InProcessClient(app.app))
+        replay(users, sequence[:warmup])
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        samples = replay(users, sequence)
+        wall = time.perf_counter() - start
+    return summarize(samples, wall)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for(base_url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(base_url + '/api/public_ads', timeout=2).read()
+            return True
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            time.sleep(0.1)
+    return False
+
+
+def run_gunicorn(db_path, workdir, sequence, warmup, workers, concurrency):
+    if shutil.which('gunicorn') is None:
+        print('gunicorn not installed, skipping gunicorn mode')
+        return None
+    port = _free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    env = dict(os.environ, HOOKUPZA_DB=db_path)
+    server = subprocess.Popen(['gunicorn', 'app:app', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+                               '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+                               '--pythonpath', ROOT, '--log-level', 'warning'],
+                              cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not _wait_for(base_url):
+            print('gunicorn did not start, skipping gunicorn mode')
+            return None
+        shards = [sequence[i::concurrency] for i in range(concurrency)]
+        clients = [VirtualUsers(lambda: HttpClient(base_url)) for _ in range(concurrency)]
+        replay(clients[0], sequence[:warmup])
+        results = [None] * concurrency
+
+        def worker(index):
+            results[index] = replay(clients[index], shards[index])
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - start
+        samples = [sample for shard in results for sample in shard]
+        report = summarize(samples, wall)
+        report.update({'workers': workers, 'concurrency': concurrency})
+        return report
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def print_report(mode, report):
+    print(f"\n{mode}: {report['total_requests']} requests in {report['wall_s']}s "
+          f"({report['throughput_rps']} req/s)")
+    print(f"  {'route':<22}{'count':>7}{'err':>6}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for name, r in report['routes'].items():
+        print(f"  {name:<22}{r['count']:>7}{r['errors']:>6}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HookUpZA API load test')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--ads', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--warmup', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--mode', choices=['inprocess', 'gunicorn', 'both'], default='inprocess')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--out', default=None)
+    args = parser.parse_args()
+
+    commit = git_commit()
+    out_path = args.out or os.path.join(ROOT, 'bench', 'results', f'{commit}.json')
+    workdir = tempfile.mkdtemp(prefix='hookupza-bench-')
+    db_path = os.path.join(workdir, 'bench.db')
+    os.chdir(workdir)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_data.generate(db_path, args.users, args.ads, args.seed)
+        sequence = build_sequence(random.Random(args.seed), args.requests, args.ads, args.users)
+        results = {}
+        if args.mode in ('inprocess', 'both'):
+            results['inprocess'] = run_inprocess(db_path, sequence, args.warmup)
+            print_report('inprocess', results['inprocess'])
+        if args.mode in ('gunicorn', 'both'):
+            report = run_gunicorn(db_path, workdir, sequence, args.warmup, args.workers, args.concurrency)
+            if report:
+                results['gunicorn'] = report
+                print_report('gunicorn', report)
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'params': vars(args),
+        'results': results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    with open(out_path, 'w') as f:
+        json.dump(output, f, indent=2, sort_keys=True)
+    print(f"\nResults written to {out_path}")
+
+
+if __name__ == '__main__':
+    main()
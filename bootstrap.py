@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+HookUpZA - One-time database setup
+
+Creates the schema in HOOKUPZA_DB (or --db), runs its migrations and, on a
+database without users, adds the default accounts. Run it once per deploy,
+before the workers start; running it again changes nothing. Workers then
+only read the schema version when they boot (app.create_app); they set the
+database up themselves only when it is behind, unless
+HOOKUPZA_AUTO_BOOTSTRAP=0 makes that an error instead.
+
+Usage:
+    python3 bootstrap.py                       # hookupza.db
+    python3 bootstrap.py --db other.db --no-seed
+    python3 bootstrap.py --check               # exit status 1 when the schema is behind
+"""
+import argparse
+import os
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Set up the HookUpZA database')
+    parser.add_argument('--db', default=None, help='database file (default: HOOKUPZA_DB or hookupza.db)')
+    parser.add_argument('--no-seed', action='store_true', help='do not add the default accounts')
+    parser.add_argument('--check', action='store_true', help='only report whether the schema is current')
+    args = parser.parse_args()
+    if args.db:
+        os.environ['HOOKUPZA_DB'] = args.db
+    import app
+
+    version = app.schema_version() if os.path.exists(app.DB_FILE) else 0
+    if args.check:
+        print(f"{app.DB_FILE}: schema version {version}, current {app.SCHEMA_VERSION}")
+        sys.exit(0 if version >= app.SCHEMA_VERSION else 1)
+    app.init_db()
+    if not args.no_seed:
+        app.seed_accounts()
+    print(f"{app.DB_FILE}: schema version {version} -> {app.SCHEMA_VERSION}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+HookUpZA - Buffered engagement counters
+
+Ad views and "Show contact" clicks are counted in memory and written to SQLite as
+aggregated deltas, one transaction every FLUSH_SECONDS, from a background
+thread - so reading an ad never turns into a write. Each worker process has
+its own buffer, split into SHARDS dicts with their own locks so request
+threads rarely wait on each other.
+
+A crash loses at most one flush interval of counts. A flush that fails
+(database locked, disk full) puts its deltas back for the next one.
+"""
+import atexit
+import os
+import threading
+
+FLUSH_SECONDS = float(os.environ.get('HOOKUPZA_STATS_FLUSH', 5))
+SHARDS = 8
+# Keys in one shard before the flusher is woken early (bounds memory under a flood of ids)
+MAX_PENDING = 50000
+
+
+class CounterBuffer:
+    """key -> one running delta per field. `flush(pending)` receives {key: [delta, ...]}
+    in `fields` order and must write it in a single transaction."""
+
+    def __init__(self, flush, fields, interval=FLUSH_SECONDS, shards=SHARDS):
+        self.flush_fn = flush
+        self.fields = tuple(fields)
+        self.interval = interval
+        self.shard_count = shards
+        self.start_lock = threading.Lock()
+        self.pid = None
+        self._reset()
+
+    def _reset(self):
+        self.shards = [(threading.Lock(), {}) for _ in range(self.shard_count)]
+        self.wake = threading.Event()
+
+    def add(self, key, field, amount=1):
+        if self.pid != os.getpid():
+            self._start()
+        index = self.fields.index(field)
+        lock, counts = self.shards[hash(key) % self.shard_count]
+        with lock:
+            row = counts.get(key)
+            if row is None:
+                row = counts[key] = [0] * len(self.fields)
+            row[index] += amount
+            full = len(counts) >= MAX_PENDING
+        if full:
+            self.wake.set()
+
+    def take(self):
+        """Empty every shard and return what they held."""
+        pending = {}
+        for lock, counts in self.shards:
+            with lock:
+                taken = counts.copy()
+                counts.clear()
+            pending.update(taken)
+        return pending
+
+    def merge(self, pending):
+        for key, deltas in pending.items():
+            lock, counts = self.shards[hash(key) % self.shard_count]
+            with lock:
+                row = counts.setdefault(key, [0] * len(self.fields))
+                for i, delta in enumerate(deltas):
+                    row[i] += delta
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of keys written."""
+        pending = self.take()
+        if not pending:
+            return 0
+        try:
+            self.flush_fn(pending)
+        except Exception as e:
+            print(f"Counter flush failed, keeping {len(pending)} keys for the next one: {e}")
+            self.merge(pending)
+            return 0
+        return len(pending)
+
+    def _start(self):
+        with self.start_lock:
+            if self.pid == os.getpid():
+                return
+            # After a fork the inherited counts are the parent's to flush, and its locks may be held
+            self._reset()
+            threading.Thread(target=self._run, name='hookupza-counters', daemon=True).start()
+            atexit.register(self.flush)
+            self.pid = os.getpid()
+
+    def _run(self):
+        while True:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            self.flush()
@@ -0,0 +1,64 @@
+"""
+HookUpZA - SQLite connection pool
+
+Keeps up to `size` idle connections per worker process so requests reuse an
+open connection (and its warm page cache) instead of reconnecting. A
+connection is handed to one thread at a time, so they are opened with
+check_same_thread=False.
+
+The pool notices a fork (pid change) and a changed database path (key) and
+starts over rather than reusing a connection it must not share.
+"""
+import os
+import queue
+
+
+class ConnectionPool:
+    def __init__(self, connect, size=8, key=lambda: None):
+        self.connect = connect
+        self.size = size
+        self.key = key
+        self.pid = os.getpid()
+        self.idle = queue.LifoQueue()
+        self.current_key = key()
+
+    def _check_owner(self):
+        pid, key = os.getpid(), self.key()
+        if pid != self.pid:
+            # Connections inherited across fork belong to the parent: drop, never close
+            self.idle = queue.LifoQueue()
+            self.pid = pid
+        if key != self.current_key:
+            self.close_all()
+            self.current_key = key
+
+    def acquire(self):
+        self._check_owner()
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            return self.connect()
+
+    def release(self, conn):
+        if os.getpid() != self.pid or self.key() != self.current_key:
+            conn.close()
+            return
+        if conn.in_transaction:
+            conn.rollback()
+        if self.idle.qsize() >= self.size:
+            conn.close()
+        else:
+            self.idle.put_nowait(conn)
+
+    def fill(self, count=None):
+        """Open connections up front (e.g. in a gunicorn post_fork hook)."""
+        self._check_owner()
+        for _ in range(min(count or self.size, self.size) - self.idle.qsize()):
+            self.idle.put_nowait(self.connect())
+
+    def close_all(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
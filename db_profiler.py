@@ -0,0 +1,200 @@
+"""
+HookUpZA - SQL statement profiler
+
+Wraps sqlite3 connections so every statement is timed. Statements are
+grouped by their normalized SQL text (literals replaced with ?), slow ones
+are printed together with their EXPLAIN QUERY PLAN, and a per-request
+breakdown can be collected for the X-Profile header.
+
+Stats are kept per worker process.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+
+SLOW_QUERY_MS = float(os.environ.get('HOOKUPZA_SLOW_QUERY_MS', 100))
+TOP_N = 20
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)+\s*\)', re.IGNORECASE)
+_SPACE_RE = re.compile(r'\s+')
+
+_stats = {}          # normalized sql -> [calls, total_s, max_s]
+_stats_lock = threading.Lock()
+_request_log = ContextVar('hookupza_request_log', default=None)
+_normalized_cache = {}
+
+
+def normalize_sql(sql):
+    """Collapse whitespace and replace literals so similar statements group together."""
+    cached = _normalized_cache.get(sql)
+    if cached is not None:
+        return cached
+    text = _STRING_RE.sub('?', sql)
+    text = _NUMBER_RE.sub('?', text)
+    text = _IN_LIST_RE.sub('IN (...)', text)
+    text = _SPACE_RE.sub(' ', text).strip()
+    if len(_normalized_cache) < 2000:
+        _normalized_cache[sql] = text
+    return text
+
+
+def _record(normalized, elapsed):
+    with _stats_lock:
+        entry = _stats.get(normalized)
+        if entry is None:
+            _stats[normalized] = [1, elapsed, elapsed]
+        else:
+            entry[0] += 1
+            entry[1] += elapsed
+            if elapsed > entry[2]:
+                entry[2] = elapsed
+    log = _request_log.get()
+    if log is not None:
+        log.append((normalized, elapsed, 1))
+
+
+def _explain(conn, sql, params):
+    try:
+        rows = sqlite3.Connection.execute(conn, 'EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+        return [row[-1] for row in rows]
+    except sqlite3.Error:
+        return []
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Cursor that times execute and fetch calls for the statement it is running."""
+
+    _sql = None
+    _params = ()
+    _elapsed = 0.0
+
+    def execute(self, sql, params=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            self._begin(sql, params, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_params):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_params)
+        finally:
+            self._begin(sql, (), time.perf_counter() - start)
+
+    def executescript(self, script):
+        start = time.perf_counter()
+        try:
+            return super().executescript(script)
+        finally:
+            _record(normalize_sql(script), time.perf_counter() - start)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            self._add(time.perf_counter() - start)
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        try:
+            return super().fetchmany(size if size is not None else self.arraysize)
+        finally:
+            self._add(time.perf_counter() - start)
+
+    def fetchall(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            self._add(time.perf_counter() - start)
+
+    def _begin(self, sql, params, elapsed):
+        self._sql = sql
+        self._params = params
+        self._elapsed = 0.0
+        self._add(elapsed, new_call=True)
+
+    def _add(self, elapsed, new_call=False):
+        if self._sql is None:
+            return
+        before = self._elapsed
+        self._elapsed += elapsed
+        normalized = normalize_sql(self._sql)
+        if new_call:
+            _record(normalized, elapsed)
+        else:
+            with _stats_lock:
+                entry = _stats.get(normalized)
+                if entry is not None:
+                    entry[1] += elapsed
+                    if self._elapsed > entry[2]:
+                        entry[2] = self._elapsed
+            log = _request_log.get()
+            if log is not None:
+                log.append((normalized, elapsed, 0))
+        threshold = SLOW_QUERY_MS / 1000.0
+        if before < threshold <= self._elapsed:
+            plan = _explain(self.connection, self._sql, self._params)
+            print(f"SLOW QUERY {self._elapsed * 1000:.1f}ms: {normalized}")
+            for step in plan:
+                print(f"    PLAN: {step}")
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """Connection whose cursors (including conn.execute shortcuts) are profiled."""
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+
+def top_statements(limit=TOP_N):
+    """Return the statements with the highest total time, slowest first."""
+    with _stats_lock:
+        items = [(sql, e[0], e[1], e[2]) for sql, e in _stats.items()]
+    items.sort(key=lambda item: item[2], reverse=True)
+    return [{'sql': sql, 'calls': calls,
+             'total_ms': round(total * 1000, 3),
+             'avg_ms': round(total * 1000 / calls, 3),
+             'max_ms': round(worst * 1000, 3)}
+            for sql, calls, total, worst in items[:limit]]
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def start_request_profile():
+    _request_log.set([])
+
+
+def end_request_profile():
+    """Stop collecting for the current request and return its statement breakdown."""
+    log = _request_log.get() or []
+    _request_log.set(None)
+    grouped = {}
+    for sql, elapsed, calls in log:
+        entry = grouped.setdefault(sql, [0, 0.0])
+        entry[0] += calls
+        entry[1] += elapsed
+    total = sum(e[1] for e in grouped.values())
+    statements = sorted(grouped.items(), key=lambda item: item[1][1], reverse=True)
+    return {'total_ms': round(total * 1000, 3),
+            'statements': [{'sql': sql, 'calls': e[0], 'ms': round(e[1] * 1000, 3)}
+                           for sql, e in statements]}
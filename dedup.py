@@ -0,0 +1,94 @@
+"""
+HookUpZA - Near-duplicate ad text (MinHash + LSH)
+
+An ad's title and description become a set of word shingles (runs of
+SHINGLE_WORDS normalised words, numbers folded to '0' so a new phone number
+or rate does not hide a repost). Two ads are near-duplicates when their
+shingle sets have a high Jaccard similarity.
+
+Comparing a new ad with every other one is O(n), so each ad gets a MinHash
+signature instead: one-permutation hashing, where every shingle is hashed
+once into one of SIGNATURE_SIZE bins that each keep their smallest hash, and
+an empty bin (short ads leave many) copies the first filled bin in its own
+fixed pseudo-random order of donors. Two signatures agree in a bin with
+probability about equal to the Jaccard similarity of the sets.
+
+The signature is cut into BANDS bands of ROWS values, and each band is
+hashed to one LSH bucket key. Ads sharing any bucket are candidates: with
+16 bands of 4, a pair at 0.8 similarity shares a bucket 99.9% of the time,
+one at 0.3 only 12% of the time. app.py keeps the keys in ad_lsh and checks
+the few candidates exactly with jaccard().
+"""
+import hashlib
+import re
+import struct
+
+SHINGLE_WORDS = 3
+SIGNATURE_SIZE = 64
+BANDS = 16
+ROWS = SIGNATURE_SIZE // BANDS
+_BAND = struct.Struct(f'<B{ROWS}Q')
+_WORD = re.compile(r'[a-z0-9]+')
+
+
+def shingles(title, description):
+    """Set of word shingles of an ad's text (empty for an ad without words)."""
+    words = ['0' if word.isdigit() else word for word in _WORD.findall(f'{title} {description}'.lower())]
+    if len(words) <= SHINGLE_WORDS:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def _hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), 'little')
+
+
+# For each bin, the other bins in the order an empty one looks for a donor. Spread out rather
+# than "the next bin", so the bins of one band rarely copy the same donor; fixed, as the
+# bucket keys stored in the database depend on it. Built by the first signature().
+_DONORS = None
+
+
+def _donors():
+    global _DONORS
+    _DONORS = [sorted((j for j in range(SIGNATURE_SIZE) if j != i), key=lambda j, i=i: _hash64(f'{i}:{j}'))
+               for i in range(SIGNATURE_SIZE)]
+    return _DONORS
+
+
+def signature(shingle_set):
+    """SIGNATURE_SIZE ints, or None for an empty set."""
+    if not shingle_set:
+        return None
+    bins = [None] * SIGNATURE_SIZE
+    blake2b = hashlib.blake2b
+    for shingle in shingle_set:
+        value, bin_index = divmod(int.from_bytes(blake2b(shingle.encode(), digest_size=8).digest(), 'little'),
+                                  SIGNATURE_SIZE)
+        current = bins[bin_index]
+        if current is None or value < current:
+            bins[bin_index] = value
+    signature = list(bins)
+    donors = _DONORS or _donors()
+    for i, value in enumerate(bins):
+        if value is None:
+            for donor in donors[i]:
+                if bins[donor] is not None:
+                    break
+            # the donor's index goes in too: two ads agree here only if they copied the same bin
+            signature[i] = bins[donor] * SIGNATURE_SIZE + donor
+    return signature
+
+
+def buckets(shingle_set):
+    """BANDS LSH bucket keys (signed 64-bit, to fit an SQLite INTEGER); [] for an empty set."""
+    sig = signature(shingle_set)
+    if sig is None:
+        return []
+    return [int.from_bytes(hashlib.blake2b(_BAND.pack(band, *sig[band * ROWS:(band + 1) * ROWS]),
+                                           digest_size=8).digest(), 'little', signed=True)
+            for band in range(BANDS)]
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 0.0
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+HookUpZA - Bulk synthetic data generator
+
+Creates (or extends) a database with realistic volumes of users and ads:
+weighted categories and locations, vendor/premium share, and a status mix
+that falls out of posting dates (vendor ads live 30 days, free ads 3 days,
+some free ads still pending, a few rejected).
+
+Rows go in with batched executemany inside large transactions, with the
+ads/users indexes and triggers dropped during the load and rebuilt at the
+end (facet counts and the ad_geo R*Tree are rebuilt once). The ad_lsh
+duplicate index costs about 200 us per ad in pure Python - minutes at
+millions of ads - so it is only built with --lsh; without it, new ads are
+not checked against the synthetic ones. The same --seed and --now always
+produce the same rows.
+
+All synthetic users share the password SYNTHETIC_PASSWORD (hashed once).
+The default admin/vendor1/test1 accounts come from app.bootstrap().
+
+Usage:
+    python3 generate_data.py --db hookupza.db --users 1000000 --ads 2000000 --seed 42
+    python3 generate_data.py --db dup.db --users 20000 --ads 100000 --lsh
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+SYNTHETIC_PASSWORD = 'synthetic123'
+BATCH_SIZE = 50000
+
+CATEGORIES = [('mw4m', 22), ('wf4m', 20), ('hookups', 18), ('services', 14),
+              ('couples', 10), ('mw4mw', 7), ('lgbtq', 6), ('wf4w', 3)]
+# Rough population weighting of the metros and towns people post from
+LOCATIONS = [('Johannesburg', 18), ('Cape Town', 16), ('Durban', 11), ('Pretoria', 10),
+             ('Sandton', 5), ('Soweto', 4), ('Port Elizabeth', 5), ('Bellville', 3),
+             ('Bloemfontein', 3), ('East London', 3), ('Polokwane', 2), ('Nelspruit', 2),
+             ('Kimberley', 1), ('Stellenbosch', 2), ('Pietermaritzburg', 2), ('Rustenburg', 2),
+             ('George', 1), ('Centurion', 3), ('Midrand', 2), ('Umhlanga', 2), ('Randburg', 2),
+             ('Roodepoort', 1), ('Benoni', 1), ('Boksburg', 1), ('Paarl', 1)]
+SERVICES = ['WhatsApp Available', 'Phone Calls', 'Video Calls', 'Incalls', 'Outcalls',
+            'Sells Pictures', 'Sells Videos', 'Roleplay', 'Massage', 'Verified']
+AGES = [('18-24', 30), ('25-34', 40), ('35-44', 20), ('45+', 10)]
+TITLE_WORDS = ['Sweet', 'Discreet', 'Fun', 'Naughty', 'Real', 'Genuine', 'Hot', 'Classy',
+               'Young', 'Mature', 'Friendly', 'Busty', 'Curvy', 'Slim', 'Ebony', 'Blonde']
+DESCRIPTION_WORDS = ['available', 'tonight', 'weekends', 'travel', 'discreet', 'clean', 'safe',
+                     'friendly', 'genuine', 'photos', 'verified', 'call', 'whatsapp', 'only',
+                     'serious', 'no', 'time', 'wasters', 'fun', 'relaxed', 'meet', 'drinks',
+                     'hotel', 'incall', 'outcall', 'rates', 'negotiable', 'message', 'me']
+
+VENDOR_SHARE = 0.15
+PENDING_SHARE = 0.25     # of free ads that are still inside their review window
+REJECTED_SHARE = 0.03
+HISTORY_DAYS = 90
+
+
+def synthetic_username(n):
+    # zero-padded so usernames are inserted in index order
+    return f'user{n:08d}'
+
+
+def _weighted(rng, items, k):
+    values = [value for value, _ in items]
+    weights = [weight for _, weight in items]
+    return rng.choices(values, weights=weights, k=k)
+
+
+def _pool(rng, items, size=65536):
+    """Pre-draw a pool of weighted choices; indexing it is far cheaper than rng.choices per row."""
+    return _weighted(rng, items, size)
+
+
+def create_schema(db_path):
+    """Run app.bootstrap() against db_path so the schema has a single source of truth."""
+    os.environ['HOOKUPZA_DB'] = db_path
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    import app
+    app.DB_FILE = db_path
+    app.bootstrap()
+
+
+def _drop_indexes(conn):
+    rows = conn.execute("""SELECT name, sql FROM sqlite_master
+    WHERE type='index' AND tbl_name IN ('users', 'ads', 'ad_services', 'ad_photos') AND sql IS NOT NULL""").fetchall()
+    for name, _ in rows:
+        conn.execute(f'DROP INDEX "{name}"')
+    return [sql for _, sql in rows]
+
+
+def _drop_triggers(conn):
+    # per-row facet triggers would dominate a bulk load; counts are rebuilt once at the end
+    rows = conn.execute("SELECT name, sql FROM sqlite_master WHERE type='trigger'").fetchall()
+    for name, _ in rows:
+        conn.execute(f'DROP TRIGGER "{name}"')
+    return [sql for _, sql in rows]
+
+
+def _user_rows(rng, start, count, password_hash, created_base):
+    ages = _pool(rng, AGES)
+    locations = _pool(rng, LOCATIONS)
+    mask = len(ages) - 1
+    rand = rng.random
+    span = HISTORY_DAYS * 86400
+    for i in range(start, start + count):
+        vendor = rand() < VENDOR_SHARE
+        username = synthetic_username(i)
+        yield (username, password_hash, ages[int(rand() * mask)], locations[int(rand() * mask)],
+               username + '@example.com', 'vendor' if vendor else 'free', 'user',
+               1 if vendor else 0, 1 if vendor or rand() < 0.7 else 0, created_base + int(rand() * span))
+
+
+def _text_pools(rng, size=4096):
+    """Pre-build descriptions and service lists; building them per row dominates generation time."""
+    descriptions = [' '.join(rng.choice(DESCRIPTION_WORDS) for _ in range(rng.randint(8, 48)))
+                    for _ in range(size)]
+    services = [list(enumerate(s for s in SERVICES if rng.random() < 0.3)) for _ in range(size)]
+    return descriptions, services
+
+
+def _ad_rows(rng, start, count, user_ids, vendor_ids, now):
+    """Yield (ad row, ad_services rows, ad_photos rows) with explicit ad ids from start + 1."""
+    import geo
+    categories = _pool(rng, CATEGORIES)
+    locations = _pool(rng, LOCATIONS)
+    coords = {name: geo.geocode(name)[:2] for name, _ in LOCATIONS}
+    descriptions, services = _text_pools(rng)
+    mask = len(categories) - 1
+    text_mask = len(descriptions) - 1
+    rand = rng.random
+    n_users = len(user_ids)
+    n_vendors = len(vendor_ids)
+    n_titles = len(TITLE_WORDS)
+    span = HISTORY_DAYS * 86400
+    for i in range(start + 1, start + count + 1):
+        vendor = n_vendors and rand() < 0.45
+        user_id = vendor_ids[int(rand() * n_vendors)] if vendor else user_ids[int(rand() * n_users)]
+        created = now - int(rand() * span)
+        expires = created + (30 if vendor else 3) * 86400
+        if rand() < REJECTED_SHARE:
+            status = 'rejected'
+        elif expires <= now:
+            status = 'expired'
+        elif not vendor and rand() < PENDING_SHARE:
+            status = 'pending'
+        else:
+            status = 'active'
+        category = categories[int(rand() * mask)]
+        photo_count = int(rand() * (7 if vendor else 3))
+        location = locations[int(rand() * mask)]
+        ad = (i, user_id, f'{TITLE_WORDS[int(rand() * n_titles)]} {TITLE_WORDS[int(rand() * n_titles)]} {category}',
+              category, location, *coords[location], descriptions[int(rand() * text_mask)],
+              str(200 + int(rand() * 28) * 100), f'07{int(rand() * 90000000) + 10000000}',
+              status, 1 if vendor else 0, created, expires)
+        yield (ad, [(i, n, service) for n, service in services[int(rand() * text_mask)]],
+               [(i, n, f'/uploads/seed_{i}_{n}.jpg') for n in range(photo_count)])
+
+
+def _insert_batched(conn, sql, rows, total, label):
+    done = 0
+    while done < total:
+        batch = min(BATCH_SIZE, total - done)
+        conn.executemany(sql, _take(rows, batch))
+        done += batch
+        print(f'   {label}: {done:,}/{total:,}', end='\r')
+    if total:
+        print()
+
+
+def _insert_ads(conn, rows, total):
+    """Like _insert_batched, but each item also carries the ad's child rows."""
+    done = 0
+    while done < total:
+        batch = list(_take(rows, min(BATCH_SIZE, total - done)))
+        conn.executemany('''INSERT INTO ads (id, user_id, title, category, location, lat, lon, description, rate,
+        contact, status, is_premium, created_at, expires_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime(?, 'unixepoch'), datetime(?, 'unixepoch'))''',
+                         [ad for ad, _, _ in batch])
+        conn.executemany('INSERT INTO ad_services (ad_id, position, service) VALUES (?, ?, ?)',
+                         [row for _, services, _ in batch for row in services])
+        conn.executemany('INSERT INTO ad_photos (ad_id, position, file) VALUES (?, ?, ?)',
+                         [row for _, _, photos in batch for row in photos])
+        done += len(batch)
+        print(f'   ads: {done:,}/{total:,}', end='\r')
+    if total:
+        print()
+
+
+def _take(iterator, n):
+    for _ in range(n):
+        yield next(iterator)
+
+
+def generate(db_path, users=10000, ads=50000, seed=42, now=None, lsh=False):
+    """Bulk-insert synthetic users and ads into db_path, building ad_lsh for every ad when
+    lsh is set. Returns timing info."""
+    from werkzeug.security import generate_password_hash
+
+    started = time.perf_counter()
+    create_schema(db_path)
+    rng = random.Random(seed)
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    epoch = int(now.replace(tzinfo=timezone.utc).timestamp())
+    password_hash = generate_password_hash(SYNTHETIC_PASSWORD)
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute('PRAGMA journal_mode=MEMORY')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA cache_size=-262144')
+    conn.execute('BEGIN')
+    index_sql = _drop_indexes(conn)
+    trigger_sql = _drop_triggers(conn)
+
+    first_user = (conn.execute('SELECT COALESCE(MAX(id), 0) FROM users').fetchone()[0]) + 1
+    start_n = conn.execute("SELECT COUNT(*) FROM users WHERE username LIKE 'user%'").fetchone()[0]
+    _insert_batched(conn, '''INSERT INTO users (username, password_hash, age, location, email, account_type,
+    role, vendor_paid, verified, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, datetime(?, 'unixepoch'))''',
+                    _user_rows(rng, start_n, users, password_hash, epoch - HISTORY_DAYS * 2 * 86400),
+                    users, 'users')
+    users_done = time.perf_counter()
+
+    user_ids = [row[0] for row in conn.execute('SELECT id FROM users WHERE id >= ?', (first_user,))]
+    vendor_ids = [row[0] for row in conn.execute(
+        "SELECT id FROM users WHERE id >= ? AND account_type='vendor'", (first_user,))]
+    if not user_ids:
+        user_ids = [row[0] for row in conn.execute('SELECT id FROM users')]
+    # ids are assigned here so child rows can be written alongside; never reuse an AUTOINCREMENT id
+    start_ad = conn.execute('''SELECT MAX(COALESCE((SELECT MAX(id) FROM ads), 0),
+    COALESCE((SELECT seq FROM sqlite_sequence WHERE name='ads'), 0))''').fetchone()[0]
+    _insert_ads(conn, _ad_rows(rng, start_ad, ads, user_ids, vendor_ids, epoch), ads)
+    import app
+    app.refresh_ad_json(conn, where='ad_json IS NULL')
+    ads_done = time.perf_counter()
+
+    for sql in index_sql + trigger_sql:
+        conn.execute(sql)
+    app.rebuild_facets(conn)
+    app.rebuild_geo(conn)
+    if lsh:
+        app.rebuild_lsh(conn)
+    conn.execute('COMMIT')
+    conn.execute('ANALYZE')
+    conn.close()
+    finished = time.perf_counter()
+    return {'users': users, 'ads': ads, 'seed': seed, 'now': now.strftime('%Y-%m-%d %H:%M:%S'),
+            'users_s': round(users_done - started, 2), 'ads_s': round(ads_done - users_done, 2),
+            'indexes_s': round(finished - ads_done, 2), 'total_s': round(finished - started, 2)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bulk-generate synthetic HookUpZA data')
+    parser.add_argument('--db', default='hookupza.db')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--ads', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--now', default=None, help="anchor time 'YYYY-MM-DD HH:MM:SS' (UTC), default: current time")
+    parser.add_argument('--fresh', action='store_true', help='delete the database file first')
+    parser.add_argument('--lsh', action='store_true', help='build the ad_lsh duplicate index (slow)')
+    args = parser.parse_args()
+
+    if args.fresh and os.path.exists(args.db):
+        os.remove(args.db)
+    anchor = datetime.strptime(args.now, '%Y-%m-%d %H:%M:%S') if args.now else None
+    print('=' * 55)
+    print(f'Generating {args.users:,} users and {args.ads:,} ads into {args.db} (seed={args.seed})')
+    print('=' * 55)
+    result = generate(args.db, args.users, args.ads, args.seed, anchor, args.lsh)
+    print(f"Done in {result['total_s']}s (users {result['users_s']}s, ads {result['ads_s']}s, "
+          f"indexes {result['indexes_s']}s)")
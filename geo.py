@@ -0,0 +1,80 @@
+"""
+HookUpZA - Offline place lookup and distance helpers
+
+Free-text locations ("Sea Point, Cape Town", "Joburg", "PE") are resolved to
+coordinates against the bundled gazetteer in data/za_places.csv (name,
+province, lat, lon, aliases separated by '|'). Nothing is fetched over the
+network; an unknown place simply has no coordinates.
+"""
+import csv
+import math
+import os
+import re
+
+PLACES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'za_places.csv')
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+# Short aliases ("pe", "el", "obs") only count when they are a whole comma-separated part
+MIN_WORD_MATCH = 4
+
+_NOISE = re.compile(r'\b(south africa|rsa|za|area|central|surrounds)\b')
+
+
+def place_key(text):
+    text = re.sub(r"[^a-z0-9' ]+", ' ', text.lower()).replace("'", '')
+    return ' '.join(_NOISE.sub(' ', text).split())
+
+
+def load_places(path=PLACES_FILE):
+    """key -> (lat, lon, canonical name) for every name and alias."""
+    places = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            entry = (float(row['lat']), float(row['lon']), row['name'])
+            for name in [row['name']] + [a for a in (row['aliases'] or '').split('|') if a]:
+                places.setdefault(place_key(name), entry)
+    return places
+
+
+_places = {}
+
+
+def places():
+    """load_places(), read on first use."""
+    if not _places:
+        _places.update(load_places())
+    return _places
+
+
+def geocode(text):
+    """(lat, lon, name) for a free-text location, or None. The most specific part wins:
+    'Sea Point, Cape Town' resolves to Sea Point, then Cape Town if Sea Point is unknown."""
+    if not text:
+        return None
+    known = places()
+    parts = [place_key(part) for part in [text] + text.split(',')]
+    for key in parts:
+        if key in known:
+            return known[key]
+    # No part matched whole: look for a known place name inside the words, longest first
+    for key in parts:
+        words = key.split()
+        for size in range(min(len(words), 4), 0, -1):
+            for i in range(len(words) - size + 1):
+                candidate = ' '.join(words[i:i + size])
+                if len(candidate) >= MIN_WORD_MATCH and candidate in known:
+                    return known[candidate]
+    return None
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat, lon, radius_km):
+    """(min_lat, max_lat, min_lon, max_lon) enclosing the circle; always a superset of it."""
+    dlat = radius_km / KM_PER_DEGREE
+    dlon = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)) - math.sin(math.radians(dlat)), 0.01))
+    return lat - dlat, lat + dlat, lon - dlon, lon + dlon
@@ -0,0 +1,74 @@
+"""
+HookUpZA - gunicorn serving profile
+
+    gunicorn app:app            (this file is picked up from the working directory)
+
+Workers are sized from the CPU count and run threads (gthread): requests
+spend most of their time in SQLite and socket I/O, which release the GIL.
+With preload_app the master imports app.py and builds the app once
+(create_app(); the database itself is set up by bootstrap.py, run before)
+and forks workers that share those pages copy-on-write. Each worker then
+opens its pooled DB connections and warms the hot listing queries before it
+accepts traffic.
+
+Workers share their read caches through one mmap'd file (HOOKUPZA_CACHE=shared,
+see shm_cache.py) instead of each filling its own; set HOOKUPZA_CACHE=local
+to go back to per-worker caches.
+
+Anonymous pages are published as static files to HOOKUPZA_SNAPSHOT_DIR
+(default snapshot/, see snapshot.py) and served from there; a front server
+can serve that directory itself so those requests never reach a worker,
+and HOOKUPZA_SNAPSHOT_DIR= (empty) turns snapshots off.
+
+Reloading:
+    kill -HUP <master>     restart workers with the new config. With
+                           preload_app the code was imported by the master,
+                           so HUP does NOT pick up new code.
+    kill -USR2 <master>    start a new master (new code) alongside the old;
+    kill -WINCH <old>      then drain the old workers and
+    kill -TERM <old>       stop the old master once the new one is healthy.
+    GUNICORN_PRELOAD=0     makes HUP reload code too, at the cost of
+                           imports and create_app() running in every worker.
+
+Environment:
+    PORT, WEB_CONCURRENCY (workers), GUNICORN_THREADS, GUNICORN_PRELOAD,
+    GUNICORN_TIMEOUT, GUNICORN_MAX_REQUESTS, HOOKUPZA_CACHE, HOOKUPZA_SNAPSHOT_DIR
+"""
+import multiprocessing
+import os
+import sys
+
+# Must be set before app is imported (preload_app imports it in the master)
+os.environ.setdefault('HOOKUPZA_CACHE', 'shared')
+os.environ.setdefault('HOOKUPZA_SNAPSHOT_DIR', 'snapshot')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then so slow leaks never build up; jitter avoids all of them restarting at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+errorlog = '-'
+
+
+def pre_fork(server, worker):
+    # Connections opened while the master imported the app must not leak into workers
+    app = sys.modules.get('app')
+    if app is not None:
+        app.pool.close_all()
+
+
+def post_fork(server, worker):
+    import app
+    try:
+        app.warm_up()
+    except Exception as e:
+        server.log.warning('warm-up failed in worker %s: %s', worker.pid, e)
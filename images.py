@@ -0,0 +1,123 @@
+"""
+HookUpZA - Photo placeholders and resized variants
+
+Each upload is described once, when it arrives: pixel size, average colour,
+a tiny blurred JPEG as a data: URI (under 1 KB) that ad cards paint
+straight away, and smaller copies listed in a srcset so a 300px card never
+downloads a multi-megabyte original. app.py stores the result in photo_meta
+and embeds the first photo's entry in each ad's payload as "cover".
+
+Pillow is optional, and only imported with the first upload. Without it the
+size is still read from the file header (PNG, GIF, JPEG, WebP), and cards
+show the original on a plain background.
+"""
+import base64
+import io
+import os
+import struct
+
+# srcset widths: one and two times the widest card
+VARIANT_WIDTHS = (400, 800)
+VARIANT_QUALITY = 82
+PLACEHOLDER_WIDTH = 16
+PLACEHOLDER_QUALITY = 40
+# EXIF orientations that turn the picture on its side
+ROTATED = (5, 6, 7, 8)
+
+
+_pillow = []
+
+
+def pillow():
+    """(Image, ImageFilter, ImageOps) from Pillow, or None when it is not installed."""
+    if not _pillow:
+        try:
+            from PIL import Image, ImageFilter, ImageOps
+            _pillow.append((Image, ImageFilter, ImageOps))
+        except ImportError:
+            _pillow.append(None)
+    return _pillow[0]
+
+
+def variant_path(path, width):
+    stem, _ = os.path.splitext(path)
+    return f'{stem}-{width}w.jpg'
+
+
+def describe(path, url):
+    """{'width', 'height', 'color', 'placeholder', 'srcset', 'variants'} for the image at
+    path, served at url; variants are written next to it. Raises ValueError when Pillow
+    is installed and cannot decode the file."""
+    if pillow() is None:
+        size = image_size(path)
+        return {'width': size[0] if size else None, 'height': size[1] if size else None,
+                'color': None, 'placeholder': None, 'srcset': None, 'variants': []}
+    Image, ImageFilter, ImageOps = pillow()
+    try:
+        with Image.open(path) as im:
+            width, height = im.size
+            if im.getexif().get(0x0112, 1) in ROTATED:
+                width, height = height, width
+            # JPEGs decode straight at a fraction of their size; nothing below needs more
+            im.draft('RGB', (max(VARIANT_WIDTHS) * 2, max(VARIANT_WIDTHS) * 2))
+            im = ImageOps.exif_transpose(im).convert('RGB')
+    except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+        raise ValueError(f'not a readable image: {e}')
+
+    tiny = im.resize((PLACEHOLDER_WIDTH, max(1, round(PLACEHOLDER_WIDTH * height / width))), Image.BILINEAR)
+    color = '#%02x%02x%02x' % tiny.resize((1, 1), Image.BOX).getpixel((0, 0))
+    buffer = io.BytesIO()
+    tiny.filter(ImageFilter.GaussianBlur(1)).save(buffer, 'JPEG', quality=PLACEHOLDER_QUALITY)
+    placeholder = 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+    srcset, variants = [], []
+    base_url = url.rsplit('/', 1)[0]
+    for variant_width in VARIANT_WIDTHS:
+        if variant_width >= width:
+            break
+        target = variant_path(path, variant_width)
+        im.resize((variant_width, max(1, round(variant_width * height / width))), Image.LANCZOS).save(
+            target, 'JPEG', quality=VARIANT_QUALITY, optimize=True, progressive=True)
+        variants.append(os.path.basename(target))
+        srcset.append(f'{base_url}/{variants[-1]} {variant_width}w')
+    srcset.append(f'{url} {width}w')
+    return {'width': width, 'height': height, 'color': color, 'placeholder': placeholder,
+            'srcset': ', '.join(srcset), 'variants': variants}
+
+
+def image_size(path):
+    """(width, height) from the file header, or None for formats it does not know."""
+    with open(path, 'rb') as f:
+        head = f.read(32)
+        if head[:8] == b'\x89PNG\r\n\x1a\n':
+            return struct.unpack('>II', head[16:24])
+        if head[:6] in (b'GIF87a', b'GIF89a'):
+            return struct.unpack('<HH', head[6:10])
+        if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+            chunk = head[12:16]
+            if chunk == b'VP8X':
+                return (int.from_bytes(head[24:27], 'little') + 1, int.from_bytes(head[27:30], 'little') + 1)
+            data = head + f.read(32)
+            if chunk == b'VP8L':
+                bits = int.from_bytes(data[21:25], 'little')
+                return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+            if chunk == b'VP8 ':
+                return (struct.unpack('<H', data[26:28])[0] & 0x3FFF, struct.unpack('<H', data[28:30])[0] & 0x3FFF)
+            return None
+        if head[:2] != b'\xff\xd8':
+            return None
+        # JPEG: walk the segments to the first start-of-frame
+        f.seek(2)
+        while True:
+            marker = f.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                return None
+            if marker[1] in (0xD8, 0x01) or 0xD0 <= marker[1] <= 0xD7:
+                continue
+            length = f.read(2)
+            if len(length) < 2:
+                return None
+            if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack('>xHH', f.read(5))
+                return width, height
+            f.seek(struct.unpack('>H', length)[0] - 2, os.SEEK_CUR)
@@ -68,20 +68,22 @@ window.togglePassword = togglePassword;
 // AUTH CHECK ON PAGE LOAD
 // ============================================
 
-async function checkAuthStatus() {
-    try {
-        const response = await fetch(`${API_BASE}/api/check_auth`, { 
-            credentials: 'include' 
-        });
-        if (response.ok) {
-            const data = await response.json();
-            if (data.logged_in) {
-                updateUIForLoggedInUser(data);
-                return data;
-            }
+// data: a check_auth response the page already has (e.g. from apiBatch), or null
+async function checkAuthStatus(data) {
+    if (data === undefined) {
+        data = null;
+        try {
+            const response = await fetch(`${API_BASE}/api/check_auth`, { 
+                credentials: 'include' 
+            });
+            if (response.ok) data = await response.json();
+        } catch (err) {
+            console.log('Auth check: not logged in');
         }
-    } catch (err) {
-        console.log('Auth check: not logged in');
+    }
+    if (data && data.logged_in) {
+        updateUIForLoggedInUser(data);
+        return data;
     }
     updateUIForLoggedOutUser();
     return null;
@@ -299,8 +301,9 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
-    // Initial auth check
-    checkAuthStatus();
+    // Initial auth check, unless the page fetches check_auth with its other
+    // first loads (apiBatch) and hands the result to checkAuthStatus itself
+    if (!window.AUTH_FROM_BATCH) checkAuthStatus();
 });
 
 // ============================================
@@ -2,7 +2,7 @@
  * HookUpZA - js/hookupza.js
  * 
  * LOAD THIS AS THE FIRST SCRIPT ON EVERY PAGE (before auth.js)
- * Provides globals: API_BASE, handleLogout, isUserLoggedIn, getApiUrl
+ * Provides globals: API_BASE, handleLogout, isUserLoggedIn, getApiUrl, apiBatch
  * 
  * Uses 'var' (not const/let) so it can be safely loaded multiple times
  * without "already declared" errors.
@@ -78,6 +78,41 @@ window.isUserLoggedIn = async function() {
 
 window.getCurrentUser = function() { return currentUser; };
 
+// ============================================
+// apiBatch - several GETs in one round trip (/api/batch)
+// apiBatch(['/api/check_auth', '/api/my_ads']) resolves to one
+// { status, ok, data } per path, in order. Falls back to one fetch
+// per path if the batch itself fails.
+// ============================================
+window.apiBatch = async function(paths) {
+    try {
+        const r = await fetch(API_BASE + '/api/batch', {
+            method: 'POST',
+            credentials: 'include',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ requests: paths })
+        });
+        if (r.ok) {
+            const d = await r.json();
+            return d.responses.map(x => ({ status: x.status, ok: x.status >= 200 && x.status < 300, data: x.body }));
+        }
+    } catch(e) {}
+    return Promise.all(paths.map(async path => {
+        try {
+            const r = await fetch(API_BASE + path, { credentials: 'include' });
+            return { status: r.status, ok: r.ok, data: await r.json().catch(() => ({})) };
+        } catch(e) {
+            return { status: 0, ok: false, data: { error: e.message } };
+        }
+    }));
+};
+
+// Record a check_auth result fetched some other way (e.g. in a batch)
+window.setCurrentUser = function(d) {
+    currentUser = d && d.logged_in ? d : null;
+    return currentUser;
+};
+
 // ============================================
 // selectAccountType - called from index.html signup form
 // ============================================
@@ -0,0 +1,153 @@
+/**
+ * HookUpZA - js/virtual-list.js
+ *
+ * Windowed list for the admin tables: only the rows in (and just around) the
+ * viewport are in the DOM, with spacers above and below standing in for the
+ * rest, so 50k rows cost the same to show as 50. Rows must all be rowHeight
+ * pixels tall (the pages fix their row height in CSS).
+ *
+ * More rows are fetched with opts.loadMore() as the user nears the end, and
+ * single rows can be patched (update) or dropped (remove) after an action
+ * without re-rendering anything else.
+ *
+ *   var list = new VirtualList({
+ *     viewport: el,                 // the scrolling element
+ *     body: el,                     // where rows go (defaults to viewport; a <tbody> for tables)
+ *     rowHeight: 180,
+ *     render: function(item) { return '<div ...>'; },
+ *     key: function(item) { return item.id; },
+ *     spacer: function(px) { ... }, // optional, e.g. a <tr> for tables
+ *     empty: '<p>Nothing here</p>', // optional
+ *     loadMore: async function() { return [items] or null when there are no more; }
+ *   });
+ *
+ * Uses 'var' like js/hookupza.js so it is safe to load more than once.
+ */
+var VirtualList = window.VirtualList || (function() {
+  function VirtualList(opts) {
+    this.viewport = opts.viewport;
+    this.body = opts.body || opts.viewport;
+    this.rowHeight = opts.rowHeight;
+    this.render = opts.render;
+    this.key = opts.key || function(item) { return item.id; };
+    this.spacer = opts.spacer || function(px) { return '<div style="height:' + px + 'px"></div>'; };
+    this.empty = opts.empty || '';
+    this.loadMore = opts.loadMore || null;
+    this.overscan = opts.overscan || 8;
+    this.items = [];
+    this.index = {};          // key -> position in items
+    this.range = null;        // [first, last) currently in the DOM
+    this.done = !this.loadMore;
+    this.loading = null;
+    this.generation = 0;      // bumped by reset() so a page that was in flight is dropped
+    this.frame = 0;
+    var self = this;
+    this.onScroll = function() {
+      if (!self.frame) self.frame = requestAnimationFrame(function() { self.frame = 0; self.draw(); });
+    };
+    this.viewport.addEventListener('scroll', this.onScroll, { passive: true });
+    window.addEventListener('resize', this.onScroll);
+  }
+
+  VirtualList.prototype.reindex = function() {
+    this.index = {};
+    for (var i = 0; i < this.items.length; i++) this.index[this.key(this.items[i])] = i;
+  };
+
+  // Replace everything (new filter, refresh); loadMore() is called for the first page when items is omitted
+  VirtualList.prototype.reset = function(items, loadMore) {
+    if (loadMore !== undefined) this.loadMore = loadMore;
+    this.items = items || [];
+    this.done = !this.loadMore;
+    this.loading = null;
+    this.generation++;
+    this.reindex();
+    this.viewport.scrollTop = 0;
+    this.redraw();
+  };
+
+  VirtualList.prototype.append = function(items) {
+    for (var i = 0; i < items.length; i++) {
+      var k = this.key(items[i]);
+      if (k in this.index) continue;   // a row moved between pages while we were scrolling
+      this.index[k] = this.items.length;
+      this.items.push(items[i]);
+    }
+    this.redraw();
+  };
+
+  VirtualList.prototype.get = function(key) {
+    var i = this.index[key];
+    return i === undefined ? null : this.items[i];
+  };
+
+  // Patch one row in place; nothing else is touched
+  VirtualList.prototype.update = function(item) {
+    var i = this.index[this.key(item)];
+    if (i === undefined) return false;
+    this.items[i] = item;
+    if (this.range && i >= this.range[0] && i < this.range[1]) {
+      var row = this.body.children[i - this.range[0] + 1];   // +1 for the top spacer
+      if (row) row.outerHTML = this.render(item);
+    }
+    return true;
+  };
+
+  VirtualList.prototype.remove = function(key) {
+    var i = this.index[key];
+    if (i === undefined) return false;
+    this.items.splice(i, 1);
+    this.reindex();
+    this.redraw();
+    return true;
+  };
+
+  // Re-render the visible window, e.g. after data the rows show (stats) arrived
+  VirtualList.prototype.redraw = function() {
+    this.range = null;
+    this.draw();
+  };
+
+  VirtualList.prototype.draw = function() {
+    var n = this.items.length;
+    if (!n) {
+      this.range = [0, 0];
+      this.body.innerHTML = this.done ? this.empty : '';
+      if (!this.done) this.fetch();
+      return;
+    }
+    // how far the rows are scrolled past the top; they may sit below a table header
+    var top = this.body === this.viewport ? this.viewport.scrollTop
+            : this.viewport.getBoundingClientRect().top - this.body.getBoundingClientRect().top;
+    var visible = Math.ceil(this.viewport.clientHeight / this.rowHeight);
+    var first = Math.max(0, Math.min(Math.floor(top / this.rowHeight), n - visible) - this.overscan);
+    var last = Math.min(n, first + visible + 2 * this.overscan);
+    if (!this.range || first !== this.range[0] || last !== this.range[1]) {
+      var html = this.spacer(first * this.rowHeight);
+      for (var i = first; i < last; i++) html += this.render(this.items[i]);
+      this.body.innerHTML = html + this.spacer((n - last) * this.rowHeight);
+      this.range = [first, last];
+    }
+    if (last >= n - this.overscan) this.fetch();
+  };
+
+  VirtualList.prototype.fetch = function() {
+    if (this.done || this.loading) return this.loading;
+    var self = this, generation = this.generation;
+    this.loading = Promise.resolve(this.loadMore()).then(function(items) {
+      if (generation !== self.generation) return;   // reset() while this page was in flight
+      self.loading = null;
+      if (!items || !items.length) { self.done = true; self.redraw(); return; }
+      self.append(items);
+    }, function(e) {
+      if (generation !== self.generation) return;
+      self.loading = null;
+      self.done = true;
+      console.error('VirtualList: loading more rows failed', e);
+    });
+    return this.loading;
+  };
+
+  return VirtualList;
+})();
+window.VirtualList = VirtualList;
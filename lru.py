@@ -0,0 +1,96 @@
+"""
+HookUpZA - Size-bounded LRU cache
+
+A per-process cache of built payloads, bounded by their total size in bytes
+rather than by entry count, so a run of large ads cannot push memory past
+the budget. Lookups for keys known not to exist are cached too (negative
+entries), on a shorter expiry.
+
+The worker that writes invalidates its own entries straight away. Writes
+made by other workers are only picked up when an entry expires, so `ttl`
+bounds how stale a hit can be.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+# Returned by get() for a cached "does not exist"; None means not cached at all
+MISSING = object()
+# Rough per-entry bookkeeping (key, tuple, dict slot) added to each value's size
+ENTRY_OVERHEAD = 120
+
+
+class SizedLRU:
+    def __init__(self, max_bytes, ttl=30.0, negative_ttl=5.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.entries = OrderedDict()    # key -> (value, size, expires_at)
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.negative_hits = self.evictions = 0
+
+    def get(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[2] <= now:
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            if entry[0] is MISSING:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return entry[0]
+
+    def get_many(self, keys):
+        """{key: value or MISSING} for the keys that are cached."""
+        now = time.monotonic()
+        found = {}
+        for key in keys:
+            value = self.get(key, now)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def put(self, key, value, size):
+        size += ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        ttl = self.negative_ttl if value is MISSING else self.ttl
+        with self.lock:
+            if key in self.entries:
+                self._drop(key)
+            self.entries[key] = (value, size, time.monotonic() + ttl)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self.entries)))
+                self.evictions += 1
+
+    def put_missing(self, key):
+        self.put(key, MISSING, 0)
+
+    def invalidate(self, keys=None):
+        """Drop the given keys, or everything."""
+        with self.lock:
+            if keys is None:
+                self.entries.clear()
+                self.bytes = 0
+                return
+            for key in keys:
+                if key in self.entries:
+                    self._drop(key)
+
+    def _drop(self, key):
+        self.bytes -= self.entries.pop(key)[1]
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {'entries': len(self.entries), 'bytes': self.bytes, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'negative_hits': self.negative_hits, 'misses': self.misses,
+                    'evictions': self.evictions,
+                    'hit_rate': round((self.hits + self.negative_hits) / lookups, 3) if lookups else None}
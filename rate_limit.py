@@ -0,0 +1,143 @@
+"""
+HookUpZA - Token-bucket rate limiting
+
+Each (route, scope, identity) gets a bucket of `capacity` tokens that refills
+at capacity/period tokens per second; a request spends one token or gets a
+429 with Retry-After. Scope is 'ip' or 'user' (session user id).
+
+Stores:
+    memory  per-worker dict, bounded to MAX_KEYS (least recently used evicted)
+    sqlite  buckets in a small shared SQLite file so all workers see the same
+            counts (HOOKUPZA_RATELIMIT=sqlite, file HOOKUPZA_RATELIMIT_DB)
+
+Behind a proxy (RENDER or HOOKUPZA_TRUST_PROXY set) the client is the
+X-Forwarded-For entry the proxy appended, HOOKUPZA_PROXY_HOPS (default 1)
+from the right; entries left of it are whatever the client sent.
+
+HOOKUPZA_RATELIMIT=off disables limiting (load tests).
+"""
+import os
+import sqlite3
+import threading
+import time
+
+BACKEND = os.environ.get('HOOKUPZA_RATELIMIT', 'memory')
+SQLITE_FILE = os.environ.get('HOOKUPZA_RATELIMIT_DB', 'ratelimit.db')
+TRUST_PROXY = os.environ.get('RENDER', '') != '' or os.environ.get('HOOKUPZA_TRUST_PROXY', '') != ''
+PROXY_HOPS = int(os.environ.get('HOOKUPZA_PROXY_HOPS', 1))
+MAX_KEYS = 100000
+
+# endpoint -> [(scope, capacity, period_seconds)]
+RATE_LIMITS = {
+    'login':        [('ip', 10, 60)],
+    'signup':       [('ip', 5, 3600)],
+    'create_admin': [('user', 10, 3600)],
+    'upload_photo': [('user', 60, 600), ('ip', 120, 600)],
+    'upload_photos': [('user', 10, 600), ('ip', 20, 600)],
+    'post_ad':      [('user', 10, 3600), ('ip', 30, 3600)],
+    'record_ad_event': [('ip', 300, 60)],
+}
+
+
+class MemoryStore:
+    """Buckets as key -> [tokens, last_refill] in an insertion-ordered dict used as an LRU."""
+
+    def __init__(self, max_keys=MAX_KEYS):
+        self.max_keys = max_keys
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def take(self, key, capacity, rate, now):
+        with self.lock:
+            bucket = self.buckets.pop(key, None)
+            if bucket is None:
+                bucket = [capacity, now]
+                if len(self.buckets) >= self.max_keys:
+                    del self.buckets[next(iter(self.buckets))]
+            else:
+                bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            self.buckets[key] = bucket
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            return (1 - bucket[0]) / rate
+
+
+class SQLiteStore:
+    """Buckets in a shared SQLite file; each take() is one short IMMEDIATE transaction."""
+
+    def __init__(self, path=SQLITE_FILE):
+        self.path = path
+        self.local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or getattr(self.local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute('''CREATE TABLE IF NOT EXISTS buckets (
+                key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL) WITHOUT ROWID''')
+            self.local.conn, self.local.pid = conn, os.getpid()
+        return conn
+
+    def take(self, key, capacity, rate, now):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM buckets WHERE key=?', (key,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            conn.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                         (key, tokens, now))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return wait
+
+    def purge(self, older_than):
+        self._conn().execute('DELETE FROM buckets WHERE updated < ?', (older_than,))
+
+
+def make_store(backend=BACKEND):
+    if backend == 'off':
+        return None
+    if backend == 'sqlite':
+        return SQLiteStore()
+    return MemoryStore()
+
+
+store = make_store()
+
+
+def forwarded_ip(forwarded_for, remote_addr):
+    """Client address from an X-Forwarded-For value and the peer address."""
+    hops = [hop.strip() for hop in (forwarded_for or '').split(',') if hop.strip()]
+    if TRUST_PROXY and len(hops) >= PROXY_HOPS > 0:
+        return hops[-PROXY_HOPS]
+    return remote_addr or 'unknown'
+
+
+def client_ip(request):
+    return forwarded_ip(','.join(request.headers.getlist('X-Forwarded-For')), request.remote_addr)
+
+
+def check(endpoint, ip, user_id, now=None):
+    """Spend one token from each bucket configured for endpoint, stopping at the first that is
+    empty. Returns seconds to wait (0 = allowed)."""
+    limits = RATE_LIMITS.get(endpoint)
+    if store is None or not limits:
+        return 0
+    now = time.time() if now is None else now
+    for scope, capacity, period in limits:
+        ident = ip if scope == 'ip' else user_id
+        if ident is None:
+            continue
+        wait = store.take(f'{endpoint}:{scope}:{ident}', capacity, capacity / period, now)
+        if wait:
+            return wait
+    return 0.0
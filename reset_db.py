@@ -5,21 +5,31 @@ Run this to fix ALL database issues in one shot.
 
 Usage:
     python3 reset_db.py
+    python3 reset_db.py --users 100000 --ads 500000   # plus bulk synthetic data
 """
+import argparse
 import sqlite3
 import os
 from werkzeug.security import generate_password_hash
 
 DATABASE = 'hookupza.db'
+ARCHIVE_DATABASE = 'hookupza-archive.db'
+
+parser = argparse.ArgumentParser(description='Reset the HookUpZA database')
+parser.add_argument('--users', type=int, default=0, help='synthetic users to generate (see generate_data.py)')
+parser.add_argument('--ads', type=int, default=0, help='synthetic ads to generate')
+parser.add_argument('--seed', type=int, default=42)
+args = parser.parse_args()
 
 print("=" * 55)
 print("🔧 HookUpZA Database Reset")
 print("=" * 55)
 
-# Delete old broken database
-if os.path.exists(DATABASE):
-    os.remove(DATABASE)
-    print(f"🗑️  Deleted old {DATABASE}")
+# Delete old broken database (and its archive of old ads)
+for path in (DATABASE, ARCHIVE_DATABASE):
+    if os.path.exists(path):
+        os.remove(path)
+        print(f"🗑️  Deleted old {path}")
 
 # Create fresh database
 db = sqlite3.connect(DATABASE)
@@ -54,10 +64,8 @@ c.execute('''
         category TEXT NOT NULL,
         location TEXT DEFAULT '',
         description TEXT DEFAULT '',
-        services TEXT DEFAULT '[]',
         rate TEXT DEFAULT '',
         contact TEXT DEFAULT '',
-        photos TEXT DEFAULT '[]',
         status TEXT DEFAULT 'pending',
         is_premium INTEGER DEFAULT 0,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -94,6 +102,13 @@ print("✅ Vendor user created: vendor1 / vendor123")
 db.commit()
 db.close()
 
+# ---- OPTIONAL BULK DATA ----
+if args.users or args.ads:
+    import generate_data
+    result = generate_data.generate(DATABASE, args.users, args.ads, args.seed)
+    print(f"✅ Generated {result['users']:,} users and {result['ads']:,} ads in {result['total_s']}s")
+    print(f"   Synthetic logins: {generate_data.synthetic_username(0)} / {generate_data.SYNTHETIC_PASSWORD}")
+
 print()
 print("=" * 55)
 print("✅ DATABASE RESET COMPLETE!")
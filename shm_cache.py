@@ -0,0 +1,310 @@
+"""
+HookUpZA - Cross-worker shared cache in a memory-mapped file
+
+One fixed-size file (in /dev/shm where available, so it never touches disk)
+mapped MAP_SHARED by every worker: a value cached by one worker is a hit in
+all of them, it is held once however many workers there are, and an
+invalidation is seen by everyone on their next read.
+
+Layout (little-endian):
+    header      magic, layout version, file size, then NAMESPACES u64
+                version counters
+    slab class  for each (slot size, share) in SLAB_CLASSES, a region of
+                fixed-size slots grouped WAYS to a bucket; a key hashes to
+                one bucket per class and its value lives in the smallest
+                class it fits
+    slot        seq u32 | key_len u16 | flags u16 | value_len u32 |
+                namespace u32 | hash u64 | version u64 | expires f64 |
+                key bytes | value bytes
+
+Reads take no lock (a seqlock): a writer makes `seq` odd, writes the slot,
+then makes it even again; a reader copies the slot and retries if `seq` was
+odd or moved meanwhile. An entry only counts if its `version` still matches
+its namespace's counter, so invalidating a whole namespace is one
+increment. Writers are serialized by a thread lock plus an fcntl lock on
+the file. A value goes to a free (empty, expired or stale) slot in the
+smallest class it fits, else in a larger class; with none free it evicts the
+entry closest to expiry from its bucket in the smallest class.
+
+A value computed from the database just before another worker invalidates
+can still be stored stamped with the new version; the entry TTL bounds how
+long such a value lives.
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+
+from lru import MISSING
+
+MAGIC = b'HZC1'
+LAYOUT_VERSION = 1
+HEADER = struct.Struct('<4sIQ')
+NAMESPACES = 64
+VERSIONS_OFFSET = 64
+DATA_OFFSET = 4096
+SLOT = struct.Struct('<IHHIIQQd')
+SEQ = struct.Struct('<I')
+U64 = struct.Struct('<Q')
+SLOT_HASH_OFFSET = 16
+# (slot size in bytes, share of the file): detail payloads, small lists, listing pages
+SLAB_CLASSES = ((1024, 0.4), (4096, 0.25), (16384, 0.15), (131072, 0.2))
+WAYS = 4
+READ_RETRIES = 3
+FLAG_MISSING = 1
+
+
+def default_path(name):
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, f'{name}-{os.getuid() if hasattr(os, "getuid") else 0}.cache')
+
+
+def _hash(key):
+    # never 0: a zero hash marks an empty slot
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little') | 1
+
+
+class SharedCache:
+    def __init__(self, path, size_mb=64):
+        self.path = path
+        self.fd, size = self._open_or_format(path, int(size_mb * 1024 * 1024))
+        self.mm = mmap.mmap(self.fd, size)
+        self.size = size
+        self.classes = []   # (slot size, first slot offset, bucket count)
+        offset = DATA_OFFSET
+        for slot_size, share in SLAB_CLASSES:
+            buckets = int((size - DATA_OFFSET) * share) // (slot_size * WAYS)
+            if buckets:
+                self.classes.append((slot_size, offset, buckets))
+                offset += buckets * WAYS * slot_size
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+
+    @staticmethod
+    def _open_or_format(path, size):
+        """(fd, size) of the file at path: the one another worker already formatted (whatever
+        size it was made with), else a new one formatted under a temporary name and renamed
+        over it. A file in use is never truncated - processes that mapped an older file
+        (old workers during a reload) keep using it, where shrinking it would SIGBUS them."""
+        while True:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.lockf(fd, fcntl.LOCK_EX)
+            keep = False
+            try:
+                try:
+                    replaced = os.stat(path).st_ino != os.fstat(fd).st_ino
+                except FileNotFoundError:
+                    replaced = True
+                if replaced:
+                    continue    # another process renamed a new file in while we waited
+                existing = os.fstat(fd).st_size
+                if existing >= DATA_OFFSET:
+                    magic, layout, recorded = HEADER.unpack(os.pread(fd, HEADER.size, 0))
+                    if magic == MAGIC and layout == LAYOUT_VERSION and recorded == existing:
+                        keep = True
+                        return fd, existing
+                temp = f'{path}.{os.getpid()}.tmp'
+                new = os.open(temp, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+                try:
+                    # zero-filled, i.e. every slot empty and every namespace at version 0
+                    os.ftruncate(new, size)
+                    os.pwrite(new, HEADER.pack(MAGIC, LAYOUT_VERSION, size), 0)
+                    os.replace(temp, path)
+                except BaseException:
+                    os.close(new)
+                    if os.path.exists(temp):
+                        os.remove(temp)
+                    raise
+                return new, size
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN)
+                if not keep:
+                    os.close(fd)
+
+    # ---- lock-free reads
+
+    def version(self, namespace):
+        return U64.unpack_from(self.mm, VERSIONS_OFFSET + namespace * 8)[0]
+
+    def get(self, namespace, key, now=None):
+        """(flags, value bytes) or None."""
+        h = _hash(key)
+        now = time.time() if now is None else now
+        mm = self.mm
+        for slot_size, first, buckets in self.classes:
+            base = first + (h % buckets) * WAYS * slot_size
+            for way in range(WAYS):
+                offset = base + way * slot_size
+                if U64.unpack_from(mm, offset + SLOT_HASH_OFFSET)[0] == h:
+                    found = self._read(offset, slot_size, h, key, namespace, now)
+                    if found is not None:
+                        return found
+        return None
+
+    def _read(self, offset, slot_size, h, key, namespace, now):
+        mm = self.mm
+        for _ in range(READ_RETRIES):
+            seq, key_len, flags, value_len, ns, slot_hash, version, expires = SLOT.unpack_from(mm, offset)
+            if seq & 1:
+                continue
+            if slot_hash != h:
+                return None
+            start = offset + SLOT.size
+            data = mm[start:start + min(key_len + value_len, slot_size - SLOT.size)]
+            if SEQ.unpack_from(mm, offset)[0] != seq:
+                continue
+            if (ns != namespace or data[:key_len] != key or expires <= now
+                    or version != self.version(namespace) or len(data) != key_len + value_len):
+                return None
+            return flags, data[key_len:]
+        return None
+
+    # ---- writes (serialized across threads and processes)
+
+    def _locked(self):
+        if self.pid != os.getpid():
+            # a lock held by another thread at fork time would never be released in the child
+            self.lock, self.pid = threading.Lock(), os.getpid()
+        return _WriteLock(self)
+
+    def put(self, namespace, key, value, ttl, flags=0):
+        need = SLOT.size + len(key) + len(value)
+        fits = [c for c in self.classes if c[0] >= need]
+        if not fits:
+            return False
+        h = _hash(key)
+        now = time.time()
+        with self._locked():
+            version = self.version(namespace)
+            self._delete(h, key, namespace)
+            # the smallest class that fits, unless its bucket is full of live entries
+            # and a larger class has room; then evict from the smallest
+            victims = []
+            for slot_size, first, buckets in fits:
+                base = first + (h % buckets) * WAYS * slot_size
+                victims.append(min((self._victim_rank(o, now), o)
+                                   for o in range(base, base + WAYS * slot_size, slot_size)))
+            offset = next((o for rank, o in victims if rank < 0), victims[0][1])
+            mm = self.mm
+            seq = SEQ.unpack_from(mm, offset)[0] | 1
+            SEQ.pack_into(mm, offset, seq)
+            start = offset + SLOT.size
+            mm[start:start + len(key) + len(value)] = key + value
+            SLOT.pack_into(mm, offset, seq, len(key), flags, len(value), namespace, h, version, now + ttl)
+            SEQ.pack_into(mm, offset, (seq + 1) & 0xFFFFFFFF)
+        return True
+
+    def _victim_rank(self, offset, now):
+        _, _, _, _, ns, slot_hash, version, expires = SLOT.unpack_from(self.mm, offset)
+        if slot_hash == 0 or expires <= now or version != self.version(ns):
+            return -1.0
+        return expires
+
+    def _delete(self, h, key, namespace):
+        mm = self.mm
+        for slot_size, first, buckets in self.classes:
+            base = first + (h % buckets) * WAYS * slot_size
+            for way in range(WAYS):
+                offset = base + way * slot_size
+                if U64.unpack_from(mm, offset + SLOT_HASH_OFFSET)[0] != h:
+                    continue
+                _, key_len, _, _, ns, _, _, _ = SLOT.unpack_from(mm, offset)
+                start = offset + SLOT.size
+                if ns == namespace and mm[start:start + key_len] == key:
+                    seq = SEQ.unpack_from(mm, offset)[0] | 1
+                    SEQ.pack_into(mm, offset, seq)
+                    U64.pack_into(mm, offset + SLOT_HASH_OFFSET, 0)
+                    SEQ.pack_into(mm, offset, (seq + 1) & 0xFFFFFFFF)
+
+    def delete(self, namespace, key):
+        with self._locked():
+            self._delete(_hash(key), key, namespace)
+
+    def bump(self, namespace):
+        """Invalidate every entry in the namespace, in every process."""
+        with self._locked():
+            offset = VERSIONS_OFFSET + namespace * 8
+            U64.pack_into(self.mm, offset, U64.unpack_from(self.mm, offset)[0] + 1)
+
+    def namespace(self, name, ttl, negative_ttl=5.0, dumps=bytes, loads=bytes):
+        return Namespace(self, name, ttl, negative_ttl, dumps, loads)
+
+    def close(self):
+        self.mm.close()
+        os.close(self.fd)
+
+
+class _WriteLock:
+    def __init__(self, cache):
+        self.cache = cache
+
+    def __enter__(self):
+        self.cache.lock.acquire()
+        try:
+            fcntl.lockf(self.cache.fd, fcntl.LOCK_EX, 1, 0)
+        except BaseException:
+            self.cache.lock.release()
+            raise
+
+    def __exit__(self, *exc):
+        try:
+            fcntl.lockf(self.cache.fd, fcntl.LOCK_UN, 1, 0)
+        finally:
+            self.cache.lock.release()
+
+
+class Namespace:
+    """One cache's view of the shared file, with the same interface as lru.SizedLRU."""
+
+    def __init__(self, cache, name, ttl, negative_ttl, dumps, loads):
+        self.cache = cache
+        self.name = name
+        self.index = zlib.crc32(name.encode()) % NAMESPACES
+        self.prefix = name.encode() + b':'
+        self.ttl, self.negative_ttl = ttl, negative_ttl
+        self.dumps, self.loads = dumps, loads
+        self.hits = self.misses = self.negative_hits = 0
+
+    def get(self, key, now=None):
+        found = self.cache.get(self.index, self.prefix + str(key).encode(), now)
+        if found is None:
+            self.misses += 1
+            return None
+        if found[0] & FLAG_MISSING:
+            self.negative_hits += 1
+            return MISSING
+        self.hits += 1
+        return self.loads(found[1])
+
+    def get_many(self, keys):
+        now = time.time()
+        found = {}
+        for key in keys:
+            value = self.get(key, now)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def put(self, key, value, size=None):
+        self.cache.put(self.index, self.prefix + str(key).encode(), self.dumps(value), self.ttl)
+
+    def put_missing(self, key):
+        self.cache.put(self.index, self.prefix + str(key).encode(), b'', self.negative_ttl, FLAG_MISSING)
+
+    def invalidate(self, keys=None):
+        if keys is None:
+            self.cache.bump(self.index)
+            return
+        for key in keys:
+            self.cache.delete(self.index, self.prefix + str(key).encode())
+
+    def stats(self):
+        lookups = self.hits + self.negative_hits + self.misses
+        return {'backend': 'shared', 'path': self.cache.path, 'file_bytes': self.cache.size,
+                'hits': self.hits, 'negative_hits': self.negative_hits, 'misses': self.misses,
+                'hit_rate': round((self.hits + self.negative_hits) / lookups, 3) if lookups else None}
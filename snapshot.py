@@ -0,0 +1,211 @@
+"""
+HookUpZA - Static snapshots of the public pages
+
+Most visitors are not logged in, and for them the homepage and its listings
+are the same for everyone. A publisher renders those into files under one
+directory a few seconds after ads change, so a front web server (or
+app.py's send_snapshot) can answer anonymous visitors without Flask doing
+any database work:
+
+    index.html                 the homepage, with its listing and facet counts inlined
+    category/<name>.html       /?category=<name>, the newest ads of one category
+    public_ads.json            = /api/public_ads
+    category/<name>.json       = /api/public_ads?category=<name>
+    facets.json                = /api/ads/facets
+    manifest.json              publish time, and size and hash of each file
+
+Every file is written to a temporary file in the same directory and renamed
+over the old one, so a reader sees the old version or the new one, never
+half of either. Each gets a gzip sibling (<file>.gz, written first) for
+servers that send precompressed files. Files whose content did not change
+are not rewritten, which keeps their mtime and ETag. Files from an earlier
+snapshot that are no longer produced, such as a category that emptied, are
+removed.
+
+Publishing is debounced: schedule() marks the snapshot stale and a
+background thread publishes once writes have been quiet for DEBOUNCE_SECONDS,
+or MAX_DELAY_SECONDS after the first one under a steady stream. Ads also
+expire with no write at all, so a snapshot older than MAX_AGE_SECONDS is
+republished anyway. Every worker runs its own publisher; an fcntl lock on
+the directory makes them take turns, and the age check is against the
+manifest, so one publish per interval serves them all.
+
+Serving with nginx (HOOKUPZA_SNAPSHOT_DIR=/srv/hookupza/snapshot), to visitors
+without a Flask session cookie only:
+
+    map "$cookie_session:$arg_category" $snapshot_page {
+        default              /no-snapshot;
+        ":"                  /snapshot/index.html;
+        "~^:([a-z0-9_-]+)$"  /snapshot/category/$1.html;
+    }
+    location = /         { root /srv/hookupza; gzip_static on; try_files $snapshot_page @app; }
+    location /snapshot/  { root /srv/hookupza; gzip_static on; add_header Cache-Control no-cache; }
+
+Environment: HOOKUPZA_SNAPSHOT_DIR (unset: no snapshots), HOOKUPZA_SNAPSHOT_DEBOUNCE,
+HOOKUPZA_SNAPSHOT_MAX_AGE
+"""
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+DEBOUNCE_SECONDS = float(os.environ.get('HOOKUPZA_SNAPSHOT_DEBOUNCE', 2))
+MAX_DELAY_SECONDS = 10
+# The homepage refreshes its listing every 60 seconds; the snapshot need not be fresher
+MAX_AGE_SECONDS = float(os.environ.get('HOOKUPZA_SNAPSHOT_MAX_AGE', 60))
+GZIP_LEVEL = 9
+MANIFEST = 'manifest.json'
+LOCK_FILE = '.publish.lock'
+
+
+def inline_script(template, name, value):
+    """template (HTML bytes) with `window.<name> = <value>;` (JSON bytes) run before its other
+    scripts. Every '<' becomes \\u003c (JSON has '<' only inside strings), so ad text cannot
+    close the element or open '<!--' / '<script' and change how the parser ends it."""
+    script = b'<script>window.' + name.encode() + b' = ' + value.replace(b'<', b'\\u003c') + b';</script>\n'
+    head = template.find(b'</head>')
+    if head < 0:
+        raise ValueError('template has no </head>')
+    return template[:head] + script + template[head:]
+
+
+def write_atomic(path, data):
+    """Write data to path through a temporary file and a rename; False when path already
+    held exactly data (nothing is written)."""
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(temp, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, path)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    return True
+
+
+def _remove(path):
+    for name in (path + '.gz', path):
+        try:
+            os.remove(name)
+        except FileNotFoundError:
+            pass
+
+
+def manifest_age(out_dir):
+    """Seconds since the last snapshot in out_dir was published, or None when there is none."""
+    try:
+        return time.time() - os.stat(os.path.join(out_dir, MANIFEST)).st_mtime
+    except FileNotFoundError:
+        return None
+
+
+def publish(out_dir, files):
+    """Write files ({relative path: bytes}) and their .gz siblings to out_dir, drop what the
+    previous manifest listed and files no longer has, then write the manifest. Returns it."""
+    start = time.perf_counter()
+    os.makedirs(out_dir, exist_ok=True)
+    try:
+        with open(os.path.join(out_dir, MANIFEST)) as f:
+            previous = json.load(f)['files']
+    except (FileNotFoundError, ValueError, KeyError):
+        previous = {}
+    entries, written = {}, 0
+    for name, data in sorted(files.items()):
+        path = os.path.join(out_dir, name)
+        compressed = gzip.compress(data, GZIP_LEVEL, mtime=0)
+        # the .gz first: a server preferring it never has a newer plain file without one
+        written += write_atomic(path + '.gz', compressed)
+        written += write_atomic(path, data)
+        entries[name] = {'bytes': len(data), 'gzip_bytes': len(compressed),
+                         'sha1': hashlib.sha1(data).hexdigest()}
+    removed = [name for name in previous if name not in files]
+    for name in removed:
+        _remove(os.path.join(out_dir, name))
+    manifest = {'published_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'files': entries, 'written': written, 'removed': len(removed),
+                'publish_ms': round((time.perf_counter() - start) * 1000, 1)}
+    # always rewritten: its mtime is the snapshot's age
+    write_atomic(os.path.join(out_dir, MANIFEST), json.dumps(manifest, indent=1, sort_keys=True).encode())
+    return manifest
+
+
+class Publisher:
+    """Debounced publishing of render() ({relative path: bytes}) to out_dir from a
+    background thread, started on first use in each process."""
+
+    def __init__(self, render, out_dir, debounce=DEBOUNCE_SECONDS, max_delay=MAX_DELAY_SECONDS,
+                 max_age=MAX_AGE_SECONDS):
+        self.render = render
+        self.out_dir = out_dir
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.max_age = max_age
+        self.start_lock = threading.Lock()
+        self.pid = None
+        self.wake = threading.Event()
+
+    def start(self):
+        """Start this process's publisher thread, if it is not running yet. It publishes
+        straight away when there is no snapshot or it is older than max_age."""
+        if self.pid == os.getpid():
+            return
+        with self.start_lock:
+            if self.pid == os.getpid():
+                return
+            # a thread started before a fork does not exist in the child
+            self.wake = threading.Event()
+            threading.Thread(target=self._run, name='hookupza-snapshot', daemon=True).start()
+            self.pid = os.getpid()
+
+    def schedule(self):
+        """Mark the snapshot stale; it is republished once writes settle."""
+        self.start()
+        self.wake.set()
+
+    def publish_now(self):
+        """Render and publish, waiting for another process's publish to finish first."""
+        os.makedirs(self.out_dir, exist_ok=True)
+        with open(os.path.join(self.out_dir, LOCK_FILE), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                return publish(self.out_dir, self.render())
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _settle(self):
+        """Wait until no schedule() came for debounce seconds, or max_delay has passed."""
+        deadline = time.monotonic() + self.max_delay
+        while True:
+            self.wake.clear()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.wake.wait(min(self.debounce, remaining)):
+                return
+
+    def _run(self):
+        while True:
+            age = manifest_age(self.out_dir)
+            if age is not None and age < self.max_age:
+                if not self.wake.wait(self.max_age - age):
+                    continue    # look at the age again: another worker may have published
+                self._settle()
+            self.wake.clear()
+            try:
+                manifest = self.publish_now()
+                print(f"Snapshot published: {manifest['written']} files written, "
+                      f"{manifest['removed']} removed, {manifest['publish_ms']} ms")
+            except Exception as e:
+                print(f"Snapshot publish failed: {e}")
+                self.wake.wait(self.max_age)